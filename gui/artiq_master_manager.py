@@ -24,6 +24,12 @@ externalStartedArtiqMaster = False
 rpcClient = None
 subClient = None
 test_mode = False
+# the schedule of the master, kept up to date by subClient
+schedule = {}
+# called after every change of the schedule
+scheduleCallbacks = []
+# statuses of runs which did not start yet
+QUEUED_STATUSES = ("pending", "flushing", "preparing", "prepare_done")
 
 
 def start(eventLoop):
@@ -124,14 +130,23 @@ def start(eventLoop):
             )
         disconnect_reported = True
 
-    subClient = Subscriber("schedule", lambda x: x, notify_cb=notify_cb, disconnect_cb=report_disconnect)
+    subClient = Subscriber("schedule", buildSchedule, notify_cb=notify_cb, disconnect_cb=report_disconnect)
     eventLoop.run_until_complete(subClient.connect("127.0.0.1", gui.crate.Config.get("port-notify")))
     atexit_register_coroutine(subClient.close)
 
 
+def buildSchedule(struct):
+    # the subscriber applies the changes to the returned dict
+    global schedule
+    schedule = struct
+    return struct
+
+
 def notify_cb(data):
     if Playlist.dock is not None:
         Playlist.dock.dataReader.read(data)
+    for callback in scheduleCallbacks:
+        callback()
 
 def getDeviceDb():
     localdict = {}
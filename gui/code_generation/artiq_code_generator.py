@@ -1,9 +1,14 @@
 import json
 
 import gui.code_generation.event_builder as event_builder
+from gui.code_generation.code_writer import CodeWriter
+import gui.code_generation.parametric as parametric
+import gui.code_generation.sidecars as sidecars
+import gui.code_generation.slack as slack
 import gui.crate as crate
 import gui.crate.FileManager
 import gui.settings as settings
+import gui.timeline as timeline
 import gui.util as util
 import gui.widgets.RPC
 
@@ -46,32 +51,37 @@ def generateImportCode(events):
     return "\n".join(generateImportCodeTokens(events))
 
 
-def generateBuildCode(devices):
+def writeBuildCode(writer, devices):
     numberValuePara = "ndecimals" if int(crate.Config.get("artiqVersion")) <= 7 else "precision"
-    buildCode = f"""
-        self.setattr_argument("codeID", NumberValue(type="int", {numberValuePara}=0, scale=1, step=1))"""
+    writer.write(f"""
+        self.setattr_argument("codeID", NumberValue(type="int", {numberValuePara}=0, scale=1, step=1))""")
 
     # insert used device names into code template
     for device in devices:
-        buildCode += device.generate_setattr_string_code()
+        device.writeSetattrCode(writer)
 
     for externalGenerator in externalBuildGenerators:
-        externalBuild = externalGenerator()
-        buildCode += externalBuild
+        writer.write(externalGenerator())
 
     for device in devices:
-        code = device.generateBuildCode()
-        if code is not None:
-            buildCode += code
-
-    return buildCode
-
+        device.writeBuildCode(writer)
+
+
+def writePrepareCode(writer, events, jsonString="", methods=None):
+    if jsonString is None:
+        # parametric code gets the sequence json as argument
+        writer.write("""self.set_dataset("sequenceJson", self.sequenceJson)""")
+    elif writer.sidecars is not None:
+        writer.write(f"""self.set_dataset("sequenceJson", {sidecars.getTextCode(writer.sidecars, jsonString)})""")
+    else:
+        writer.write(f"""self.set_dataset("sequenceJson", '{jsonString}')""")
+    writeEventsPrepareCode(writer, events, name="", methods=methods)
+    for externalGenerator in externalPrepareGenerators:
+        for externalPrepare in externalGenerator():
+            writer.write(externalPrepare)
 
-def generatePrepareCode(events, name="", jsonString="", firstTime=True):
-    prepareCode = ""
-    if firstTime:
-        prepareCode += f"""self.set_dataset("sequenceJson", '{jsonString}')"""
 
+def writeEventsPrepareCode(writer, events, name="", methods=None):
     # set time stamp indices
     indexCounter = 0
     for currentEvents in events:
@@ -82,10 +92,12 @@ def generatePrepareCode(events, name="", jsonString="", firstTime=True):
                 else:
                     event.timeIndex = indexCounter
             if not settings.getRelativeTimestampsEnabled():
-                prepareCode += f"""
+                writer.write(f"""
         self.duration_{currentEvents["name"]} = self.core.seconds_to_mu({currentEvents["single_duration"]})
-        self.timestamp_{name}{indexCounter} = self.core.seconds_to_mu({currentEvents["time"]})"""
-            prepareCode += generatePrepareCode(currentEvents["events"], currentEvents["name"], firstTime=False)
+        self.timestamp_{name}{indexCounter} = self.core.seconds_to_mu({currentEvents["time"]})""")
+            # subsequences generated as kernel methods share the prepared data of their first use
+            if methods is None or methods.addUse(currentEvents):
+                writeEventsPrepareCode(writer, currentEvents["events"], currentEvents["name"], methods)
             currentEvents["timeIndex"] = indexCounter
             indexCounter += 1
         else:
@@ -98,106 +110,296 @@ def generatePrepareCode(events, name="", jsonString="", firstTime=True):
                 timeCursorShift = sum([event.getTimeCursorShift() for event in currentEvents["events"]])
                 delay = currentEvents["duration"] - timeCursorShift
                 assert delay >= 0, f"Delay is negative for event {currentEvents['name']}"
-                prepareCode += f"""
-        self.delay_{name}{indexCounter} = self.core.seconds_to_mu({delay})"""
+                writer.write(f"""
+        self.delay_{name}{indexCounter} = self.core.seconds_to_mu({delay})""")
             else:
-                prepareCode += f"""
-        self.timestamp_{name}{indexCounter} = self.core.seconds_to_mu({currentEvents["time"]})"""
+                writer.write(f"""
+        self.timestamp_{name}{indexCounter} = self.core.seconds_to_mu({currentEvents["time"]})""")
             currentEvents["timeIndex"] = indexCounter
             indexCounter += 1
             # get and append the prepare code of every event
             for event in currentEvents["events"]:
-                code = event.generatePrepareCode()
-                if code is not None:
-                    prepareCode += code
-    for externalGenerator in externalPrepareGenerators:
-        externalPrepares = externalGenerator()
-        for externalPrepare in externalPrepares:
-            prepareCode += externalPrepare
-
-    return prepareCode
+                event.writePrepareCode(writer)
 
 
-def generateInitCode(devices):
-    initCode = ""
+def writeInitCode(writer, devices, knownState=None):
+    if knownState is not None:
+        writer.write("""
+        known_device_state = self.get_known_device_state()""")
+    start = writer.position()
 
     for externalGenerator in externalInitGenerators:
-        externalInits = externalGenerator()
-        for externalInits in externalInits:
-            initCode += externalInits
+        for externalInit in externalGenerator():
+            writer.write(externalInit)
 
     # sort by priority so that nothing goes before the core initialization
     devices.sort(key=lambda x: -x.priority)
 
     # get and append the init code of every device
     for device in devices:
-        code = device.generateInitCode()
-        if code is not None:
-            initCode += code
-
-    if initCode == "":
-        initCode = """
-        pass"""
-
-    return initCode
+        if knownState is not None and device.skippableInit:
+            knownState.writeInitCode(writer, device)
+        else:
+            device.writeInitCode(writer)
 
+    if writer.position() == start:
+        writer.write("""
+        pass""")
 
-def generateRunCode(events, name="", forLoopIndex=0, start_time_variable="start_mu"):
-    runCode = ""
 
+def writeRunCode(writer, events, name="", forLoopIndex=0, start_time_variable="start_mu", methods=None, dma=None):
     # loop over timesteps
     for currentEvents in events:
         if "repeats" in currentEvents:
             time_add = f"""i{forLoopIndex} * self.duration_{currentEvents["name"]}"""
-            repeatedRunCode = generateRunCode(
-                currentEvents["events"],
-                currentEvents["name"],
-                forLoopIndex + 1,
-                f"""{start_time_variable} + self.timestamp_{name}{currentEvents["timeIndex"]} + {time_add}""",
-            ).replace("\n", "\n    ")
-            if repeatedRunCode == "":
+            subsequence_start_time = f"""{start_time_variable} + self.timestamp_{name}{currentEvents["timeIndex"]} + {time_add}"""
+            # a recorded subsequence starts at the time cursor of the recording
+            record = dma is not None and dma.isEligible(currentEvents)
+            body_start_time = "dma_start_mu" if record else subsequence_start_time
+            # the loop is only written if its body is not empty, so collect the body first
+            repeatedWriter = CodeWriter()
+            if methods is not None and methods.isMethod(currentEvents):
+                # with relative timestamps the subsequence runs at the time cursor and ignores its start time
+                start_time = "now_mu()" if settings.getRelativeTimestampsEnabled() else body_start_time
+                methods.writeCall(repeatedWriter, currentEvents, start_time)
+            else:
+                writeRunCode(
+                    repeatedWriter,
+                    currentEvents["events"],
+                    currentEvents["name"],
+                    forLoopIndex + 1,
+                    body_start_time,
+                    methods,
+                    None if record else dma,
+                )
+            if repeatedWriter.isEmpty():
                 continue
-            runCode += f"""
-        for i{forLoopIndex} in range({currentEvents["repeats"]}):"""
-            runCode += repeatedRunCode
+            if record:
+                handle = dma.addRecording(currentEvents["name"], repeatedWriter.getvalue())
+                repeatedWriter = CodeWriter()
+                if not settings.getRelativeTimestampsEnabled():
+                    repeatedWriter.write(f"""
+        at_mu({subsequence_start_time})""")
+                repeatedWriter.write(f"""
+        self.core_dma.playback_handle({handle})""")
+            writer.write(f"""
+        for i{forLoopIndex} in range({currentEvents["repeats"]}):""")
+            with writer.indent():
+                writer.write(repeatedWriter.getvalue())
         else:
             if not settings.getRelativeTimestampsEnabled():
-                runCode += f"""
-        at_mu({start_time_variable} + self.timestamp_{name}{currentEvents["timeIndex"]})"""
+                writer.write(f"""
+        at_mu({start_time_variable} + self.timestamp_{name}{currentEvents["timeIndex"]})""")
             currentEvents["events"].sort(key=lambda x: -x.priority)
             for event in currentEvents["events"]:
-                code = event.generateRunCode()
-                if code is not None:
-                    runCode += code
+                event.writeRunCode(writer)
             if settings.getRelativeTimestampsEnabled():
-                runCode += f"""
-        delay_mu(self.delay_{name}{currentEvents["timeIndex"]})"""
+                writer.write(f"""
+        delay_mu(self.delay_{name}{currentEvents["timeIndex"]})""")
 
-    return runCode
 
+def writeAnalyzeCode(writer, events, methods=None):
+    # analyze() always ends with sending the result datasets, so it is never empty
+    writeEventsAnalyzeCode(writer, events, methods)
 
-def generateAnalyzeCode(events):
-    analyzeCode = ""
+    for externalGenerator in externalAnalyzeGenerators:
+        for externalAnalyse in externalGenerator():
+            writer.write(externalAnalyse)
 
+
+def writeEventsAnalyzeCode(writer, events, methods=None):
     # get and append the analyze code of every event
     for currentEvents in events:
         if "repeats" in currentEvents:
-            analyzeCode += generateAnalyzeCode(currentEvents["events"])
+            if methods is None or methods.isPrepared(currentEvents):
+                writeEventsAnalyzeCode(writer, currentEvents["events"], methods)
         else:
             for event in currentEvents["events"]:
-                code = event.generateAnalyzeCode()
-                if code is not None:
-                    analyzeCode += code
+                event.writeAnalyzeCode(writer)
 
-    if analyzeCode == "":
-        analyzeCode = """
-        pass"""
 
-    for externalGenerator in externalAnalyzeGenerators:
-        externalAnalyses = externalGenerator()
-        for externalAnalyse in externalAnalyses:
-            analyzeCode += externalAnalyse
-    return analyzeCode
+class SubsequenceMethods:
+    """Generates subsequences which are used more than once as shared @kernel methods.
+
+    Each of them is generated once as method taking its start time, all uses call it and share
+    the prepared data of the first use. The device state tracked during code generation is
+    unknown at the start of a method and after each call, so the events generate code that is
+    valid for every use. Subsequences with events which are not shareable stay inlined.
+    """
+
+    def __init__(self, events, devices):
+        self.devices = devices
+        self.uses = {}
+        self.countUses(events)
+        self.names = {name for name, (count, shareable) in self.uses.items() if count > 1 and shareable}
+        self.prepared = {}
+        self.methodCode = {}
+
+    def countUses(self, events):
+        shareable = True
+        for currentEvents in events:
+            if "repeats" in currentEvents:
+                subsequenceShareable = self.countUses(currentEvents["events"])
+                count, _shareable = self.uses.get(currentEvents["name"], (0, True))
+                self.uses[currentEvents["name"]] = (count + 1, subsequenceShareable)
+                shareable = shareable and subsequenceShareable
+            else:
+                shareable = shareable and all(event.shareable for event in currentEvents["events"])
+        return shareable
+
+    def isMethod(self, currentEvents):
+        return currentEvents["name"] in self.names
+
+    def addUse(self, currentEvents):
+        """Returns whether the prepare code of this use of the subsequence has to be generated."""
+        if not self.isMethod(currentEvents):
+            return True
+        if currentEvents["name"] in self.prepared:
+            return False
+        self.prepared[currentEvents["name"]] = currentEvents
+        return True
+
+    def isPrepared(self, currentEvents):
+        return not self.isMethod(currentEvents) or self.prepared.get(currentEvents["name"]) is currentEvents
+
+    def writeCall(self, writer, currentEvents, startTime):
+        name = currentEvents["name"]
+        if name not in self.methodCode:
+            self.resetDeviceStates()
+            methodWriter = CodeWriter()
+            writeRunCode(methodWriter, self.prepared[name]["events"], name, 0, "start_mu", self)
+            self.methodCode[name] = methodWriter.getvalue()
+        self.resetDeviceStates()
+        if self.methodCode[name] != "":
+            writer.write(f"""
+        self.subsequence_{name}({startTime})""")
+
+    def resetDeviceStates(self):
+        for device in self.devices:
+            device.resetTrackedState()
+
+    def writeMethodCode(self, writer):
+        for name, runCode in self.methodCode.items():
+            if runCode != "":
+                writer.write(f"""
+
+    @kernel
+    def subsequence_{name}(self, start_mu):""")
+                writer.write(runCode)
+
+
+class DmaSubsequences:
+    """Records repeated subsequences with core_dma and plays them back in every repetition.
+
+    A subsequence is recorded if it is repeated and all its events are recordable. The recordings
+    are made at the start of run() and their handles are local variables of run(), so only loops
+    written into run() itself are played back, not loops inside subsequence methods.
+    """
+
+    MIN_REPEATS = 2
+
+    def __init__(self, events):
+        self.recordings = []
+        self.hasEligible = self.findEligible(events)
+
+    def findEligible(self, events):
+        return any("repeats" in currentEvents and (self.isEligible(currentEvents) or self.findEligible(currentEvents["events"])) for currentEvents in events)
+
+    def isEligible(self, currentEvents):
+        return currentEvents["repeats"] >= DmaSubsequences.MIN_REPEATS and DmaSubsequences.isRecordable(currentEvents["events"])
+
+    @staticmethod
+    def isRecordable(events):
+        for currentEvents in events:
+            if "repeats" in currentEvents:
+                if not DmaSubsequences.isRecordable(currentEvents["events"]):
+                    return False
+            elif not all(event.recordable for event in currentEvents["events"]):
+                return False
+        return True
+
+    def addRecording(self, name, runCode):
+        """Adds the run code of one repetition and returns the variable of its handle.
+
+        Uses with the same run code, e.g. calls of a subsequence method, share one recording.
+        """
+        for recordingName, recordedRunCode in self.recordings:
+            if recordedRunCode == runCode:
+                return f"dma_handle_{recordingName}"
+        recordingName = f"{name}_{len(self.recordings)}"
+        self.recordings.append((recordingName, runCode))
+        return f"dma_handle_{recordingName}"
+
+    def writeRecordingCode(self, writer):
+        for recordingName, runCode in self.recordings:
+            writer.write(f"""
+        with self.core_dma.record("{recordingName}"):""")
+            with writer.indent():
+                if not settings.getRelativeTimestampsEnabled():
+                    writer.write("""
+        dma_start_mu = now_mu()""")
+                writer.write(runCode)
+        # every recording invalidates the handles taken before, so take them after all recordings
+        for recordingName, _runCode in self.recordings:
+            writer.write(f"""
+        dma_handle_{recordingName} = self.core_dma.get_handle("{recordingName}")""")
+
+
+class KnownDeviceState:
+    """Skips the init of devices which the previous run left initialized.
+
+    The names of the initialized devices and the state to restore (e.g. att_reg of Urukul CPLDs)
+    are kept in a broadcast dataset, which the master forgets when it restarts. It is cleared
+    at the start of init() and only written again when run() finishes, so the run after a
+    failed run initializes everything. The forceDeviceInit argument and deleting the dataset
+    (compiler.forgetKnownDeviceState) force the init as well.
+    """
+
+    DATASET = "known_device_state"
+
+    def __init__(self, devices):
+        self.devices = []
+        self.hasSkippable = any(device.skippableInit and device.generateInitCode() for device in devices)
+
+    def writeInitCode(self, writer, device):
+        initWriter = CodeWriter()
+        device.writeInitCode(initWriter)
+        if initWriter.isEmpty():
+            return
+        index = len(self.devices)
+        self.devices.append(device)
+        writer.write(f"""
+        if known_device_state[{2 * index}] == 0:""")
+        with writer.indent():
+            writer.write(initWriter.getvalue())
+        restoreCode = device.generateRestoreStateCode(f"known_device_state[{2 * index + 1}]")
+        if restoreCode:
+            writer.write("""
+        else:""")
+            with writer.indent():
+                writer.write(restoreCode)
+
+    def writeSaveCode(self, writer):
+        writer.write(f"""
+        self.set_known_device_state([{", ".join(device.generateKnownStateCode() for device in self.devices)}])""")
+
+    def writeFunctionCode(self, writer):
+        names = [device.name for device in self.devices]
+        writer.write(f"""
+
+    def get_known_device_state(self) -> TList(TInt32):
+        self.knownDeviceState = {{}} if self.forceDeviceInit else dict(self.get_dataset("{KnownDeviceState.DATASET}", {{}}, archive=False))
+        # cleared until this run finishes, so the next run initializes the devices again if this one fails
+        self.set_dataset("{KnownDeviceState.DATASET}", {{}}, broadcast=True, archive=False)
+        state = []
+        for name in {names}:
+            state += [int(name in self.knownDeviceState), self.knownDeviceState.get(name, 0)]
+        return state
+
+    def set_known_device_state(self, state) -> TNone:
+        knownDeviceState = dict(self.knownDeviceState)
+        knownDeviceState.update(zip({names}, state))
+        self.set_dataset("{KnownDeviceState.DATASET}", knownDeviceState, broadcast=True, archive=False)""")
 
 
 def generateFunctionCode(devices):
@@ -215,57 +417,156 @@ def generateFunctionCode(devices):
     return "\n".join(functions)
 
 
-def generateCode(seqName, sequenceJson, codeID):
-    jsonString = json.dumps(sequenceJson)
+def generateCode(seqName, sequenceJson, file=None, sidecarFiles=None, slackWarnings=None):
+    """Returns the experiment code, or writes it into file and returns None.
+
+    The codeID is only read from the argument of the experiment, so the same sequence always
+    generates the same code.
+    If sidecarFiles (a dict) is given, the sequence json and large arrays are added to it
+    (file name -> content) instead of being written into the code, see sidecars.writeSidecars.
+    If slackWarnings (a list) is given, the predicted RTIO underflows are added to it, see slack.predict.
+    """
+    code, _arguments = generateExperimentCode(seqName, sequenceJson, False, file, sidecarFiles, slackWarnings)
+    return code
+
+
+def generateParametricCode(seqName, sequenceJson, file=None, slackWarnings=None):
+    """Generates the experiment with every number of prepare() read from the prepareValues argument.
+
+    The sequence json is an argument as well, so all points of a scan which only change
+    these numbers generate the same code and can share one experiment file.
+    Returns the code (None if written into file) and its arguments except codeID.
+    """
+    return generateExperimentCode(seqName, sequenceJson, True, file, slackWarnings=slackWarnings)
+
+
+def generateExperimentCode(seqName, sequenceJson, isParametric, file=None, sidecarFiles=None, slackWarnings=None):
+    jsonString = json.dumps(sequenceJson.toJson() if isinstance(sequenceJson, timeline.Timeline) else sequenceJson)
 
     event_builder.preProccess(sequenceJson)
     devices, events = event_builder.generateDevicesAndEvents(sequenceJson)
-
-    importCode = generateImportCode(events)
-    buildCode = generateBuildCode(devices)
-    prepareCode = generatePrepareCode(events, name="", jsonString=jsonString)
-    initCode = generateInitCode(devices)
-    runCode = generateRunCode(events)
-    analyzeCode = generateAnalyzeCode(events)
-    functionCode = generateFunctionCode(devices)
+    if slackWarnings is not None:
+        slackWarnings.extend(slack.predict(events).getWarnings())
+    methods = SubsequenceMethods(events, devices) if settings.getSubsequenceMethodsEnabled() else None
+    dma = None
+    if settings.getDmaSubsequencesEnabled() and "core_dma" in crate.device_db:
+        dma = DmaSubsequences(events)
+        if not dma.hasEligible:
+            dma = None
+    knownState = None
+    if settings.getKnownDeviceStateEnabled():
+        knownState = KnownDeviceState(devices)
+        if not knownState.hasSkippable:
+            knownState = None
     className = util.textToIdentifier(seqName)
+    # parametric code is shared by many points, their data stays inline
+    writer = CodeWriter(file, sidecars=None if isParametric else sidecarFiles)
 
-    return f"""
+    writer.write(f"""
 from artiq.experiment import *
 from artiq.coredevice.ad9910 import (PHASE_MODE_TRACKING, PHASE_MODE_ABSOLUTE, RAM_DEST_ASF, RAM_DEST_POW, RAM_DEST_FTW, RAM_DEST_POWASF, RAM_MODE_DIRECTSWITCH, RAM_MODE_RAMPUP, RAM_MODE_BIDIR_RAMP, RAM_MODE_CONT_RAMPUP, RAM_MODE_CONT_BIDIR_RAMP, _AD9910_REG_RAM)
 from artiq.coredevice import urukul
 from artiq.coredevice import spi2 as spi
 import numpy as np
-{importCode}
+{generateImportCode(events)}""")
+    if writer.sidecars is not None:
+        writer.write(f"""
+{sidecars.IMPORT_CODE}{sidecars.LOADER_CODE}""")
+    writer.write(f"""
 
 class {className}(EnvExperiment):
 
-    def build(self):{buildCode}
-
-{functionCode}
-
-    def prepare(self):
-        if self.codeID != {codeID}:
-            raise AssertionError("Sequence Control tried to execute the wrong generated code. Maybe wrong artiq_master running? I am {codeID}, but got " + str(self.codeID))
-        {prepareCode}        
+    def build(self):""")
+    writeBuildCode(writer, devices)
+    if dma is not None:
+        writer.write("""
+        self.setattr_device("core_dma")""")
+    if knownState is not None:
+        writer.write("""
+        self.setattr_argument("forceDeviceInit", BooleanValue(False))""")
+    # a MultiRun passes the datasets it collects the results of the run from
+    writer.write("""
+        self.setattr_argument("resultDatasets", PYONValue([]))""")
+    if isParametric:
+        writer.write("""
+        self.setattr_argument("sequenceJson", StringValue(""))
+        self.setattr_argument("prepareValues", PYONValue([]))
+        self.setattr_argument("scanVariables", PYONValue({}))""")
+    writer.write(f"""
+
+{generateFunctionCode(devices)}
+
+    def prepare(self):""")
+
+    if isParametric:
+        # the numbers are replaced in the whole prepare code, so collect it first
+        prepareWriter = CodeWriter()
+        writePrepareCode(prepareWriter, events, jsonString=None, methods=methods)
+        prepareCode, prepareValues = parametric.parametrizeNumbers(prepareWriter.getvalue(), "prepareValues")
+        arguments = {"sequenceJson": jsonString, "prepareValues": prepareValues}
+        writer.write(f"""
+        if len(self.prepareValues) != {len(prepareValues)}:
+            raise AssertionError("Sequence Control tried to execute the wrong generated code. I need {len(prepareValues)} prepare values, but got " + str(len(self.prepareValues)))
+        prepareValues = self.prepareValues
+        self.codeIDString = str(self.codeID)
+        """)
+        writer.write(prepareCode)
+    else:
+        arguments = {}
+        writer.write("""
+        self.codeIDString = str(self.codeID)
+        """)
+        writePrepareCode(writer, events, jsonString=jsonString, methods=methods)
+
+    writer.write("""        
 
     @kernel
-    def init(self):{initCode}
+    def init(self):""")
+    writeInitCode(writer, devices, knownState)
+    writer.write("""
 
     @kernel
     def run(self):
         self.core.break_realtime()
-        self.init()
+        self.init()""")
+    if dma is not None:
+        # the recordings have to be made before the sequence starts, so generate it first
+        runWriter = CodeWriter()
+        writeRunCode(runWriter, events, methods=methods, dma=dma)
+        dma.writeRecordingCode(writer)
+    writer.write(f"""
         delay(5*ms)
         self.core.break_realtime()
-        self.{gui.widgets.RPC.device_name}.sequenceStarted(\"{codeID}\", \"{seqName}\")
+        self.{gui.widgets.RPC.device_name}.sequenceStarted(self.codeIDString, \"{seqName}\")
         self.core.break_realtime()
         delay(5*ms)
         start_mu = now_mu()
-        {runCode}
+        """)
+    if dma is not None:
+        writer.write(runWriter.getvalue())
+    else:
+        writeRunCode(writer, events, methods=methods)
+    writer.write("""
         delay(5*ms)
-        self.core.wait_until_mu(now_mu())
-        self.{gui.widgets.RPC.device_name}.sequenceFinished(\"{codeID}\", \"{seqName}\")
-
-    def analyze(self):{analyzeCode}
-    """
+        self.core.wait_until_mu(now_mu())""")
+    if knownState is not None:
+        knownState.writeSaveCode(writer)
+    writer.write(f"""
+        self.{gui.widgets.RPC.device_name}.sequenceFinished(self.codeIDString, \"{seqName}\")
+
+    def analyze(self):""")
+    writeAnalyzeCode(writer, events, methods)
+    writer.write(f"""
+        if len(self.resultDatasets) > 0:
+            self.{gui.widgets.RPC.device_name}.runResults(self.codeIDString, {{name: self.get_dataset(name, None, archive=False) for name in self.resultDatasets}})""")
+    if methods is not None:
+        methods.writeMethodCode(writer)
+    if knownState is not None:
+        knownState.writeFunctionCode(writer)
+    writer.write("""
+    """)
+
+    if file is not None:
+        writer.flush()
+        return None, arguments
+    return writer.getvalue(), arguments
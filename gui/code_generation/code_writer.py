@@ -0,0 +1,66 @@
+import contextlib
+import io
+
+INDENTATION = "    "
+
+
+class CodeWriter:
+    """Output buffer of the code generation.
+
+    Code is written in snippets like the generate*Code methods of events and devices return them,
+    starting with a newline and indented for a method body. Inside indent() every written line
+    is indented by one more level, e.g. for the body of a loop.
+
+    Snippets are collected in a list and joined into the output whenever bufferSize characters
+    are pending. The output is the given file, so code can be streamed into the experiment file,
+    or a string buffer read with getvalue().
+
+    If sidecars (file name -> content) is given, bulk data can be added to it instead of being
+    written inline, see gui.code_generation.sidecars.
+    """
+
+    def __init__(self, file=None, bufferSize=1 << 16, sidecars=None):
+        self.output = io.StringIO() if file is None else file
+        self.bufferSize = bufferSize
+        self.chunks = []
+        self.pending = 0
+        self.written = 0
+        self.indentation = ""
+        self.sidecars = sidecars
+
+    def write(self, code):
+        if code is None or code == "":
+            return
+        if self.indentation != "":
+            code = code.replace("\n", "\n" + self.indentation)
+        self.chunks.append(code)
+        self.pending += len(code)
+        if self.pending >= self.bufferSize:
+            self.flush()
+
+    @contextlib.contextmanager
+    def indent(self, levels=1):
+        previousIndentation = self.indentation
+        self.indentation += INDENTATION * levels
+        try:
+            yield self
+        finally:
+            self.indentation = previousIndentation
+
+    def position(self):
+        """Number of characters written so far, to check whether a generator wrote anything."""
+        return self.written + self.pending
+
+    def isEmpty(self):
+        return self.position() == 0
+
+    def flush(self):
+        if len(self.chunks) > 0:
+            self.output.write("".join(self.chunks))
+            self.chunks.clear()
+            self.written += self.pending
+            self.pending = 0
+
+    def getvalue(self):
+        self.flush()
+        return self.output.getvalue()
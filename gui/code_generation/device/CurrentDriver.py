@@ -1,3 +1,7 @@
+import numpy as np
+
+import gui.code_generation.hardware_util as hardware_util
+
 from .Device import Device
 
 
@@ -13,3 +17,8 @@ class CurrentDriver(Device):
         return f"""
         self.{self.handlerVariableName} = CurrentDriverHandler(self.{self.name})
 """
+
+    def voltagesToMu(self, voltages):
+        # voltage_to_mu of the CurrentDriverHandler in the generated code
+        voltage_bits = hardware_util.voltagesToMu(voltages, lambda voltage: np.trunc(2**20 / 20 * (voltage + 10)), maxMu=(1 << 20) - 1)
+        return (1 << 24) | (voltage_bits << 4)
@@ -2,6 +2,10 @@ from ..event.Event import Event
 
 
 class Device:
+    # devices whose init only has to run once after the hardware was reset set this to True,
+    # with the known device state setting their init is skipped if the previous run left them initialized
+    skippableInit = False
+
     def __init__(self, name, relatedDevices=None):
         self.name = name
         self.relatedDevices = relatedDevices or []  # give default value if argument is None
@@ -31,6 +35,28 @@ class Device:
     def generateInitCode(self):
         return None
 
+    def generateKnownStateCode(self):
+        """Kernel expression (int32) of the device state a run skipping the init has to restore."""
+        return "0"
+
+    def generateRestoreStateCode(self, state):
+        """Code restoring the state (a kernel expression) instead of the init."""
+        return None
+
+    # the code generation writes through these into a CodeWriter
+    def writeSetattrCode(self, writer):
+        writer.write(self.generate_setattr_string_code())
+
+    def writeBuildCode(self, writer):
+        writer.write(self.generateBuildCode())
+
+    def writeInitCode(self, writer):
+        writer.write(self.generateInitCode())
+
+    def resetTrackedState(self):
+        """Forgets the device state events track during code generation, e.g. at the start of a shared kernel method."""
+        pass
+
     def generateBuildCode(self):
         return None
 
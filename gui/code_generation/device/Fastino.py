@@ -1,3 +1,7 @@
+import numpy as np
+
+import gui.code_generation.hardware_util as hardware_util
+import gui.crate as crate
 import gui.settings as settings
 
 from .Device import Device
@@ -6,6 +10,14 @@ from .Device import Device
 class Fastino(Device):
     def __init__(self, name):
         super().__init__(name)
+        # channels updated together by grouped events, they only take new values on update()
+        self.heldChannels = 0
+        # gateware with log2_width > 0 writes the channels in groups of groupWidth with set_group_mu
+        arguments = crate.device_db.get(name, {}).get("arguments", {})
+        self.groupWidth = 1 << arguments.get("log2_width", 0)
+
+    def holdChannels(self, channels):
+        self.heldChannels |= getChannelMask(channels)
 
     def generateInitCode(self):
         code = f"""
@@ -15,4 +27,40 @@ class Fastino(Device):
         delay(2*us)
         self.{self.name}.set_cfg(reset=0, afe_power_down=1, dac_clr=0, clr_err=0)
         delay(2*us)"""
+        if self.heldChannels != 0:
+            code += f"""
+        delay(2*us)
+        self.{self.name}.set_hold({toInt32(self.heldChannels)})
+        delay(2*us)"""
         return code
+
+    def getChannelGroups(self, channels):
+        """First channel of every group of groupWidth channels that contains one of channels, sorted."""
+        return sorted({int(channel) - int(channel) % self.groupWidth for channel in channels})
+
+    def voltagesToMu(self, voltages):
+        # voltage_to_mu of artiq.coredevice.fastino
+        return hardware_util.voltagesToMu(voltages, lambda voltage: np.rint((0x8000 / 10.0) * voltage) + 0x8000)
+
+
+def getChannelMask(channels):
+    mask = 0
+    for channel in channels:
+        mask |= 1 << int(channel)
+    return mask
+
+
+def packGroupData(data):
+    """Packs machine units of consecutive channels (last axis) into the int32 words of set_group_mu,
+    the even channel in the low and the odd channel in the high 16 bits.
+    An odd number of channels leaves the high half of the last word 0."""
+    data = np.asarray(data, dtype=np.uint32)
+    if data.shape[-1] % 2 == 1:
+        data = np.concatenate([data, np.zeros(data.shape[:-1] + (1,), dtype=np.uint32)], axis=-1)
+    words = data[..., 0::2] | (data[..., 1::2] << 16)
+    return words.view(np.int32)
+
+
+def toInt32(mask):
+    # channel masks are int32 on the core device
+    return mask - (1 << 32) if mask >= 1 << 31 else mask
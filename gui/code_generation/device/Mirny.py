@@ -10,6 +10,9 @@ class Mirny(Device):
         self.almaznyDeviceName = None
         self.cpld.addChannel(self)
 
+    def resetTrackedState(self):
+        self.enabled = None
+
     def setAlmaznyDeviceName(self, almaznyDeviceName):
         self.almaznyDeviceName = almaznyDeviceName
 
@@ -34,6 +37,8 @@ class Mirny(Device):
 
 
 class MirnyCPLD(Device):
+    skippableInit = True
+
     def __init__(self, name):
         super().__init__(name)
         self.priority = 20
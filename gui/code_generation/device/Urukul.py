@@ -1,7 +1,10 @@
+import gui.crate as crate
+
 from .Device import Device
 
 
 class Urukul(Device):
+    skippableInit = True
 
     def __init__(self, name, cpld):
         super().__init__(name, [cpld])
@@ -13,6 +16,7 @@ class Urukul(Device):
         self.cpld = cpld
         self.cpld.addChannel(self)
         self.ramEvents = []
+        self.ftwPerHz = getFtwPerHz(name, cpld.name)
 
         self.functions.append(
             """
@@ -37,6 +41,10 @@ class Urukul(Device):
         )
         return code
 
+    def resetTrackedState(self):
+        self.state = "unknown"
+        self.last_sweep_dir = None
+
     def addRamEvent(self, ramEvent):
         self.ramEvents.append(ramEvent)
 
@@ -44,7 +52,19 @@ class Urukul(Device):
         self.need_init = True
 
 
+def getFtwPerHz(name, cpldName):
+    # sysclk of artiq.coredevice.ad9910 from the arguments of the channel and its CPLD in device_db
+    arguments = crate.device_db.get(name, {}).get("arguments", {})
+    cpldArguments = crate.device_db.get(cpldName, {}).get("arguments", {})
+    clock = cpldArguments.get("refclk", 125e6) / [4, 1, 2, 4][cpldArguments.get("clk_div", 0)]
+    if arguments.get("pll_en", 1):
+        clock *= arguments.get("pll_n", 40)
+    return (1 << 32) / clock
+
+
 class UrukulCPLD(Device):
+    skippableInit = True
+
     def __init__(self, name):
         super().__init__(name)
         self.priority = 20
@@ -73,3 +93,13 @@ class UrukulCPLD(Device):
         self.{self.name}.get_att_mu()
         delay(1 * ms)"""
         return code
+
+    # set_att writes the attenuators of all channels from att_reg, so it has to be known
+    def generateKnownStateCode(self):
+        return f"self.{self.name}.att_reg" if self.need_get_att else "0"
+
+    def generateRestoreStateCode(self, state):
+        if self.need_get_att:
+            return f"""
+        self.{self.name}.att_reg = {state}"""
+        return None
@@ -1,11 +1,24 @@
+import numpy as np
+
+import gui.code_generation.hardware_util as hardware_util
+import gui.crate as crate
+
 from .Device import Device
 
 
 class Zotino(Device):
     def __init__(self, name):
         super().__init__(name)
+        arguments = crate.device_db.get(name, {}).get("arguments", {})
+        self.vref = arguments.get("vref", 5.0)
+        self.offsetDacs = arguments.get("offset_dacs", 0x2000)
 
     def generateInitCode(self):
         return f"""
         self.{self.name}.init()
         delay(1 * ms)"""
+
+    def voltagesToMu(self, voltages):
+        # voltage_to_mu of artiq.coredevice.ad53xx, the offset DACs shift the range of 4 * vref
+        minVoltage = -self.offsetDacs * 0x4 * 4.0 * self.vref / (1 << 16)
+        return hardware_util.voltagesToMu(voltages, lambda voltage: np.rint((1 << 16) * (voltage / (4.0 * self.vref)) + self.offsetDacs * 0x4), minVoltage, minVoltage + 4.0 * self.vref)
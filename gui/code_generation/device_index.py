@@ -0,0 +1,76 @@
+import gui.crate as crate
+
+
+class PortInfo:
+    def __init__(self, module, device, channel):
+        self.module = module
+        self.device = device
+        self.channel = channel
+
+
+class DeviceIndex:
+    """Lookups into the labsetup and device_db the event builder needs for every port of every segment.
+
+    Built once per labsetup and device_db, see getIndex.
+    """
+
+    def __init__(self, labsetup, device_db):
+        self.labsetup = labsetup
+        self.device_db = device_db
+        self.ports = {}  # port name -> PortInfo
+        for portName, portData in labsetup.items():
+            if portData.get("isDir", False):
+                continue
+            self.ports[portName] = PortInfo(portData.get("module"), portData.get("device"), portData.get("channel"))
+        self.cplds = {}  # device name -> cpld device name
+        self.cpldChannels = {}  # cpld device name -> names of its channel devices
+        self.deviceChannels = {}  # device name -> channel argument
+        self.almaznyChannels = {}  # (mirny cpld device name, channel) -> almazny channel device name
+        for deviceName, deviceData in device_db.items():
+            # aliases are strings
+            if not isinstance(deviceData, dict):
+                continue
+            arguments = deviceData.get("arguments", {})
+            if "cpld_device" in arguments:
+                self.cplds[deviceName] = arguments["cpld_device"]
+                self.cpldChannels.setdefault(arguments["cpld_device"], []).append(deviceName)
+            if "channel" in arguments:
+                self.deviceChannels[deviceName] = arguments["channel"]
+            if deviceData.get("class") == "AlmaznyChannel":
+                self.almaznyChannels.setdefault((arguments["host_mirny"], arguments["channel"]), deviceName)
+
+    def getPort(self, portName):
+        return self.ports[portName]
+
+    def getModule(self, portName):
+        return self.ports[portName].module
+
+    def getCpld(self, deviceName):
+        return self.cplds[deviceName]
+
+    def getAlmaznyChannel(self, mirnyCpldName, channel):
+        return self.almaznyChannels.get((mirnyCpldName, channel))
+
+
+index = None
+
+
+def getIndex():
+    global index
+    # loading a crate or a device_db replaces the dicts
+    if index is None or index.labsetup is not crate.labsetup or index.device_db is not crate.device_db:
+        index = DeviceIndex(crate.labsetup, crate.device_db)
+    return index
+
+
+def invalidate():
+    global index
+    index = None
+
+
+def onCrateAction(action):
+    if action["target"] == "labsetup":
+        invalidate()
+
+
+crate.actionCallbacks.append(onCrateAction)
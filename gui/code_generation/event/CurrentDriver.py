@@ -1,4 +1,6 @@
 import gui.code_generation.hardware_util as hardware_util
+import gui.code_generation.sidecars as sidecars
+import gui.code_generation.slack as slack
 
 from .Event import Event
 
@@ -15,12 +17,11 @@ class CurrentDriverEvent(Event):  # For the CurrentDriver 1V on DAC will output
         self.stepTime = duration / self.stepCount - 528e-9  # 528 ns because 125 MHz RTIO Clock, divided by 2 -> 62.5 MHz -> 16ns per step, -> times 33 steps is 528 ns
         assert self.stepTime > -1e-9, "CurrentDriver Error: Step time too small, you may need to increase the duration."
         self.stepTime = max(self.stepTime, 0)
+        # voltages are converted to machine units here, with the voltage_to_mu of the CurrentDriverHandler
+        self.voltageData = int(self.device.voltagesToMu([voltage])[0])
         self.sweepData = []
         if self.sweep_voltage is not None:
-            dataX, dataY = hardware_util.formulaTextToDataPoints(self.stepCount, formula_text)
-            dataX, dataY = hardware_util.scaleFormulaData(dataX, dataY, duration, voltage, sweep_voltage)
-            for j in range(self.stepCount):
-                self.sweepData.append(dataY[j])
+            self.sweepData = self.device.voltagesToMu(hardware_util.getSweepVoltages(formula_text, self.stepCount, voltage, sweep_voltage))
 
     def generateImportCode(self):
         return """
@@ -55,12 +56,21 @@ class CurrentDriverHandler:
         self.{self.device.handlerVariableName}.set_voltage_mu(self.{self.voltageVariableName})"""
         return code
 
-    def generatePrepareCode(self):
+    def writePrepareCode(self, writer):
+        writer.write(self.generatePrepareCode(writer.sidecars))
+
+    def generatePrepareCode(self, sidecarFiles=None):
         if self.sweep_voltage is not None:
             code = f"""
-        self.{self.sweepVariableName} = [self.{self.device.handlerVariableName}.voltage_to_mu(voltage) for voltage in {self.sweepData}]
+        self.{self.sweepVariableName} = {sidecars.getArrayCode(sidecarFiles, self.sweepData)}
         self.{self.stepTimeVariableName} = self.core.seconds_to_mu({self.stepTime})"""
         else:
             code = f"""
-        self.{self.voltageVariableName} = self.{self.device.handlerVariableName}.voltage_to_mu({self.voltage})"""
+        self.{self.voltageVariableName} = {self.voltageData}"""
         return code
+
+    def estimateTiming(self):
+        # set_config_mu and write per step
+        writes = self.stepCount if self.sweep_voltage is not None else 1
+        spread = (self.stepTime + slack.CURRENT_DRIVER_WRITE_TIME) * self.stepCount if self.sweep_voltage is not None else 0.0
+        return 2 * writes * slack.SPI_WRITE_CPU_TIME, spread, {self.device.name: writes * slack.CURRENT_DRIVER_WRITE_TIME}
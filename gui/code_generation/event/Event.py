@@ -1,4 +1,14 @@
 class Event:
+    # events which can only run once per generated code (own start time, own data) set this to False,
+    # subsequences containing them are not generated as shared kernel methods
+    shareable = True
+    # events which can not be recorded with core_dma (inputs, RPCs, waits for the CPU) set this to False,
+    # subsequences containing them are not played back with core_dma
+    recordable = True
+    # events whose run code waits for the time cursor (wait_until_mu, input gates) set this to True,
+    # there is no slack left after them, see gui.code_generation.slack
+    waitsForTimeline = False
+
     def __init__(self, time, duration, device):
         self.time = time
         self.duration = duration
@@ -24,5 +34,20 @@ class Event:
     def generateAnalyzeCode(self):
         return None
 
+    # the code generation writes through these into a CodeWriter,
+    # events producing large code can override them to write it in parts
+    def writePrepareCode(self, writer):
+        writer.write(self.generatePrepareCode())
+
+    def writeRunCode(self, writer):
+        writer.write(self.generateRunCode())
+
+    def writeAnalyzeCode(self, writer):
+        writer.write(self.generateAnalyzeCode())
+
     def getTimeCursorShift(self):
         return 0
+
+    def estimateTiming(self):
+        """Rough (CPU time, time the RTIO events are spread over, {SPI bus: busy time}) of the run code in seconds."""
+        return 0.0, 0.0, {}
@@ -1,4 +1,10 @@
+import numpy as np
+
 import gui.code_generation.hardware_util as hardware_util
+import gui.code_generation.sidecars as sidecars
+import gui.code_generation.slack as slack
+import gui.settings as settings
+from gui.code_generation.device.Fastino import getChannelMask, packGroupData, toInt32
 
 from .Event import Event
 
@@ -30,34 +36,68 @@ class FastinoEvent(Event):
         self.channelRotateSingleTime = 5e-8
         self.stepTime = (duration - self.channelRotateSingleTime * len(self.channelList))/ self.stepCount
         self.channelRotateStepTime = self.stepTime / (len(self.sweepChannelList) + len(self.datasetChannelList)) if (len(self.sweepChannelList) + len(self.datasetChannelList)) > 0 else 0
+        # grouped updates write the channels while they are held and update them all at once, so there is no skew
+        self.groupedUpdates = settings.getFastinoGroupedUpdates()
+        if self.groupedUpdates:
+            self.groupStepTimeVariableName = self.device.generateVariableName("group_step_time")
+            self.device.holdChannels(self.channelList)
+            self.updateMask = getChannelMask(self.channelList)
+            self.sweepUpdateMask = getChannelMask(self.sweepChannelList + self.datasetChannelList)
+            if self.device.groupWidth > 1:
+                # set_group_mu writes every channel of a group, the ones this event does not set would be cleared
+                self.groupVariableName = self.device.generateVariableName("group_voltages")
+                self.groupSweepVariableName = self.device.generateVariableName("group_sweep_voltages")
+                self.groups = self.device.getChannelGroups(self.channelList)
+                self.sweepGroups = self.device.getChannelGroups(self.sweepChannelList + self.datasetChannelList)
+                ownChannels = {int(channel) for channel in self.channelList}
+                missingChannels = [channel for group in self.groups for channel in range(group, group + self.device.groupWidth) if channel not in ownChannels]
+                assert not missingChannels, f"Fastino Error: grouped updates write groups of {self.device.groupWidth} channels, the event has to set channels {missingChannels} as well."
+                self.writeCount = len(self.groups)
+                self.sweepWriteCount = len(self.sweepGroups)
+            else:
+                self.writeCount = len(self.channelList)
+                self.sweepWriteCount = len(self.sweepChannelList) + len(self.datasetChannelList)
+            # the update of the constant channels takes one more channel slot
+            self.stepTime = (duration - self.channelRotateSingleTime * (self.writeCount + 1)) / self.stepCount
+            self.groupStepTime = self.stepTime - self.channelRotateSingleTime * self.sweepWriteCount
+            assert self.groupStepTime > 0, "Fastino Error: Step time too small for grouped updates, you may need to increase the duration."
         self.sweepVoltagesList = [self.channels[channel]["sweep_voltage"] for channel in self.sweepChannelList]
 
         self.formulaList = [self.channels[channel]["formula_text"] for channel in self.sweepChannelList]
-        self.sweepData = []
-        for j in range(self.stepCount):
-            self.sweepData.append([])
+        # voltages are converted to machine units here, with the transfer function of the device
+        self.voltagesData = self.device.voltagesToMu(self.voltagesList)
+        sweepVoltages = np.zeros((self.stepCount, len(self.sweepChannelList)))
         for i in range(len(self.sweepChannelList)):
             voltage = self.voltagesList[self.channelList.index(self.sweepChannelList[i])]
-            sweep_voltage = self.sweepVoltagesList[i]
-            dataX, dataY = hardware_util.formulaTextToDataPoints(self.stepCount, self.formulaList[i])
-            dataX, dataY = hardware_util.scaleFormulaData(dataX, dataY, duration, voltage, sweep_voltage)
-            for j in range(self.stepCount):
-                self.sweepData[j].append(dataY[j])
-    
-        self.loadedData = []
-        for j in range(self.stepCount):
-            self.loadedData.append([])
-        for i in range(len(self.loaded_datasetList)):
-            dataY = self.loaded_datasetList[i]['y']
-            for j in range(self.stepCount):
-                self.loadedData[j].append(dataY[j])
+            sweepVoltages[:, i] = hardware_util.getSweepVoltages(self.formulaList[i], self.stepCount, voltage, self.sweepVoltagesList[i])
+        self.sweepData = self.device.voltagesToMu(sweepVoltages)
 
-                
-
-        
+        loadedVoltages = np.zeros((self.stepCount, len(self.loaded_datasetList)))
+        for i in range(len(self.loaded_datasetList)):
+            loadedVoltages[:, i] = self.loaded_datasetList[i]['y'][: self.stepCount]
+        self.loadedData = self.device.voltagesToMu(loadedVoltages)
+        if self.groupedUpdates and self.device.groupWidth > 1:
+            self.setGroupData()
 
+    def setGroupData(self):
+        """The set_group_mu words of the groups, the swept groups of every step also carry the constant channels."""
+        width = self.device.groupWidth
+        constantData = {int(channel): self.voltagesData[i] for i, channel in enumerate(self.channelList)}
+        self.groupData = packGroupData([[constantData[channel] for channel in range(group, group + width)] for group in self.groups])
+        stepData = {channel: np.full(self.stepCount, value) for channel, value in constantData.items()}
+        for i, channel in enumerate(self.sweepChannelList):
+            stepData[int(channel)] = self.sweepData[:, i]
+        for i, channel in enumerate(self.datasetChannelList):
+            stepData[int(channel)] = self.loadedData[:, i]
+        sweepGroupData = np.zeros((self.stepCount, len(self.sweepGroups), width), dtype=np.int32)
+        for j, group in enumerate(self.sweepGroups):
+            for k in range(width):
+                sweepGroupData[:, j, k] = stepData[group + k]
+        self.sweepGroupData = packGroupData(sweepGroupData)
 
     def generateRunCode(self):
+        if self.groupedUpdates:
+            return self.generateGroupedRunCode()
         code = ""
         for i in range(len(self.channelList)):
             channel = self.channelList[i]
@@ -82,24 +122,103 @@ class FastinoEvent(Event):
             self.{self.device.name}.set_dac_mu({int(datasetChannel)}, self.{self.datasetVariableName}[i][{i}])"""
         return code
 
-    def generatePrepareCode(self):
+    def generateGroupedRunCode(self):
+        if self.device.groupWidth > 1:
+            return self.generateGroupWriteRunCode()
+        code = ""
+        for i in range(len(self.channelList)):
+            code += f"""
+        self.{self.device.name}.set_dac_mu({int(self.channelList[i])}, self.{self.variableName}[{i}])
+        delay_mu(self.{self.channelRotateSingleTimeVariableName})"""
+        code += f"""
+        self.{self.device.name}.update({toInt32(self.updateMask)})
+        delay_mu(self.{self.channelRotateSingleTimeVariableName})"""
+        if len(self.sweepChannelList) + len(self.datasetChannelList) > 0:
+            code += f"""
+        for i in range({self.stepCount}):"""
+            for i in range(len(self.sweepChannelList)):
+                code += f"""
+            self.{self.device.name}.set_dac_mu({int(self.sweepChannelList[i])}, self.{self.sweepVariableName}[i][{i}])
+            delay_mu(self.{self.channelRotateSingleTimeVariableName})"""
+            for i in range(len(self.datasetChannelList)):
+                code += f"""
+            self.{self.device.name}.set_dac_mu({int(self.datasetChannelList[i])}, self.{self.datasetVariableName}[i][{i}])
+            delay_mu(self.{self.channelRotateSingleTimeVariableName})"""
+            code += f"""
+            self.{self.device.name}.update({toInt32(self.sweepUpdateMask)})
+            delay_mu(self.{self.groupStepTimeVariableName})"""
+        return code
+
+    def generateGroupWriteRunCode(self):
+        # one RTIO write per group instead of one per channel
+        code = ""
+        for j in range(len(self.groups)):
+            code += f"""
+        self.{self.device.name}.set_group_mu({self.groups[j]}, self.{self.groupVariableName}[{j}])
+        delay_mu(self.{self.channelRotateSingleTimeVariableName})"""
+        code += f"""
+        self.{self.device.name}.update({toInt32(self.updateMask)})
+        delay_mu(self.{self.channelRotateSingleTimeVariableName})"""
+        if len(self.sweepGroups) > 0:
+            code += f"""
+        for i in range({self.stepCount}):"""
+            for j in range(len(self.sweepGroups)):
+                code += f"""
+            self.{self.device.name}.set_group_mu({self.sweepGroups[j]}, self.{self.groupSweepVariableName}[i][{j}])
+            delay_mu(self.{self.channelRotateSingleTimeVariableName})"""
+            code += f"""
+            self.{self.device.name}.update({toInt32(self.sweepUpdateMask)})
+            delay_mu(self.{self.groupStepTimeVariableName})"""
+        return code
+
+    def writePrepareCode(self, writer):
+        writer.write(self.generatePrepareCode(writer.sidecars))
+
+    def generatePrepareCode(self, sidecarFiles=None):
+        if self.groupedUpdates and self.device.groupWidth > 1:
+            return self.generateGroupWritePrepareCode(sidecarFiles)
         code = f"""
-        self.{self.variableName} = [self.{self.device.name}.voltage_to_mu(voltage) for voltage in {self.voltagesList}]
+        self.{self.variableName} = {self.voltagesData.tolist()}
         self.{self.channelRotateSingleTimeVariableName} = self.core.seconds_to_mu({self.channelRotateSingleTime})"""
         if len(self.sweepChannelList) > 0:
             code += f"""
-        self.{self.sweepVariableName} = [[self.{self.device.name}.voltage_to_mu(voltage) for voltage in step] for step in {self.sweepData}]"""
+        self.{self.sweepVariableName} = {sidecars.getArrayCode(sidecarFiles, self.sweepData)}"""
         if len(self.sweepChannelList) > 0 or len(self.loaded_datasetList) > 0:
             code += f"""
         self.{self.channelRotateStepTimeVariableName} = self.core.seconds_to_mu({self.channelRotateStepTime})"""
         if len(self.loaded_datasetList) > 0:
             code+= f'''
-        self.{self.datasetVariableName} = [[self.{self.device.name}.voltage_to_mu(voltage) for voltage in step] for step in {self.loadedData}]
+        self.{self.datasetVariableName} = {sidecars.getArrayCode(sidecarFiles, self.loadedData)}
         '''
+        if self.groupedUpdates:
+            code += f"""
+        self.{self.groupStepTimeVariableName} = self.core.seconds_to_mu({self.groupStepTime})"""
+        return code
+
+    def generateGroupWritePrepareCode(self, sidecarFiles=None):
+        code = f"""
+        self.{self.groupVariableName} = {self.groupData.tolist()}
+        self.{self.channelRotateSingleTimeVariableName} = self.core.seconds_to_mu({self.channelRotateSingleTime})
+        self.{self.groupStepTimeVariableName} = self.core.seconds_to_mu({self.groupStepTime})"""
+        if len(self.sweepGroups) > 0:
+            code += f"""
+        self.{self.groupSweepVariableName} = {sidecars.getArrayCode(sidecarFiles, self.sweepGroupData)}"""
         return code
 
     def getTimeCursorShift(self):
-        if len(self.sweepChannelList) > 0:
-            return self.stepTime * self.stepCount
+        shift = self.stepTime * self.stepCount if len(self.sweepChannelList) > 0 else 0
+        if self.groupedUpdates:
+            # the update of the constant channels
+            shift += self.channelRotateSingleTime
+        return shift
+
+    def estimateTiming(self):
+        # Fastino has its own link, every sample is a single RTIO event
+        sweptChannelCount = len(self.sweepChannelList) + len(self.datasetChannelList)
+        if self.groupedUpdates:
+            # the group writes and the update of every step
+            writes = self.writeCount + 1 + (self.stepCount * (self.sweepWriteCount + 1) if sweptChannelCount > 0 else 0)
         else:
-            return 0
+            writes = len(self.channelList) + (self.stepCount * sweptChannelCount if sweptChannelCount > 0 else 0)
+        spread = self.stepTime * self.stepCount if sweptChannelCount > 0 else 0.0
+        return writes * slack.RTIO_EVENT_CPU_TIME, spread, {}
@@ -1,5 +1,7 @@
 from numpy import int32
 
+import gui.code_generation.slack as slack
+
 from .Event import Event
 
 
@@ -59,3 +61,11 @@ class MirnyEvent(Event):
 
     def generatePrepareCode(self):
         return None
+
+    def estimateTiming(self):
+        # set_frequency writes several PLL registers
+        writes = (self.attenuation is not None) + (6 if self.freq is not None else 0)
+        cpuTime = writes * slack.SPI_WRITE_CPU_TIME + (self.switch is not None) * slack.RTIO_EVENT_CPU_TIME
+        if self.freq is not None:
+            cpuTime += slack.MIRNY_SET_FREQUENCY_CPU_TIME
+        return cpuTime, 0.0, {self.device.cpld.name: writes * slack.SPI_WRITE_BUS_TIME}
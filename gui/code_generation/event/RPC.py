@@ -1,7 +1,11 @@
+import gui.code_generation.slack as slack
+
 from .Event import Event
 
 
 class RPCEvent(Event):
+    recordable = False
+    waitsForTimeline = True
 
     def __init__(self, time, duration, device, name, args, kargs):
         """RPC Event constructor"""
@@ -27,3 +31,6 @@ class RPCEvent(Event):
         return f"""
         self.core.wait_until_mu(now_mu())
         self.{self.device.name}.run({self.args_string}, {self.kargs_string})"""
+
+    def estimateTiming(self):
+        return slack.RPC_CPU_TIME, 0.0, {}
@@ -1,9 +1,37 @@
+import gui.code_generation.slack as slack
+import gui.settings as settings
 from gui.widgets.Log import log
 
 from .Event import Event
 
+# number of samples the kernel collects before sending them to the host
+STREAM_CHUNK_SIZE = 1024
+
+# async rpc of the experiment writing a chunk of streamed samples into the .npy files of a sampling window
+STORE_SAMPLES_FUNCTION = """
+    @rpc(flags={"async"})
+    def store_samples(self, name, start, samples, count) -> TNone:
+        files = getattr(self, name + "_files")
+        for channel in range(len(files)):
+            files[channel][start:start + count] = samples[:count, channel]"""
+
+# absolute path of a file of the run in the results folder of the master, results/<date>/<hour>/, which
+# is the working directory of the experiment unless the ARTIQ version runs it elsewhere
+RESULT_PATH_FUNCTION = """
+    def get_result_path(self, name):
+        directory = os.getcwd()
+        if os.path.basename(os.path.dirname(os.path.dirname(directory))) != "results":
+            localTime = time.localtime()
+            directory = os.path.join(directory, "results", time.strftime("%Y-%m-%d", localTime), time.strftime("%H", localTime))
+            os.makedirs(directory, exist_ok=True)
+        return os.path.abspath(os.path.join(directory, name))"""
+
 
 class SampleEvent(Event):
+    # every sample event has its own data set
+    shareable = False
+    # sampling reads inputs
+    recordable = False
 
     def __init__(self, time, device, sampleRate, duration):
         """Generates all events needed for sampling for the given duration"""
@@ -16,6 +44,11 @@ class SampleEvent(Event):
                 log("Error: Number of samples is 0")
             self.samplePeriod = 1 / sampleRate
         self.priority = 0.2
+        # raw samples are streamed into one .npy file per channel instead of being kept in memory
+        self.streaming = settings.getSamplerStreamingEnabled()
+        if self.streaming:
+            self.device.addFunction(STORE_SAMPLES_FUNCTION)
+            self.device.addFunction(RESULT_PATH_FUNCTION)
 
     def dataString(self):
         return "d" + self.device.name + "_" + str(self.timeIndex)
@@ -32,7 +65,14 @@ class SampleEvent(Event):
         self.numberOfSamples = int(sampleRate * self.duration)
         self.samplePeriod = 1 / sampleRate if sampleRate != 0 else float("inf")
 
+    def getChunkSize(self):
+        return min(STREAM_CHUNK_SIZE, self.numberOfSamples)
+
     def generatePrepareCode(self):
+        if self.streaming and self.numberOfSamples > 0:
+            return f"""
+        self.{self.dataString()}_chunk = np.zeros(({self.getChunkSize()}, 8), dtype=np.int32)
+        self.{self.dataString()}_files = [np.lib.format.open_memmap(self.get_result_path(self.codeIDString + "_{self.dataString()}_ch_" + str(i) + ".npy"), mode="w+", dtype=np.int16, shape=({self.numberOfSamples},)) for i in range(8)]"""
         # create variable thats stores the data sampled during this events duration
         if self.numberOfSamples > 0:
             return f"""
@@ -40,6 +80,20 @@ class SampleEvent(Event):
         return None
 
     def generateRunCode(self):
+        if self.streaming and self.numberOfSamples > 0:
+            chunkSize = self.getChunkSize()
+            code = f"""
+        for i in range({self.numberOfSamples}):
+            with parallel:
+                self.{self.device.name}.sample_mu(self.{self.dataString()}_chunk[i % {chunkSize}])
+                delay({self.samplePeriod})
+            if i % {chunkSize} == {chunkSize - 1}:
+                self.store_samples("{self.dataString()}", i - {chunkSize - 1}, self.{self.dataString()}_chunk, {chunkSize})"""
+            remainder = self.numberOfSamples % chunkSize
+            if remainder > 0:
+                code += f"""
+        self.store_samples("{self.dataString()}", {self.numberOfSamples - remainder}, self.{self.dataString()}_chunk, {remainder})"""
+            return code
         return f"""
         for i in range({self.numberOfSamples}):
             with parallel:
@@ -47,6 +101,13 @@ class SampleEvent(Event):
                 delay({self.samplePeriod})"""
 
     def generateAnalyzeCode(self):
+        if self.streaming and self.numberOfSamples > 0:
+            # the datasets only hold the absolute paths of the files with the raw samples (sample_mu)
+            return f"""
+        for i in range(8):
+            self.{self.dataString()}_files[i].flush()
+            self.set_dataset("{self.dataString()+"_data"}_ch_" + str(i) + "_file", self.{self.dataString()}_files[i].filename)
+        self.set_dataset("{self.dataString()+"_samplerate"}", {self.sampleRate:.3f})"""
         # store sampled data into a dataset for every channel
         if self.numberOfSamples > 0:
             return f"""
@@ -56,4 +117,12 @@ class SampleEvent(Event):
         return None
 
     def generateImportCode(self):
+        if self.streaming:
+            return "import os\nimport time\nimport numpy as np"
         return "import numpy as np"
+
+    def estimateTiming(self):
+        cpuTime = self.numberOfSamples * slack.SAMPLER_SAMPLE_CPU_TIME
+        if self.streaming and self.numberOfSamples > 0:
+            cpuTime += -(-self.numberOfSamples // self.getChunkSize()) * slack.ASYNC_RPC_CPU_TIME
+        return cpuTime, self.duration, {self.device.name: self.numberOfSamples * slack.SAMPLER_SAMPLE_BUS_TIME}
@@ -1,3 +1,4 @@
+import gui.code_generation.slack as slack
 import gui.settings as settings
 
 from .Event import Event
@@ -22,8 +23,15 @@ class TTLEvent(Event):
         return f"""
         self.{self.device.name}.{"on" if self.state else "off"}()"""
 
+    def estimateTiming(self):
+        return slack.RTIO_EVENT_CPU_TIME, 0.0, {}
+
 
 class TTLTriggerEvent(Event):
+    # shifts start_mu of the code it runs in
+    shareable = False
+    recordable = False
+    waitsForTimeline = True
 
     MIN_REACTION_TIME = 1e-5
 
@@ -60,3 +68,7 @@ class TTLTriggerEvent(Event):
 
     def getTimeCursorShift(self):
         return self.duration - TTLTriggerEvent.MIN_REACTION_TIME
+
+    def estimateTiming(self):
+        # the CPU blocks until the gate closes
+        return self.duration - TTLTriggerEvent.MIN_REACTION_TIME, 0.0, {}
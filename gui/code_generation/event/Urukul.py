@@ -1,5 +1,10 @@
 import numpy as np
 
+import gui.code_generation.hardware_util as hardware_util
+import gui.code_generation.sidecars as sidecars
+import gui.code_generation.slack as slack
+from gui.widgets.Log import log
+
 from .Event import Event
 
 
@@ -41,10 +46,10 @@ class UrukulEvent(Event):
 
     def generateResetCfrCode(self):
         code = ""
-        if self.device.state == "sweep":
+        if self.device.state in ("sweep", "unknown"):
             code += f"""
         self.{self.device.name}.set_cfr2()"""
-        elif self.device.state == "ram":
+        if self.device.state in ("ram", "unknown"):
             code += f"""
         self.{self.device.name}.set_cfr1()"""
         return code
@@ -72,6 +77,16 @@ class UrukulEvent(Event):
         self.{self.device.name}.set_mu(self.{self.variableNameFreq}, asf=self.{self.variableNameAmp})"""
         return code
 
+    def getSpiWriteCount(self):
+        # set_att, and CFG (mask_nu), CFR and the 64 bit profile of set_mu
+        return (self.attenuation is not None) + (4 if self.freq is not None else 0)
+
+    def estimateTiming(self):
+        writes = self.getSpiWriteCount()
+        cpuTime = writes * slack.SPI_WRITE_CPU_TIME + (self.switch is not None) * slack.RTIO_EVENT_CPU_TIME
+        # the channels of an Urukul share the SPI bus of its CPLD
+        return cpuTime, 0.0, {self.device.cpld.name: writes * slack.SPI_WRITE_BUS_TIME}
+
     def generateSetSwitchCode(self):
         code = ""
         if self.switch is not None:
@@ -153,9 +168,28 @@ class UrukulRamEvent(UrukulEvent):
         self.variable_name_ram_data = self.device.generateVariableName("ramdata")
         self.device.addRamEvent(self)
 
-    def generatePrepareCode(self):
+    def getRamData(self):
+        """The RAM image computed on the host, None if a formula can only be evaluated in the experiment."""
+        try:
+            return hardware_util.getRamData(self.ram_destination, self.ram_amplitude_formula, self.ram_phase_formula, self.ram_frequency_formula, self.step_count, self.device.ftwPerHz)
+        except (NameError, SyntaxError) as e:
+            # e.g. formulas using attributes of the experiment
+            log(f"RAM profile {self.ram_profile} of {self.device.name} is computed in the experiment, {e}")
+            return None
+
+    def writePrepareCode(self, writer):
+        writer.write(self.generatePrepareCode(writer.sidecars))
+
+    def generatePrepareCode(self, sidecarFiles=None):
         if self.only_execute:
             return ""
+        ramData = self.getRamData()
+        if ramData is not None:
+            return (
+                super(UrukulRamEvent, self).generatePrepareCode()
+                + f"""
+        self.{self.variable_name_ram_data} = np.array({sidecars.getArrayCode(sidecarFiles, ramData)}, dtype=np.int32)"""
+            )
         code = (
             super(UrukulRamEvent, self).generatePrepareCode()
             + f"""
@@ -195,7 +229,7 @@ class UrukulRamEvent(UrukulEvent):
         code += self.generateSetAttCode()
         code += self.generateSetSwitchCode()
         code += self.generateSetMaskNuCode()
-        if self.device.state == "sweep":
+        if self.device.state in ("sweep", "unknown"):
             code += f"""
         self.{self.device.name}.set_cfr2()"""
             
@@ -224,6 +258,13 @@ class UrukulRamEvent(UrukulEvent):
         self.device.state = "ram"
         return code
 
+    def getSpiWriteCount(self):
+        writes = (self.attenuation is not None) + 2
+        if not self.only_execute:
+            # FTW, CFR1 twice, the RAM profile and every RAM word
+            writes += 5 + (self.step_count or 0)
+        return writes
+
 
 class UrukulSweepEvent(UrukulEvent):
     def __init__(
@@ -259,7 +300,7 @@ class UrukulSweepEvent(UrukulEvent):
 
     def generateResetCfrCode(self):
         code = ""
-        if self.device.state == "ram":
+        if self.device.state in ("ram", "unknown"):
             code += f"""
         self.{self.device.name}.set_cfr1()"""
         return code
@@ -272,7 +313,8 @@ class UrukulSweepEvent(UrukulEvent):
 
         current_dir = "down" if (self.sweep_freq is not None and self.sweep_freq < self.freq) or (self.sweep_amp is not None and self.sweep_amp < self.amp) else "up"
 
-        if current_dir == self.device.last_sweep_dir:
+        # an unknown last direction (None) may be the same direction
+        if current_dir == self.device.last_sweep_dir or self.device.last_sweep_dir is None:
             code += f"""
         self.{self.device.name}.write32(ad9910._AD9910_REG_CFR1,1 << 12)
         self.{self.device.name}.cpld.io_update.pulse_mu(8)
@@ -338,6 +380,10 @@ class UrukulSweepEvent(UrukulEvent):
         code += self.generateSetSwitchCode()
         return code
 
+    def getSpiWriteCount(self):
+        # CFR1, CFR2 and the ramp limit, rate and step registers
+        return super().getSpiWriteCount() + 10
+
     def generateSweepFrequencyParameters(self):
 
         ftwPerHz = (1 << 32) / (1e9)
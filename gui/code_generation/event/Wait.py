@@ -2,6 +2,8 @@ from .Event import Event
 
 
 class WaitEvent(Event):
+    recordable = False
+    waitsForTimeline = True
 
     def __init__(self, time, duration, device):
         """Issues wait_until(now_mu()), eg to make sure that the kernel does not quit early"""
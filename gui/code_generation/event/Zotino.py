@@ -1,4 +1,8 @@
+import numpy as np
+
 import gui.code_generation.hardware_util as hardware_util
+import gui.code_generation.sidecars as sidecars
+import gui.code_generation.slack as slack
 
 from .Event import Event
 
@@ -21,16 +25,13 @@ class ZotinoEvent(Event):
         self.stepTime = duration / self.stepCount
         self.sweepVoltagesList = [self.channels[channel]["sweep_voltage"] for channel in self.sweepChannelList]
         self.formulaList = [self.channels[channel]["formula_text"] for channel in self.sweepChannelList]
-        self.sweepData = []
-        for j in range(self.stepCount):
-            self.sweepData.append([])
+        # voltages are converted to machine units here, with the transfer function of the device
+        self.voltagesData = self.device.voltagesToMu(self.voltagesList)
+        sweepVoltages = np.zeros((self.stepCount, len(self.sweepChannelList)))
         for i in range(len(self.sweepChannelList)):
             voltage = self.voltagesList[self.channelList.index(self.sweepChannelList[i])]
-            sweep_voltage = self.sweepVoltagesList[i]
-            dataX, dataY = hardware_util.formulaTextToDataPoints(self.stepCount, self.formulaList[i])
-            dataX, dataY = hardware_util.scaleFormulaData(dataX, dataY, duration, voltage, sweep_voltage)
-            for j in range(self.stepCount):
-                self.sweepData[j].append(dataY[j])
+            sweepVoltages[:, i] = hardware_util.getSweepVoltages(self.formulaList[i], self.stepCount, voltage, self.sweepVoltagesList[i])
+        self.sweepData = self.device.voltagesToMu(sweepVoltages)
 
     def generateRunCode(self):
         code = f"""
@@ -42,12 +43,15 @@ class ZotinoEvent(Event):
             self.{self.device.name}.set_dac_mu(self.{self.sweepVariableName}[i], {[int(channel) for channel in self.sweepChannelList]})"""
         return code
 
-    def generatePrepareCode(self):
+    def writePrepareCode(self, writer):
+        writer.write(self.generatePrepareCode(writer.sidecars))
+
+    def generatePrepareCode(self, sidecarFiles=None):
         code = f"""
-        self.{self.variableName} = [self.{self.device.name}.voltage_to_mu(voltage) for voltage in {self.voltagesList}]"""
+        self.{self.variableName} = {self.voltagesData.tolist()}"""
         if len(self.sweepChannelList) > 0:
             code += f"""
-        self.{self.sweepVariableName} = [[self.{self.device.name}.voltage_to_mu(voltage) for voltage in step] for step in {self.sweepData}]
+        self.{self.sweepVariableName} = {sidecars.getArrayCode(sidecarFiles, self.sweepData)}
         self.{self.stepTimeVariableName} = self.core.seconds_to_mu({self.stepTime})"""
         return code
 
@@ -56,3 +60,10 @@ class ZotinoEvent(Event):
             return self.stepTime * self.stepCount
         else:
             return 0
+
+    def estimateTiming(self):
+        # one SPI transfer per channel and an LDAC pulse per set_dac_mu
+        writes = len(self.channelList) + self.stepCount * len(self.sweepChannelList)
+        calls = 1 + (self.stepCount if len(self.sweepChannelList) > 0 else 0)
+        cpuTime = writes * slack.SPI_WRITE_CPU_TIME + calls * slack.RTIO_EVENT_CPU_TIME
+        return cpuTime, self.getTimeCursorShift(), {self.device.name: writes * slack.SPI_WRITE_BUS_TIME}
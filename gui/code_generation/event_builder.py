@@ -1,4 +1,4 @@
-import gui.crate as crate
+import gui.code_generation.device_index as device_index
 import gui.util as util
 import gui.widgets.RPC
 
@@ -36,49 +36,33 @@ def iterateSequencePorts(sequenceJson, function):
 
 
 def summarizeZotinoChannels(portStateDict):
-    if "ports" not in portStateDict:
-        return
-    # preprocess zotino (make multiple events of same device on different channels at same time a single event)
-    # dictionary spaghetti, dont get a headache
-    zotinoDevices = {}  # remember used zotino devices for this time step
-    for portName in portStateDict["ports"]:  # iterate all channels
-        portState = portStateDict["ports"][portName]
-        setup = crate.labsetup[portName]
-        if setup["module"] == "artiq.coredevice.zotino":  # checks if its a zotino
-            if setup["device"] in zotinoDevices:  # if this device already used in this timesteps (means its a different channel)
-                zotinoDevices[setup["device"]]["channels"][setup["channel"]] = portState  # add to previous "main portState" event of same device
-            else:
-                portState["channels"] = {  # first event of this device at this time
-                    setup["channel"]: portState,
-                }
-                zotinoDevices[setup["device"]] = portState  # add to used device dictionary and make this the "main portState" for this device
+    summarizeChannels(portStateDict, "artiq.coredevice.zotino")
 
 
 def summarizeFastinoChannels(portStateDict):
+    summarizeChannels(portStateDict, "artiq.coredevice.fastino")
+
+
+def summarizeChannels(portStateDict, module):
     if "ports" not in portStateDict:
         return
-    # preprocess fastino (make multiple events of same device on different channels at same time a single event)
-    # dictionary spaghetti, dont get a headache
-    fastinoDevices = {}  # remember used zotino devices for this time step
-    for portName in portStateDict["ports"]:  # iterate all channels
-        portState = portStateDict["ports"][portName]
-        setup = crate.labsetup[portName]
-        if setup["module"] == "artiq.coredevice.fastino":  # checks if its a zotino
-            if setup["device"] in fastinoDevices:  # if this device already used in this timesteps (means its a different channel)
-                fastinoDevices[setup["device"]]["channels"][setup["channel"]] = portState  # add to previous "main portState" event of same device
+    # make multiple ports of the same device at the same time a single event:
+    # the first port state of a device gets the port states of all its channels
+    index = device_index.getIndex()
+    mainPortStates = {}  # device name -> first port state of this device in this segment
+    for portName, portState in portStateDict["ports"].items():
+        port = index.getPort(portName)
+        if port.module == module:
+            if port.device in mainPortStates:
+                mainPortStates[port.device]["channels"][port.channel] = portState
             else:
-                portState["channels"] = {  # first event of this device at this time
-                    setup["channel"]: portState,
-                }
-                fastinoDevices[setup["device"]] = portState  # add to used device dictionary and make this the "main portState" for this device
+                portState["channels"] = {port.channel: portState}
+                mainPortStates[port.device] = portState
 
 
 def generateDevicesAndEvents(sequenceJson):
-    usedZotinos = {}  # avoid duplicate zotinos
-    usedFastinos = {}  # avoid duplicate zotinos
-    usedSamplers = {}  # avoid duplicate zotinos
-    urukulCplds = {}  # add urukul cpld device to urukul ad9910
-    mirnyCplds = {}  # add mirny cpld device to mirny adf5356
+    # devices with several ports (zotino, fastino, sampler) and cplds, by device name
+    sharedDevices = {}
 
     # create devices and their events
     devicesDict = {
@@ -88,18 +72,7 @@ def generateDevicesAndEvents(sequenceJson):
     devices = []
     events = []
 
-    iterateSequencePorts(
-        sequenceJson,
-        lambda portState: addDevice(
-            portState,
-            devicesDict,
-            usedZotinos,
-            urukulCplds,
-            usedSamplers,
-            mirnyCplds,
-            usedFastinos,
-        ),
-    )
+    iterateSequencePorts(sequenceJson, lambda portState: addDevice(portState, devicesDict, sharedDevices))
     generateEventsRecursive(sequenceJson, devicesDict, events)
     generateDeviceList(devicesDict, devices)
     lastEventEnd = 0
@@ -117,63 +90,66 @@ def generateDevicesAndEvents(sequenceJson):
     return devices, events
 
 
-def addDevice(
-    portState,
-    devicesDict,
-    usedZotinos,
-    urukulCplds,
-    usedSamplers,
-    mirnyCplds,
-    usedFastinos,
-):
+def getSharedDevice(sharedDevices, name, createDevice):
+    if name not in sharedDevices:
+        sharedDevices[name] = createDevice(name)
+    return sharedDevices[name]
+
+
+def createTTL(index, port, sharedDevices):
+    return TTL(port.device)
+
+
+def createZotino(index, port, sharedDevices):
+    return getSharedDevice(sharedDevices, port.device, Zotino)
+
+
+def createFastino(index, port, sharedDevices):
+    return getSharedDevice(sharedDevices, port.device, Fastino)
+
+
+def createSampler(index, port, sharedDevices):
+    return getSharedDevice(sharedDevices, port.device, Sampler)
+
+
+def createUrukul(index, port, sharedDevices):
+    return Urukul(port.device, getSharedDevice(sharedDevices, index.getCpld(port.device), UrukulCPLD))
+
+
+def createMirny(index, port, sharedDevices):
+    cpld = getSharedDevice(sharedDevices, index.getCpld(port.device), MirnyCPLD)
+    return Mirny(port.device, index.deviceChannels[port.device], cpld)
+
+
+def createCurrentDriver(index, port, sharedDevices):
+    return CurrentDriver(port.device)
+
+
+# module -> function creating the device of a port
+DEVICE_FACTORIES = {
+    "artiq.coredevice.ttl": createTTL,
+    "artiq.coredevice.zotino": createZotino,
+    "artiq.coredevice.fastino": createFastino,
+    "artiq.coredevice.ad9910": createUrukul,
+    "artiq.coredevice.sampler": createSampler,
+    "artiq.coredevice.adf5356": createMirny,
+    "custom.CurrentDriver": createCurrentDriver,
+}
+
+
+def addDevice(portState, devicesDict, sharedDevices):
     if "ports" not in portState:
         if "input_ttl" in portState:
             if portState["input_ttl"] not in devicesDict:
                 devicesDict[portState["input_ttl"]] = TTL(portState["input_ttl"], mode="input")
         return
+    index = device_index.getIndex()
     for portName in portState["ports"]:
         if portName not in devicesDict:
-            if crate.labsetup[portName]["module"] == "artiq.coredevice.ttl":
-                device = TTL(crate.labsetup[portName]["device"])
-            elif crate.labsetup[portName]["module"] == "artiq.coredevice.zotino":
-                zotinoDeviceName = crate.labsetup[portName]["device"]
-                if zotinoDeviceName in usedZotinos:
-                    device = usedZotinos[zotinoDeviceName]
-                else:
-                    device = Zotino(zotinoDeviceName)
-                    usedZotinos[zotinoDeviceName] = device
-            elif crate.labsetup[portName]["module"] == "artiq.coredevice.fastino":
-                fastinoDeviceName = crate.labsetup[portName]["device"]
-                if fastinoDeviceName in usedFastinos:
-                    device = usedFastinos[fastinoDeviceName]
-                else:
-                    device = Fastino(fastinoDeviceName)
-                    usedFastinos[fastinoDeviceName] = device
-            elif crate.labsetup[portName]["module"] == "artiq.coredevice.ad9910":
-                deviceName = crate.labsetup[portName]["device"]
-                cpldName = crate.device_db[deviceName]["arguments"]["cpld_device"]
-                if cpldName not in urukulCplds:
-                    urukulCplds[cpldName] = UrukulCPLD(cpldName)
-                device = Urukul(deviceName, urukulCplds[cpldName])
-            elif crate.labsetup[portName]["module"] == "artiq.coredevice.sampler":
-                samplerDeviceName = crate.labsetup[portName]["device"]
-                if samplerDeviceName in usedSamplers:
-                    device = usedSamplers[samplerDeviceName]
-                else:
-                    device = Sampler(samplerDeviceName)
-                    usedSamplers[samplerDeviceName] = device
-            elif crate.labsetup[portName]["module"] == "artiq.coredevice.adf5356":
-                deviceName = crate.labsetup[portName]["device"]
-                cpldName = crate.device_db[deviceName]["arguments"]["cpld_device"]
-                if cpldName not in mirnyCplds:
-                    mirnyCplds[cpldName] = MirnyCPLD(cpldName)
-                channel = crate.device_db[deviceName]["arguments"]["channel"]
-                device = Mirny(deviceName, channel, mirnyCplds[cpldName])
-            elif crate.labsetup[portName]["module"] == "custom.CurrentDriver":
-                device = CurrentDriver(crate.labsetup[portName]["device"])
-            else:
-                raise NotImplementedError(crate.labsetup[portName]["module"] + " device not implemented")
-            devicesDict[portName] = device
+            port = index.getPort(portName)
+            if port.module not in DEVICE_FACTORIES:
+                raise NotImplementedError(f"{port.module} device not implemented")
+            devicesDict[portName] = DEVICE_FACTORIES[port.module](index, port, sharedDevices)
 
 
 def generateEventsRecursive(sequenceJson, devicesDict, events):
@@ -209,6 +185,146 @@ def generateTriggerWaitEvent(segment, devicesDict, events):
     events.append({"time": segment["time"], "duration": segment["duration"], "events": [event]})
 
 
+def createTTLEvent(index, segment, portState, device):
+    return TTLEvent(
+        time=segment["time"],
+        duration=segment["duration"],
+        device=device,
+        state=portState["state"],
+    )
+
+
+def createZotinoEvent(index, segment, portState, device):
+    if "channels" not in portState:  # its included in another event of same device (see preprocess above)
+        return None
+    return ZotinoEvent(
+        time=segment["time"],
+        duration=segment["duration"],
+        device=device,
+        channels=portState["channels"],
+    )
+
+
+def createFastinoEvent(index, segment, portState, device):
+    if "channels" not in portState:  # its included in another event of same device (see preprocess above)
+        return None
+    return FastinoEvent(
+        time=segment["time"],
+        duration=segment["duration"],
+        device=device,
+        channels=portState["channels"],
+    )
+
+
+def createSampleEvent(index, segment, portState, device):
+    return SampleEvent(
+        time=segment["time"],
+        duration=segment["duration"],
+        device=device,
+        sampleRate=portState["freq"],
+    )
+
+
+def createUrukulEvent(index, segment, portState, device):
+    if portState["mode"] in ["ram_write", "ram_execute"]:
+        return UrukulRamEvent(
+            time=segment["time"],
+            duration=segment["duration"],
+            device=device,
+            switch=portState["switch"] if "switch" in portState else None,
+            freq=portState["freq"] if "freq" in portState else None,
+            amp=portState["amp"] if "amp" in portState else None,
+            phase=portState["phase"] if "phase" in portState else None,
+            attenuation=(portState["attenuation"] if "attenuation" in portState else None),
+            only_execute=(portState["mode"] == "ram_execute"),
+            ram_amplitude_formula=(portState["ram_amplitude_formula"] if "ram_amplitude_formula" in portState else None),
+            ram_phase_formula=(portState["ram_phase_formula"] if "ram_phase_formula" in portState else None),
+            ram_frequency_formula=(portState["ram_frequency_formula"] if "ram_frequency_formula" in portState else None),
+            ram_profile=(portState["ram_profile"] if "ram_profile" in portState else None),
+            ram_start=(portState["ram_start"] if "ram_start" in portState else None),
+            ram_end=(portState["ram_end"] if "ram_end" in portState else None),
+            ram_step_size=(portState["ram_step_size"] if "ram_step_size" in portState else None),
+            ram_destination=(portState["ram_destination"] if "ram_destination" in portState else None),
+            ram_mode=(portState["ram_mode"] if "ram_mode" in portState else None),
+        )
+    if portState["mode"] == "sweep_freq":
+        return UrukulSweepEvent(
+            time=segment["time"],
+            duration=segment["duration"],
+            device=device,
+            switch=portState["switch"] if "switch" in portState else None,
+            freq=portState["freq"] if "freq" in portState else None,
+            amp=portState["amp"] if "amp" in portState else None,
+            attenuation=(portState["attenuation"] if "attenuation" in portState else None),
+            sweep_freq=portState["sweep_freq"],
+            sweep_duration=portState["sweep_duration"],
+        )
+    if portState["mode"] == "sweep_amp":
+        return UrukulSweepEvent(
+            time=segment["time"],
+            duration=segment["duration"],
+            device=device,
+            switch=portState["switch"] if "switch" in portState else None,
+            freq=portState["freq"] if "freq" in portState else None,
+            amp=portState["amp"] if "amp" in portState else None,
+            attenuation=(portState["attenuation"] if "attenuation" in portState else None),
+            sweep_amp=portState["sweep_amp"],
+            sweep_duration=portState["sweep_duration"],
+        )
+    return UrukulEvent(
+        time=segment["time"],
+        duration=segment["duration"],
+        device=device,
+        switch=portState["switch"] if "switch" in portState else None,
+        amp=portState["amp"] if "amp" in portState else None,
+        freq=portState["freq"] if "freq" in portState else None,
+        phase=portState["phase"] if "phase" in portState else None,
+        attenuation=(portState["attenuation"] if "attenuation" in portState else None),
+    )
+
+
+def createMirnyEvent(index, segment, portState, device):
+    almaznyDeviceName = None
+    if "useAlmazny" in portState and portState["useAlmazny"]:
+        almaznyDeviceName = index.getAlmaznyChannel(device.cpld.name, device.channel)
+        assert almaznyDeviceName is not None, "No almazny device found for mirny device " + device.name
+        device.setAlmaznyDeviceName(almaznyDeviceName)
+    return MirnyEvent(
+        time=segment["time"],
+        duration=segment["duration"],
+        device=device,
+        switch=portState["switch"],
+        freq=portState["freq"],
+        attenuation=portState["attenuation"],
+        skipInit=portState["skipInit"],
+        useAlmazny=portState.get("useAlmazny"),
+        almaznyDeviceName=almaznyDeviceName,
+    )
+
+
+def createCurrentDriverEvent(index, segment, portState, device):
+    return CurrentDriverEvent(
+        time=segment["time"],
+        duration=segment["duration"],
+        device=device,
+        voltage=portState["voltage"],
+        sweep_voltage=(portState["sweep_voltage"] if "sweep_voltage" in portState else None),
+        formula_text=(portState["formula_text"] if "formula_text" in portState else None),
+    )
+
+
+# module -> function creating the event of a port state, returns None if there is no event
+EVENT_FACTORIES = {
+    "artiq.coredevice.ttl": createTTLEvent,
+    "artiq.coredevice.zotino": createZotinoEvent,
+    "artiq.coredevice.fastino": createFastinoEvent,
+    "artiq.coredevice.sampler": createSampleEvent,
+    "artiq.coredevice.ad9910": createUrukulEvent,
+    "artiq.coredevice.adf5356": createMirnyEvent,
+    "custom.CurrentDriver": createCurrentDriverEvent,
+}
+
+
 def generateAndAppendCurrentEvents(segment, devicesDict, events):
     currentEvents = []
     for rpcName, rpcData in segment["rpcs"].items():
@@ -221,128 +337,12 @@ def generateAndAppendCurrentEvents(segment, devicesDict, events):
             kargs=rpcData["kargs"],
         )
         currentEvents.append(event)
+    index = device_index.getIndex()
     for portName, portState in segment["ports"].items():
-        event = None
-        device = devicesDict[portName]
-        if crate.labsetup[portName]["module"] == "artiq.coredevice.ttl":
-            event = TTLEvent(
-                time=segment["time"],
-                duration=segment["duration"],
-                device=device,
-                state=portState["state"],
-            )
-        elif crate.labsetup[portName]["module"] == "artiq.coredevice.zotino":
-            if "channels" in portState:  # if its not included, its included in another event of same device (see preprocess above)
-                event = ZotinoEvent(
-                    time=segment["time"],
-                    duration=segment["duration"],
-                    device=device,
-                    channels=portState["channels"],
-                )
-        elif crate.labsetup[portName]["module"] == "artiq.coredevice.fastino":
-            if "channels" in portState:  # if its not included, its included in another event of same device (see preprocess above)
-                event = FastinoEvent(
-                    time=segment["time"],
-                    duration=segment["duration"],
-                    device=device,
-                    channels=portState["channels"],
-                )
-        elif crate.labsetup[portName]["module"] == "artiq.coredevice.sampler":
-            event = SampleEvent(
-                time=segment["time"],
-                duration=segment["duration"],
-                device=device,
-                sampleRate=portState["freq"],
-            )
-        elif crate.labsetup[portName]["module"] == "artiq.coredevice.ad9910":
-            if portState["mode"] in ["ram_write", "ram_execute"]:
-                event = UrukulRamEvent(
-                    time=segment["time"],
-                    duration=segment["duration"],
-                    device=device,
-                    switch=portState["switch"] if "switch" in portState else None,
-                    freq=portState["freq"] if "freq" in portState else None,
-                    amp=portState["amp"] if "amp" in portState else None,
-                    phase=portState["phase"] if "phase" in portState else None,
-                    attenuation=(portState["attenuation"] if "attenuation" in portState else None),
-                    only_execute=(portState["mode"] == "ram_execute"),
-                    ram_amplitude_formula=(portState["ram_amplitude_formula"] if "ram_amplitude_formula" in portState else None),
-                    ram_phase_formula=(portState["ram_phase_formula"] if "ram_phase_formula" in portState else None),
-                    ram_frequency_formula=(portState["ram_frequency_formula"] if "ram_frequency_formula" in portState else None),
-                    ram_profile=(portState["ram_profile"] if "ram_profile" in portState else None),
-                    ram_start=(portState["ram_start"] if "ram_start" in portState else None),
-                    ram_end=(portState["ram_end"] if "ram_end" in portState else None),
-                    ram_step_size=(portState["ram_step_size"] if "ram_step_size" in portState else None),
-                    ram_destination=(portState["ram_destination"] if "ram_destination" in portState else None),
-                    ram_mode=(portState["ram_mode"] if "ram_mode" in portState else None),
-                )
-            elif portState["mode"] == "sweep_freq":
-                event = UrukulSweepEvent(
-                    time=segment["time"],
-                    duration=segment["duration"],
-                    device=device,
-                    switch=portState["switch"] if "switch" in portState else None,
-                    freq=portState["freq"] if "freq" in portState else None,
-                    amp=portState["amp"] if "amp" in portState else None,
-                    attenuation=(portState["attenuation"] if "attenuation" in portState else None),
-                    sweep_freq=portState["sweep_freq"],
-                    sweep_duration=portState["sweep_duration"],
-                )
-            elif portState["mode"] == "sweep_amp":
-                event = UrukulSweepEvent(
-                    time=segment["time"],
-                    duration=segment["duration"],
-                    device=device,
-                    switch=portState["switch"] if "switch" in portState else None,
-                    freq=portState["freq"] if "freq" in portState else None,
-                    amp=portState["amp"] if "amp" in portState else None,
-                    attenuation=(portState["attenuation"] if "attenuation" in portState else None),
-                    sweep_amp=portState["sweep_amp"],
-                    sweep_duration=portState["sweep_duration"],
-                )
-            else:
-                event = UrukulEvent(
-                    time=segment["time"],
-                    duration=segment["duration"],
-                    device=device,
-                    switch=portState["switch"] if "switch" in portState else None,
-                    amp=portState["amp"] if "amp" in portState else None,
-                    freq=portState["freq"] if "freq" in portState else None,
-                    phase=portState["phase"] if "phase" in portState else None,
-                    attenuation=(portState["attenuation"] if "attenuation" in portState else None),
-                )
-        elif crate.labsetup[portName]["module"] == "artiq.coredevice.adf5356":
-            almaznyDeviceName = None
-            if "useAlmazny" in portState and portState["useAlmazny"]:
-                for d in crate.device_db:
-                    if "class" in crate.device_db[d] and crate.device_db[d]["class"] == "AlmaznyChannel":
-                        if crate.device_db[d]["arguments"]["host_mirny"] == device.cpld.name and crate.device_db[d]["arguments"]["channel"] == device.channel:
-                            almaznyDeviceName = d
-                            break
-                assert almaznyDeviceName is not None, "No almazny device found for mirny device " + device.name
-                device.setAlmaznyDeviceName(almaznyDeviceName)
-            event = MirnyEvent(
-                time=segment["time"],
-                duration=segment["duration"],
-                device=device,
-                switch=portState["switch"],
-                freq=portState["freq"],
-                attenuation=portState["attenuation"],
-                skipInit=portState["skipInit"],
-                useAlmazny=portState.get("useAlmazny"),
-                almaznyDeviceName=almaznyDeviceName,
-            )
-        elif crate.labsetup[portName]["module"] == "custom.CurrentDriver":
-            event = CurrentDriverEvent(
-                time=segment["time"],
-                duration=segment["duration"],
-                device=device,
-                voltage=portState["voltage"],
-                sweep_voltage=(portState["sweep_voltage"] if "sweep_voltage" in portState else None),
-                formula_text=(portState["formula_text"] if "formula_text" in portState else None),
-            )
-        else:
-            raise NotImplementedError(crate.labsetup[portName]["module"] + " not implemented")
+        module = index.getModule(portName)
+        if module not in EVENT_FACTORIES:
+            raise NotImplementedError(f"{module} not implemented")
+        event = EVENT_FACTORIES[module](index, segment, portState, devicesDict[portName])
         if event is not None:
             currentEvents.append(event)
     events.append(
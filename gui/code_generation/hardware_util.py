@@ -1,3 +1,7 @@
+import functools
+
+import numpy as np
+
 import gui.widgets.Formula as Formula
 
 
@@ -24,6 +28,91 @@ def formulaTextToDataPoints(dataLength, formula_text):
     return dataX, dataY
 
 
+def evaluateFormula(formula_text, dataX):
+    """Evaluates the formula once for all x of the NumPy array dataX."""
+    formula = Formula.translateFormulaToNumpy(formula_text)
+    try:
+        dataY = eval(formula, {"x": dataX, "np": np})
+        return np.broadcast_to(np.asarray(dataY, dtype=np.float64), dataX.shape)
+    except Exception:
+        # formulas like conditionals only work for single numbers
+        return np.array([eval(formula, {"x": x, "np": np}) for x in dataX.tolist()], dtype=np.float64)
+
+
+def formulaTextToArray(dataLength, formula_text):
+    """Like formulaTextToDataPoints, but with NumPy arrays."""
+    dataX = np.arange(dataLength) / (dataLength - 1)
+    return dataX, evaluateFormula(formula_text, dataX)
+
+
+@functools.lru_cache(maxsize=1024)
+def getSweepVoltages(formula_text, dataLength, voltage, sweep_voltage):
+    """The formula evaluated at dataLength steps and scaled from voltage to sweep_voltage, like scaleFormulaData.
+
+    The array is cached and shared by all events with the same sweep, so it is read only.
+    """
+    _dataX, dataY = formulaTextToArray(dataLength, formula_text)
+    minVal = dataY.min()
+    maxVal = dataY.max()
+    if not maxVal > minVal:
+        raise Exception(f"Can not scale constant formula {formula_text} from {voltage} to {sweep_voltage}")
+    scale = (sweep_voltage - voltage) / (maxVal - minVal)
+    offset = voltage - minVal * scale
+    voltages = dataY * scale + offset
+    voltages.setflags(write=False)
+    return voltages
+
+
+def voltagesToMu(voltages, toMu, minVoltage=-10.0, maxVoltage=10.0, maxMu=0xFFFF):
+    """Converts voltages with the transfer function toMu of a DAC to an int32 array of machine units.
+
+    The voltage range is inclusive, the upper end is one step above the largest code of the DAC and
+    gives the largest code.
+    """
+    voltages = np.asarray(voltages, dtype=np.float64)
+    if voltages.size > 0 and (voltages.min() < minVoltage or voltages.max() > maxVoltage):
+        raise ValueError("DAC voltage out of bounds")
+    return np.clip(toMu(voltages), 0, maxMu).astype(np.int32)
+
+
+def getRamData(ram_destination, ram_amplitude_formula, ram_phase_formula, ram_frequency_formula, step_count, ftw_per_hz=None):
+    """The RAM image of an AD9910 RAM profile, as the amplitude_to_ram, turns_to_ram, frequency_to_ram
+    and turns_amplitude_to_ram of artiq.coredevice.ad9910 write it, as int32 array.
+
+    ftw_per_hz is the one of the device, it is only needed for RAM_DEST_FTW. The data is reversed,
+    because the RAM is played back reversed. The array is cached and shared by all events with the
+    same profile, so it is read only.
+    """
+    # the cache is only keyed by the formulas the destination reads
+    if ram_destination not in ("RAM_DEST_ASF", "RAM_DEST_POWASF"):
+        ram_amplitude_formula = None
+    if ram_destination not in ("RAM_DEST_POW", "RAM_DEST_POWASF"):
+        ram_phase_formula = None
+    if ram_destination != "RAM_DEST_FTW":
+        ram_frequency_formula = None
+        ftw_per_hz = None
+    return getCachedRamData(ram_destination, ram_amplitude_formula, ram_phase_formula, ram_frequency_formula, step_count, ftw_per_hz)
+
+
+@functools.lru_cache(maxsize=256)
+def getCachedRamData(ram_destination, ram_amplitude_formula, ram_phase_formula, ram_frequency_formula, step_count, ftw_per_hz):
+    dataX = np.arange(step_count) / step_count
+    data = np.zeros(step_count, dtype=np.int64)
+    if ram_destination == "RAM_DEST_FTW":
+        # frequency_to_ftw, wrapped to int32 like on the core device
+        data |= np.rint(evaluateFormula(ram_frequency_formula, dataX) * ftw_per_hz).astype(np.int64) & 0xFFFFFFFF
+    if ram_destination in ("RAM_DEST_ASF", "RAM_DEST_POWASF"):
+        amplitudes = np.clip(evaluateFormula(ram_amplitude_formula, dataX), 0.0, 1.0)
+        asf = np.rint(amplitudes * 0x3FFF).astype(np.int64)
+        data |= asf << (18 if ram_destination == "RAM_DEST_ASF" else 2)
+    if ram_destination in ("RAM_DEST_POW", "RAM_DEST_POWASF"):
+        pow_ = np.rint(evaluateFormula(ram_phase_formula, dataX) * 0x10000).astype(np.int64) & 0xFFFF
+        data |= pow_ << 16
+    data = data.astype(np.uint32).view(np.int32)[::-1].copy()
+    data.setflags(write=False)
+    return data
+
+
 def scaleFormulaData(dataX, dataY, duration, voltage, sweep_voltage):
     assert duration is not None
     minVal = min(dataY)
@@ -0,0 +1,29 @@
+import ast
+import hashlib
+import io
+import tokenize
+
+
+def parametrizeNumbers(code, valuesName, indentation="        "):
+    """Replaces every number literal in code by an item of the list valuesName.
+
+    code is a method body as inserted into the generated code, its first line without indentation.
+    Returns the new code and the list of replaced values.
+    """
+    # tokenize it as the body of a block, so the indentation of the following lines is valid
+    lines = ("if True:\n" + indentation + code).splitlines(keepends=True)
+    replacements = []
+    values = []
+    for token in tokenize.generate_tokens(io.StringIO("".join(lines)).readline):
+        if token.type == tokenize.NUMBER:
+            replacements.append((token.start, token.end[1], f"{valuesName}[{len(values)}]"))
+            values.append(ast.literal_eval(token.string))
+    # replace from the end, so the columns of earlier tokens stay valid
+    for (row, startColumn), endColumn, text in reversed(replacements):
+        line = lines[row - 1]
+        lines[row - 1] = line[:startColumn] + text + line[endColumn:]
+    return "".join(lines[1:])[len(indentation) :], values
+
+
+def getCodeHash(code):
+    return hashlib.sha1(code.encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,66 @@
+import gzip
+import hashlib
+import os
+
+import numpy as np
+
+# smaller arrays stay inline in the generated code
+MIN_ARRAY_SIZE = 256
+
+IMPORT_CODE = "import gzip\nimport os"
+
+# module level function of the generated experiment file, loads the sidecar files written next to it
+LOADER_CODE = """
+
+def loadSidecar(name):
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    if name.endswith(".npy"):
+        return np.load(path, mmap_mode="r")
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        return file.read()
+"""
+
+
+def getArrayCode(sidecars, data):
+    """Returns code evaluating to data as nested list.
+
+    If sidecars (file name -> content) is given and data is large enough, it is added as .npy file,
+    otherwise it is written inline.
+    """
+    if sidecars is None:
+        return getInlineCode(data)
+    array = np.ascontiguousarray(data)
+    if array.size < MIN_ARRAY_SIZE or array.dtype == object:
+        return getInlineCode(data)
+    digest = hashlib.sha1(f"{array.dtype.str}{array.shape}".encode("utf-8"))
+    digest.update(array.tobytes())
+    name = f"sidecar_{digest.hexdigest()[:16]}.npy"
+    sidecars[name] = array
+    return f"""loadSidecar("{name}").tolist()"""
+
+
+def getInlineCode(data):
+    return str(data.tolist() if isinstance(data, np.ndarray) else data)
+
+
+def getTextCode(sidecars, text):
+    """Returns code evaluating to text, which is added as compressed file."""
+    name = f"sidecar_{hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]}.json.gz"
+    sidecars[name] = text
+    return f"""loadSidecar("{name}")"""
+
+
+def writeSidecars(sidecars, folder):
+    for name, data in sidecars.items():
+        path = os.path.join(folder, name)
+        # the names are content hashes, so an existing file already has this content
+        if os.path.exists(path):
+            continue
+        temporaryPath = path + f".{os.getpid()}.tmp"
+        if isinstance(data, str):
+            with gzip.open(temporaryPath, "wt", encoding="utf-8") as file:
+                file.write(data)
+        else:
+            with open(temporaryPath, "wb") as file:
+                np.save(file, data)
+        os.replace(temporaryPath, path)
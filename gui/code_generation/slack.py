@@ -0,0 +1,149 @@
+"""Static prediction of RTIO underflows of the generated run code.
+
+Every event estimates how long the core CPU needs for its run code, how far its RTIO events
+are spread over the timeline and how long it keeps the SPI buses of its devices busy
+(Event.estimateTiming). Walking through the events like the generated run() does gives the
+slack, the time the timeline is ahead of the CPU, at every segment. A segment in which the
+slack becomes negative will most likely raise an RTIOUnderflow.
+
+The costs are rough figures for a Kasli with 125 MHz RTIO clock, they are only meant to find
+the segments that are far off before submitting.
+"""
+
+# run() starts the sequence 5 ms after break_realtime
+INITIAL_SLACK = 5e-3
+# the CPU can not get much further ahead than the RTIO FIFOs hold, so slack does not pile up
+MAX_SLACK = 5e-3
+
+# CPU time per RTIO output event, e.g. a TTL edge or a Fastino sample
+RTIO_EVENT_CPU_TIME = 1e-6
+# CPU and bus time of one 32 bit SPI transfer (Zotino channel, Urukul register, Sampler, ...)
+SPI_WRITE_CPU_TIME = 1.5e-6
+SPI_WRITE_BUS_TIME = 1e-6
+# 33 SPI clock cycles at 62.5 MHz
+CURRENT_DRIVER_WRITE_TIME = 528e-9
+# Mirny computes the PLL settings on the core CPU
+MIRNY_SET_FREQUENCY_CPU_TIME = 30e-6
+SAMPLER_SAMPLE_CPU_TIME = 6e-6
+SAMPLER_SAMPLE_BUS_TIME = 2e-6
+RPC_CPU_TIME = 200e-6
+ASYNC_RPC_CPU_TIME = 50e-6
+
+# the messages are shown in a dialog, so only the first ones are kept
+MAX_WARNINGS = 10
+
+
+class SlackPrediction:
+    def __init__(self):
+        self.warnings = []
+        self.minSlack = INITIAL_SLACK
+        self.limitingSegment = None
+
+    def warn(self, message):
+        if len(self.warnings) < MAX_WARNINGS:
+            self.warnings.append(message)
+
+    def updateMinimum(self, slack, label):
+        if slack < self.minSlack:
+            self.minSlack = slack
+            self.limitingSegment = label
+
+    def getWarnings(self):
+        """The warnings followed by the limiting segment, empty if no problem is predicted."""
+        if len(self.warnings) == 0:
+            return []
+        return self.warnings + [f"limiting segment: {self.limitingSegment}, minimum slack {formatTime(self.minSlack)}"]
+
+
+def predict(events):
+    """Predicts the slack of the run code of the events of event_builder.generateDevicesAndEvents."""
+    prediction = SlackPrediction()
+    walkEvents(events, INITIAL_SLACK, "", prediction, True)
+    return prediction
+
+
+def walkEvents(events, slack, path, prediction, report):
+    """Returns the slack after the events and the minimum slack within them."""
+    minSlack = slack
+    for currentEvents in events:
+        label = f"{path}segment at {formatTime(currentEvents['time'])}"
+        if "repeats" in currentEvents:
+            slack, subsequenceMinSlack = walkRepeats(currentEvents, slack, path, prediction, report)
+        else:
+            slack, subsequenceMinSlack = walkSegment(currentEvents, slack, label, prediction, report)
+        minSlack = min(minSlack, subsequenceMinSlack)
+    return slack, minSlack
+
+
+def walkRepeats(currentEvents, slack, path, prediction, report):
+    repeats = currentEvents["repeats"]
+    label = f"{path}{currentEvents['name']}"
+    slack, minSlack = walkEvents(currentEvents["events"], slack, f"{label} (repetition 1 of {repeats}) ", prediction, report)
+    if repeats < 2:
+        return slack, minSlack
+    # every further repetition starts like the second one, only with the slack it left over
+    warningCount = len(prediction.warnings)
+    secondSlack, secondMinSlack = walkEvents(currentEvents["events"], slack, f"{label} (repetition 2 of {repeats}) ", prediction, report and repeats == 2)
+    minSlack = min(minSlack, secondMinSlack)
+    change = secondSlack - slack
+    if change >= 0 or repeats == 2:
+        return secondSlack, minSlack
+    lastMinSlack = secondMinSlack + change * (repeats - 2)
+    if report:
+        prediction.updateMinimum(lastMinSlack, f"{label} (repetition {repeats} of {repeats})")
+        if lastMinSlack < 0 and len(prediction.warnings) == warningCount:
+            underflowRepetition = min(repeats, 3 + int(secondMinSlack / -change))
+            prediction.warn(
+                f"{label}: slack shrinks by {formatTime(-change)} per repetition, "
+                f"predicted RTIO underflow in repetition {underflowRepetition} of {repeats}"
+            )
+    if lastMinSlack < 0:
+        return MAX_SLACK, min(minSlack, lastMinSlack)
+    return secondSlack + change * (repeats - 2), min(minSlack, lastMinSlack)
+
+
+def walkSegment(currentEvents, slack, label, prediction, report):
+    duration = currentEvents["duration"]
+    cpuTime = 0.0
+    waitTime = 0.0
+    waits = False
+    spread = 0.0
+    busTimes = {}
+    for event in currentEvents["events"]:
+        if type(event) is dict:
+            continue
+        eventCpuTime, eventSpread, eventBusTimes = event.estimateTiming()
+        if event.waitsForTimeline:
+            waits = True
+            waitTime += eventCpuTime
+        else:
+            cpuTime += eventCpuTime
+        spread = max(spread, eventSpread)
+        for bus, busTime in eventBusTimes.items():
+            busTimes[bus] = busTimes.get(bus, 0.0) + busTime
+    # the RTIO events are spread over the timeline, so the CPU only has to keep up with them
+    lowestSlack = min(slack, slack + spread - cpuTime) if cpuTime > 0 else max(slack, 0.0)
+    if report:
+        prediction.updateMinimum(lowestSlack, label)
+        if lowestSlack < 0:
+            prediction.warn(f"{label}: predicted RTIO underflow, {formatTime(cpuTime)} of CPU time with {formatTime(slack)} of slack")
+        for bus, busTime in busTimes.items():
+            if busTime > duration:
+                prediction.warn(f"{label}: SPI bus of {bus} is busy for {formatTime(busTime)}, longer than the segment ({formatTime(duration)})")
+    slack -= cpuTime
+    if waits:
+        # waiting for the time cursor (or an input) leaves no slack
+        slack = min(slack, 0.0) - waitTime
+    slack = min(slack + duration, MAX_SLACK)
+    if lowestSlack < 0:
+        # the following segments are predicted as if this one was fixed
+        slack = MAX_SLACK
+    return slack, lowestSlack
+
+
+def formatTime(seconds):
+    if abs(seconds) < 1e-3:
+        return f"{seconds * 1e6:.6g} us"
+    if abs(seconds) < 1:
+        return f"{seconds * 1e3:.6g} ms"
+    return f"{seconds:.6g} s"
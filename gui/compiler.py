@@ -1,5 +1,9 @@
 import copy
+import hashlib
+import json
 import os
+import tempfile
+import threading
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -11,14 +15,16 @@ except Exception:
 
 
 import gui.code_generation.artiq_code_generator
+import gui.code_generation.sidecars as sidecars
 import gui.crate as crate
 import gui.settings as settings
+import gui.timeline as timeline
 import gui.util as util
+import gui.variable_index as variable_index
 import gui.widgets.Dataset as Dataset
 import gui.widgets.Design as Design
 import gui.widgets.Formula as Formula
 import gui.widgets.Input as Input
-import gui.widgets.MultiRun as MultiRun
 import gui.widgets.Playlist as Playlist
 import gui.widgets.RPC as RPC
 import gui.widgets.Variables as Variables
@@ -29,6 +35,10 @@ def _scheduler_target_name() -> str:
     return "master_schedule" if int(crate.Config.get("artiqVersion")) <= 7 else "schedule"
 
 
+def _dataset_db_target_name() -> str:
+    return "master_dataset_db" if int(crate.Config.get("artiqVersion")) <= 7 else "dataset_db"
+
+
 def submit_expid(
     expid: dict,
     *,
@@ -67,6 +77,28 @@ def submit_expid(
             pass
 
 
+def forgetKnownDeviceState(host: str = "127.0.0.1", port=None):
+    """Deletes the known device state dataset of the master, so the next run initializes all devices."""
+    if port is None:
+        port = crate.Config.get("port-control")
+    dataset_db = None
+    try:
+        dataset_db = rpc.Client(host, port, _dataset_db_target_name())
+        dataset_db.delete(gui.code_generation.artiq_code_generator.KnownDeviceState.DATASET)
+        log("Devices are initialized in the next run")
+    except KeyError:
+        # nothing known yet
+        pass
+    except Exception as e:
+        log(e)
+    finally:
+        try:
+            if dataset_db is not None:
+                dataset_db.close_rpc()
+        except Exception:
+            pass
+
+
 def submit_experiment_file(
     *,
     file: str,
@@ -100,6 +132,23 @@ def submit_experiment_file(
     )
 
 
+lastCodeID = 0
+codeIDLock = threading.Lock()
+
+
+def reserveCodeIDs(count=1):
+    """Returns the first of count consecutive codeIDs, none of them is handed out again by this process.
+
+    codeIDs are the current time as %Y%m%d%H%M%S%f, or the next unused one if that was already handed out.
+    Batch compilations reserve theirs from their own thread, so the counter is locked.
+    """
+    global lastCodeID
+    with codeIDLock:
+        codeID = max(int(datetime.now().strftime("%Y%m%d%H%M%S%f")), lastCodeID + 1)
+        lastCodeID = codeID + count - 1
+    return codeID
+
+
 def _generated_code_folder_path(*, now: Optional[datetime] = None) -> str:
     if now is None:
         now = datetime.now()
@@ -122,13 +171,17 @@ def _artiq_master_code_path_from_windows(code_file_path: str) -> str:
 
 
 def write_generated_code_file(
-    code: str,
+    code,
     *,
     filename_prefix: str = "",
     code_id: Optional[int] = None,
     now: Optional[datetime] = None,
+    folder: Optional[str] = None,
 ):
-    """Write code into the generatedCode folder and return paths.
+    """Write code into the generatedCode folder (or the given folder) and return paths.
+
+    code is a string or a function code(code_id, file) writing the code for the final code_id
+    into the opened file, e.g. to stream the code generation into it.
 
     Returns: (code_id, windows_path, artiq_master_visible_path)
     """
@@ -136,24 +189,84 @@ def write_generated_code_file(
     if now is None:
         now = datetime.now()
     if code_id is None:
-        code_id = int(now.strftime("%Y%m%d%H%M%S%f"))
+        code_id = reserveCodeIDs()
 
-    generated_code_folder = _generated_code_folder_path(now=now)
+    generated_code_folder = _generated_code_folder_path(now=now) if folder is None else folder
     if not os.path.exists(generated_code_folder):
         os.makedirs(generated_code_folder)
 
     windows_path = generated_code_folder + f"{filename_prefix}{code_id}.py"
     while os.path.exists(windows_path):
-        code_id += 1
+        code_id = reserveCodeIDs()
         windows_path = generated_code_folder + f"{filename_prefix}{code_id}.py"
 
-    with open(windows_path, "w", encoding="utf-8") as f:
-        f.write(code)
+    try:
+        with open(windows_path, "w", encoding="utf-8") as f:
+            if callable(code):
+                code(code_id, f)
+            else:
+                f.write(code)
+    except Exception:
+        # do not leave a half written experiment behind
+        if os.path.exists(windows_path):
+            os.remove(windows_path)
+        raise
 
     artiq_master_path = _artiq_master_code_path_from_windows(windows_path)
     return code_id, windows_path, artiq_master_path
 
 
+class HashingFile:
+    """File wrapper hashing everything written into it."""
+
+    def __init__(self, file):
+        self.file = file
+        self.hash = hashlib.sha1()
+
+    def write(self, text):
+        self.hash.update(text.encode("utf-8"))
+        return self.file.write(text)
+
+
+def write_content_addressed_code_file(code, *, folder: str, filename_prefix: str = "", sidecar_files: Optional[dict] = None, confirm=None):
+    """Write code into folder, named after the hash of the code, and return paths.
+
+    code is a string or a function code(file) writing the code into the opened file.
+    An existing file with the same name already has this code and is kept.
+    sidecar_files (file name -> content) filled by the code generation are written next to the code.
+    confirm is called after the code is generated. If it returns False, nothing is kept and None is returned.
+    Returns: (windows_path, artiq_master_visible_path)
+    """
+
+    os.makedirs(folder, exist_ok=True)
+    # write into a temporary file and rename it, so a worker process storing the same code
+    # never submits a half written file
+    temporary_fd, temporary_path = tempfile.mkstemp(suffix=".tmp", prefix=filename_prefix, dir=folder)
+    try:
+        with open(temporary_fd, "w", encoding="utf-8") as f:
+            hashing_file = HashingFile(f)
+            if callable(code):
+                code(hashing_file)
+            else:
+                hashing_file.write(code)
+        if confirm is not None and not confirm():
+            os.remove(temporary_path)
+            return None
+        windows_path = folder + f"{filename_prefix}{hashing_file.hash.hexdigest()[:16]}.py"
+        if sidecar_files is not None:
+            sidecars.writeSidecars(sidecar_files, folder)
+        if os.path.exists(windows_path):
+            os.remove(temporary_path)
+        else:
+            os.replace(temporary_path, windows_path)
+    except Exception:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+    return windows_path, _artiq_master_code_path_from_windows(windows_path)
+
+
 def submit_generated_code(
     *,
     code: str,
@@ -191,6 +304,151 @@ def submit_generated_code(
     return _code_id
 
 
+class CompileCache:
+    """Memoizes subsequence durations, compiled subsequence bodies and compiled segments.
+
+    Durations and bodies are keyed by sequence name and the effective variable values. Durations
+    stay valid across compiles until a sequence or variable action invalidates them,
+    compiled bodies only live for one compile because code generation mutates them.
+
+    Compiled port states and rpcs of a segment are kept across compiles until an action on the
+    segment or the labsetup drops them. They are stored with the aliases the segment references
+    and their values, so changed variable values only recompile the segments using them.
+    """
+
+    def __init__(self):
+        self.durations = {}
+        self.subsequences = {}
+        self.segments = {}
+        self.variablesKey = None
+        self.sequences = None
+        self.labsetup = None
+        self.aliases = None
+
+    def invalidate(self):
+        self.durations.clear()
+        self.subsequences.clear()
+
+    def invalidateSegment(self, seqName, segName):
+        self.segments.pop((seqName, segName), None)
+
+    def getSegment(self, seqName, segName, segData):
+        index = Variables.getIndex()
+        entry = self.segments.get((seqName, segName))
+        if entry is None or entry[1] != getReferencedValues(index, entry[0]):
+            ports = compilePortStateDict(seqName, segName, segData["ports"])
+            rpcs = compileRpcDict(seqName, segName, segData["rpcs"])
+            aliases = getReferencedAliases(index, segData)
+            entry = (aliases, getReferencedValues(index, aliases), ports, rpcs)
+            self.segments[(seqName, segName)] = entry
+        # code generation changes the port states and the data nested in them, so hand out copies
+        return copy.deepcopy(entry[2]), copy.deepcopy(entry[3])
+
+    def beginCompile(self):
+        variablesKey = getVariablesKey()
+        # segments may reference an alias which did not exist when they were compiled
+        aliases = Variables.getIndex().aliases
+        if crate.sequences is not self.sequences or crate.labsetup is not self.labsetup or aliases != self.aliases:
+            self.segments.clear()
+            self.invalidate()
+        elif variablesKey != self.variablesKey:
+            self.invalidate()
+        self.variablesKey = variablesKey
+        self.sequences = crate.sequences
+        self.labsetup = crate.labsetup
+        self.aliases = aliases
+        self.subsequences.clear()
+
+
+def getVariablesKey():
+    variables = variable_index.getVariables()
+    return tuple((variableData["alias"], variableData["value"]) for variableData in variables.values() if not variableData["isDir"])
+
+
+def getReferencedAliases(index, segData):
+    text = json.dumps(
+        [segData["ports"], segData["rpcs"], {portName: crate.labsetup[portName] for portName in segData["ports"]}],
+        ensure_ascii=False,
+    )
+    return tuple(sorted(set(index.findAliases(text))))
+
+
+def getReferencedValues(index, aliases):
+    return tuple(index.resolvedTexts.get(alias) for alias in aliases)
+
+
+SEGMENT_ACTION_TYPES = [
+    "segmentadd",
+    "segmentdelete",
+    "segmentvaluechange",
+    "portstateadd",
+    "portstatedelete",
+    "portstatevaluechange",
+    "rpcadd",
+    "rpcdelete",
+    "rpcvaluechange",
+]
+
+
+def onCrateAction(action):
+    if action["target"] == "sequences" and action["type"] in SEGMENT_ACTION_TYPES:
+        compileCache.invalidateSegment(action["seqname"], action["segname"])
+        if action["type"] == "segmentvaluechange":
+            compileCache.invalidate()
+    elif action["target"] in ("sequences", "variables"):
+        compileCache.invalidate()
+        if action["target"] == "sequences" and action["type"] in ("delete", "rename"):
+            compileCache.segments.clear()
+    elif action["target"] == "labsetup":
+        compileCache.segments.clear()
+
+
+compileCache = CompileCache()
+crate.actionCallbacks.append(onCrateAction)
+
+
+class CodeStore:
+    """Remembers the content addressed files of already generated code.
+
+    Entries are keyed by everything the code generation depends on: the compiled sequence, the
+    settings, the labsetup and the device_db. Code of plugins registering external generators
+    can change without any of these, so it is not remembered.
+    """
+
+    MAX_ENTRIES = 1000
+
+    def __init__(self):
+        self.entries = {}
+
+    def getKey(self, seqName, compiledSeq, parametric, folder):
+        if not canCompileInProcessPool():
+            return None
+        text = json.dumps(
+            [seqName, compiledSeq.toJson(), parametric, folder, settings.data, crate.labsetup, crate.device_db],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        # the file may have been deleted since
+        if entry is None or not os.path.exists(entry[0]):
+            return None
+        return entry
+
+    def put(self, key, windows_path, artiq_master_path, arguments, slackWarnings):
+        entry = (windows_path, artiq_master_path, arguments, slackWarnings)
+        if key is not None:
+            if len(self.entries) >= CodeStore.MAX_ENTRIES:
+                self.entries.clear()
+            self.entries[key] = entry
+        return entry
+
+
+codeStore = CodeStore()
+
+
 class TimeRunner:
     def __init__(self):
         self.time = 0
@@ -204,22 +462,93 @@ class TimeRunner:
         self.time = 0
 
 
-def compileCode(seqName):
+def compileCode(seqName, codeID=None, sidecarFiles=None):
+    compiledSeq, codeID, duration = compileForCode(seqName, codeID)
+    code = gui.code_generation.artiq_code_generator.generateCode(seqName, compiledSeq, sidecarFiles=sidecarFiles)
+    return code, codeID, duration
+
+
+def compileCodeToStore(seqName, codeID=None, folder=None, parametric=False):
+    """Compiles a sequence into the content addressed store of generated code.
+
+    The generated code does not depend on the codeID, so runs with the same code share one file.
+    If the same sequence was stored before, code generation and writing are skipped.
+    Returns: (codeID, windows_path, artiq_master_visible_path, duration, arguments, slackWarnings)
+    """
+    compiledSeq, codeID, duration = compileForCode(seqName, codeID)
+    windows_path, artiq_master_path, arguments, slackWarnings = storeCompiledSequence(seqName, compiledSeq, folder, parametric)
+    return codeID, windows_path, artiq_master_path, duration, arguments, slackWarnings
+
+
+def storeCompiledSequence(seqName, compiledSeq, folder=None, parametric=False, confirmSlack=None):
+    """Generates the code of a compiled sequence into the store, see compileCodeToStore.
+
+    confirmSlack(slackWarnings) is asked before new code is stored, None is returned if it declines.
+    Returns: (windows_path, artiq_master_visible_path, arguments, slackWarnings)
+    """
+    if folder is None:
+        folder = crate.FileManager.cratePath + ("generatedCode/parametric/" if parametric else "generatedCode/store/")
+    key = codeStore.getKey(seqName, compiledSeq, parametric, folder)
+    entry = codeStore.get(key)
+    if entry is None:
+        generator = gui.code_generation.artiq_code_generator
+        arguments = {}
+        slackWarnings = [] if settings.getSlackPredictionEnabled() else None
+        confirm = None if confirmSlack is None else lambda: confirmSlack(slackWarnings or [])
+        if parametric:
+
+            def writeCode(file):
+                _code, generatedArguments = generator.generateParametricCode(seqName, compiledSeq, file=file, slackWarnings=slackWarnings)
+                arguments.update(generatedArguments)
+
+            paths = write_content_addressed_code_file(writeCode, folder=folder, filename_prefix="parametric_", confirm=confirm)
+        else:
+            sidecarFiles = getSidecarFiles()
+
+            def writeCode(file):
+                generator.generateCode(seqName, compiledSeq, file=file, sidecarFiles=sidecarFiles, slackWarnings=slackWarnings)
+
+            paths = write_content_addressed_code_file(
+                writeCode, folder=folder, filename_prefix=f"{util.textToIdentifier(seqName)}_", sidecar_files=sidecarFiles, confirm=confirm
+            )
+        if paths is None:
+            return None
+        entry = codeStore.put(key, paths[0], paths[1], arguments, slackWarnings or [])
+    elif confirmSlack is not None and not confirmSlack(list(entry[3])):
+        return None
+    windows_path, artiq_master_path, arguments, slackWarnings = entry
+    return windows_path, artiq_master_path, copy.deepcopy(arguments), list(slackWarnings)
+
+
+def getSidecarFiles():
+    # the code generation adds the sidecar files to this dict, None writes everything inline
+    return {} if settings.getSidecarFilesEnabled() else None
+
+
+def compileForCode(seqName, codeID=None):
     compiledSeq = compileSequence(seqName, TimeRunner())
     if compiledSeq is None:
         raise Exception("cant compile because of looped subsequences")
 
-    duration = compiledSeq[-1]["time"] + compiledSeq[-1]["duration"]
-    codeID = int(datetime.now().strftime("%Y%m%d%H%M%S%f"))
-    code = gui.code_generation.artiq_code_generator.generateCode(seqName, compiledSeq, codeID)
-    return code, codeID, duration
+    duration = compiledSeq.getDuration()
+    if codeID is None:
+        codeID = reserveCodeIDs()
+    return compiledSeq, codeID, duration
 
 
-def compileAndRun(seqName):
+def compileAndRun(seqName, scanVariables=None, resultDatasets=None, priority=0, confirmation=None):
+    """Returns the codeID of the submitted run, None if it was not submitted.
 
+    Runs of a scan share one RunConfirmation, so only its first run asks for confirmation.
+    """
+    if confirmation is None:
+        confirmation = RunConfirmation()
+    # points of a MultiRun scan pass their scanned variables and may share a parametric experiment file
+    isParametric = scanVariables is not None and settings.getParametricScansEnabled()
     try:
-        compiledCode, codeID, duration = compileCode(seqName)
+        compiledSeq, codeID, duration = compileForCode(seqName)
     except Exception as e:
+        log("Error when compiling sequence: ")
         log(e)
         return
     
@@ -239,40 +568,104 @@ def compileAndRun(seqName):
             log(e)
 
 
-    variables = copy.deepcopy(MultiRun.currentlyRunningVariables) if MultiRun.currentlyRunningVariables is not None else copy.deepcopy(crate.variables)
+    variables = copy.deepcopy(variable_index.getVariables())
     Playlist.sequenceCompiled(codeID, seqName, variables)
 
-    if duration > 60 * 10:
-        if not Design.confirmationDialog(
-            "WARNING",
-            f"sequence duration is {timedelta(seconds=duration)} long, are you sure you want to run?",
-        ):
-            return None
+    if not confirmation.confirmDuration(duration):
+        return None
 
+    # like before the code store, nothing is written for declined runs
     try:
-        codeID, _code_file_path, artiq_master_to_code_path = write_generated_code_file(
-            compiledCode,
-            code_id=codeID,
-        )
+        stored = storeCompiledSequence(seqName, compiledSeq, parametric=isParametric, confirmSlack=lambda slackWarnings: confirmation.confirmSlack(seqName, slackWarnings))
     except Exception as e:
         log("Error when compiling sequence: ")
         log(e)
         return
+    if stored is None:
+        return None
+    _code_file_path, artiq_master_to_code_path, arguments, _slackWarnings = stored
+    if isParametric:
+        arguments["scanVariables"] = scanVariables
+    if resultDatasets is not None:
+        arguments["resultDatasets"] = list(resultDatasets)
+
+    submitCompiledFile(seqName, codeID, artiq_master_to_code_path, duration, arguments, priority=priority)
+    return codeID
+
+
+def confirmDuration(duration):
+    if duration > 60 * 10:
+        return Design.confirmationDialog(
+            "WARNING",
+            f"sequence duration is {timedelta(seconds=duration)} long, are you sure you want to run?",
+        )
+    return True
+
+
+def confirmSlack(seqName, slackWarnings):
+    if len(slackWarnings) > 0:
+        for warning in slackWarnings:
+            log(f"Sequence {seqName}: {warning}")
+        return Design.confirmationDialog(
+            "WARNING",
+            "RTIO underflows are predicted for this sequence:\n" + "\n".join(slackWarnings) + "\nare you sure you want to run?",
+        )
+    return True
+
+
+class RunConfirmation:
+    """Asks once whether to run despite a long duration or predicted RTIO underflows and remembers the answer."""
+
+    def __init__(self):
+        self.durationConfirmed = None
+        self.slackConfirmed = None
+
+    def confirmDuration(self, duration):
+        if self.durationConfirmed is None:
+            self.durationConfirmed = confirmDuration(duration)
+        return self.durationConfirmed
+
+    def confirmSlack(self, seqName, slackWarnings):
+        if self.slackConfirmed is None:
+            self.slackConfirmed = confirmSlack(seqName, slackWarnings)
+        return self.slackConfirmed
+
+    def isDeclined(self):
+        return self.durationConfirmed is False or self.slackConfirmed is False
+
+
+def submitCompiledFile(seqName, codeID, artiq_master_to_code_path, duration, arguments=None, priority=0):
     try:
         submit_experiment_file(
             file=artiq_master_to_code_path,
             class_name=util.textToIdentifier(seqName),
-            arguments={"codeID": codeID},
+            arguments={**(arguments or {}), "codeID": codeID},
             duration=duration,
             pipeline_name="main",
-            priority=0,
+            priority=priority,
             due_date=None,
             flush=False,
         )
     except ConnectionRefusedError as e:
         log(e)
     log(f"Sequence {seqName} submitted")
-    
+
+
+def canCompileInProcessPool():
+    # generators registered by plugins at runtime are not available in worker processes
+    generators = gui.code_generation.artiq_code_generator
+    return all(
+        len(externalGenerators) == 0
+        for externalGenerators in [
+            generators.externalInitGenerators,
+            generators.externalPrepareGenerators,
+            generators.externalImportGenerators,
+            generators.externalFunctionGenerators,
+            generators.externalAnalyzeGenerators,
+            generators.externalBuildGenerators,
+        ]
+    )
+
 
 def stopRun():
     target = "master_schedule" if int(crate.Config.get("artiqVersion")) <= 7 else "schedule"
@@ -292,6 +685,9 @@ def getDurationValue(seqName, seqStack=None):
     if seqName in seqStack:
         return float("inf")
     if seqName is not None and seqName != "" and seqName in crate.sequences:
+        key = (seqName, compileCache.variablesKey)
+        if key in compileCache.durations:
+            return compileCache.durations[key]
         seqStack.append(seqName)
         value = 0
         for segName, segData in crate.sequences[seqName]["segments"].items():
@@ -299,7 +695,8 @@ def getDurationValue(seqName, seqStack=None):
                 if segData["type"] == "portstate":
                     value += getSegmentDurationValue(segData)
                 elif segData["type"] == "subsequence":
-                    value += getSubsequenceDurationValue(segData, copy.deepcopy(seqStack))
+                    value += getSubsequenceDurationValue(segData, seqStack.copy())
+        compileCache.durations[key] = value
         return value
     return None
 
@@ -308,8 +705,12 @@ def getSegmentDurationValue(segment):
     return Input.getValueFromState(segment["duration"], reader=eval, replacer=Variables.replacer)
 
 
+def getIntValueFromState(state):
+    return Input.getValueFromState(state, reader=eval, replacer=Variables.replacer, converter=int)
+
+
 def getSubsequenceRepeatsValue(segment):
-    return Input.getValueFromState(segment["repeats"], reader=lambda x: int(eval(x)), replacer=Variables.replacer)
+    return getIntValueFromState(segment["repeats"])
 
 
 def getSubsequenceDurationValue(segment, seqStack=None):
@@ -321,41 +722,34 @@ def getSubsequenceDurationValue(segment, seqStack=None):
 
 def compileSequence(seqName, timeRunner, seqStack=None):
     if seqStack is None:
+        compileCache.beginCompile()
         seqStack = [seqName]
     else:
         if seqName in seqStack:
             return None
         seqStack.append(seqName)
-    compiledSeq = []
+    compiledSeq = timeline.Timeline()
     for segName, segData in crate.sequences[seqName]["segments"].items():
         if segData["enabled"]:
             if segData["type"] == "portstate":
-                compiledSeg = compilePortStateSegment(seqName, segName, segData, timeRunner)
+                success = compilePortStateSegment(compiledSeq, seqName, segName, segData, timeRunner)
             elif segData["type"] == "subsequence":
-                compiledSeg = compileSubsequenceSegment(segData, timeRunner, copy.deepcopy(seqStack))
+                success = compileSubsequenceSegment(compiledSeq, segData, timeRunner, seqStack.copy())
             elif segData["type"] == "triggerwait":
-                compiledSeg = compileTriggerWaitSegment(segData, timeRunner)
-            if compiledSeg is None:
+                success = compileTriggerWaitSegment(compiledSeq, segData, timeRunner)
+            if not success:
                 return None
-            for seg in compiledSeg:
-                compiledSeq.append(seg)
-    return compiledSeq
+    return compiledSeq.finish()
 
 
-def compilePortStateSegment(seqName, segName, segData, timeRunner):
+def compilePortStateSegment(compiledSeq, seqName, segName, segData, timeRunner):
     durationValue = getSegmentDurationValue(segData)
-    return [
-        {
-            "time": timeRunner.run(durationValue),
-            "duration": durationValue,
-            "single_duration": durationValue,
-            "ports": compilePortStateDict(seqName, segName, segData["ports"]),
-            "rpcs": compileRpcDict(seqName, segName, segData["rpcs"]),
-        }
-    ]
-
-
-def compileSubsequenceSegment(segment, timeRunner, seqStack):
+    ports, rpcs = compileCache.getSegment(seqName, segName, segData)
+    compiledSeq.addPortState(timeRunner.run(durationValue), durationValue, ports, rpcs)
+    return True
+
+
+def compileSubsequenceSegment(compiledSeq, segment, timeRunner, seqStack):
     duration = getDurationValue(segment["subsequence"])
     assert duration is not None, "Subsequence duration returned None"
     assert duration != float("inf"), f'Subsequence "{segment["subsequence"]}" contains itself'
@@ -363,28 +757,21 @@ def compileSubsequenceSegment(segment, timeRunner, seqStack):
     assert repeats is not None, "Subsequence repeats returned None"
     time = timeRunner.time
     timeRunner.run(duration * repeats)
-    return [
-        {
-            "name": segment["subsequence"],
-            "time": time,
-            "single_duration": duration,
-            "duration": duration * repeats,
-            "repeats": repeats,
-            "subsequence": compileSequence(segment["subsequence"], TimeRunner(), seqStack),
-        }
-    ]
-
-
-def compileTriggerWaitSegment(segment, timeRunner):
+    # identical subsequences compile to the same body, so compile each of them once
+    key = (segment["subsequence"], compileCache.variablesKey)
+    if key not in compileCache.subsequences:
+        compileCache.subsequences[key] = compileSequence(segment["subsequence"], TimeRunner(), seqStack)
+    if compileCache.subsequences[key] is None:
+        return False
+    # all uses of the subsequence share its timeline instead of copying it
+    compiledSeq.addSubsequence(segment["subsequence"], time, duration, repeats, compileCache.subsequences[key])
+    return True
+
+
+def compileTriggerWaitSegment(compiledSeq, segment, timeRunner):
     durationValue = getSegmentDurationValue(segment)
-    return [
-        {
-            "time": timeRunner.run(durationValue),
-            "duration": durationValue,
-            "single_duration": durationValue,
-            "input_ttl": crate.labsetup[segment["input_ttl"]]["device"],
-        }
-    ]
+    compiledSeq.addTriggerWait(timeRunner.run(durationValue), durationValue, crate.labsetup[segment["input_ttl"]]["device"])
+    return True
 
 
 def compilePortStateDict(seqName, segName, portStateDict):
@@ -486,7 +873,7 @@ def compileUrukul(portName, portState):
             compiledPortState["ram_start"] = portState["ram_start"]
             compiledPortState["ram_end"] = portState["ram_end"]
 
-            compiledPortState["ram_step_size"] = Input.getValueFromState(portState["ram_step_size"], reader=lambda x: int(eval(x)), replacer=Variables.replacer)
+            compiledPortState["ram_step_size"] = getIntValueFromState(portState["ram_step_size"])
 
             compiledPortState["ram_phase_formula"] = Formula.translateFormulaToNumpy(Variables.replacer(portState["ram_phase_formula"]))
             compiledPortState["ram_amplitude_formula"] = Formula.translateFormulaToNumpy(Variables.replacer(portState["ram_amplitude_formula"]))
@@ -20,6 +20,7 @@ class Action:
         action = cls.action(**kwargs)
         crate.appendToUndoStack(action)
         cls.do(action)
+        crate.notifyActionCallbacks(action)
 
     def do(action):
         raise "not implemented"
@@ -80,13 +80,25 @@ def load(newCratePath=None):
     if newCratePath is None:
         newCratePath = settings.getCratePath()
 
+    success, return_message, loadedData, newDeviceDb = readCrateFiles(newCratePath)
+
+    if success:
+        global cratePath
+        cratePath = newCratePath
+        settings.setCratePath(cratePath)
+        applyCrateData(loadedData, newDeviceDb)
+
+    return success, return_message
+
+
+def readCrateFiles(path):
     success = True
     return_message = ""
     loadedData = {}
-    newDeviceDb = None
+    deviceDb = None
 
     for fileName in FILES.keys():
-        filePath = _join(newCratePath, fileName)
+        filePath = _join(path, fileName)
         try:
             data, warn = _load_json_with_fallback(filePath)
             loadedData[fileName] = data
@@ -97,21 +109,19 @@ def load(newCratePath=None):
             return_message += f"⚠ no readable {fileName} (or backup) found\n"
 
     try:
-        newDeviceDb = open(_join(newCratePath, "device_db.py"), "r", encoding="utf-8").read()
+        deviceDb = open(_join(path, "device_db.py"), "r", encoding="utf-8").read()
     except OSError:
         success = False
         return_message += "⚠ no device_db.py file found\n"
 
-    if success:
-        global cratePath
-        cratePath = newCratePath
-        settings.setCratePath(cratePath)
-        for fileName, fileInfo in FILES.items():
-            setattr(crate, fileInfo["crate_attr"], loadedData[fileName])
-        complementConfigData()
-        crate.loadDeviceDbVariables(newDeviceDb)
+    return success, return_message, loadedData, deviceDb
 
-    return success, return_message
+
+def applyCrateData(loadedData, deviceDb):
+    for fileName, fileInfo in FILES.items():
+        setattr(crate, fileInfo["crate_attr"], loadedData[fileName])
+    complementConfigData()
+    crate.loadDeviceDbVariables(deviceDb)
 
 
 def complementConfigData():
@@ -164,7 +174,11 @@ def save():
 
 
 def _join(*parts):
-    return "/".join(p.strip("/\\") for p in parts if p not in (None, ""))
+    joined = "/".join(p.strip("/\\") for p in parts if p not in (None, ""))
+    # keep absolute posix paths absolute
+    if len(parts) > 0 and parts[0] is not None and parts[0].startswith("/"):
+        joined = "/" + joined
+    return joined
 
 def _fsync_dir(dir_path):
     try:
@@ -228,6 +242,21 @@ def saveSequenceData(seqName, RID=''):
         
     
 
+def saveMultiRunRecord(multirunName, seqName, seed):
+    """Saves the settings and seed of a Monte Carlo multirun, which are enough to draw its points again."""
+    try:
+        generatedCodeFolderPath = crate.FileManager.cratePath + "generatedCode/" + datetime.now().strftime("%Y-%m-%d") + "/MultiRuns"
+        if not os.path.exists(generatedCodeFolderPath):
+            os.makedirs(generatedCodeFolderPath)
+        recordFilePath = generatedCodeFolderPath + "/" + datetime.now().strftime("%Y%m%d_%H%M%S") + "_" + multirunName.replace("/", "_") + ".json"
+        data = json.dumps({"multirun": multirunName, "sequence": seqName, "seed": seed, "data": crate.multiruns[multirunName]}, indent=4)
+        with open(recordFilePath, "w") as file:
+            file.write(data)
+    except OSError as e:
+        log(e)
+        log(f"Error: saving the record of multirun {multirunName} failed")
+
+
 def saveConfig():
     saveCrateData("config.json")
 
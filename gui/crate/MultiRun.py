@@ -1,13 +1,26 @@
 import copy
 
+import numpy as np
+
 import gui.crate as crate
 import gui.crate.Actions as Actions
 import gui.crate.FileManager as FileManager
+import gui.scan_plan as scan_plan
 import gui.widgets.MultiRun
 
 DEFAULT_VALUES = {
     "mode": "scan",
     "dimensions": {},
+    "samples": "100",
+    "seed": "",
+    "populationSize": "10",
+    "generations": "20",
+    "costDataset": "",
+    "goal": "minimize",
+    "ordering": "cartesian",
+    "repeats": "1",
+    "repeatMode": "consecutive",
+    "resultDatasets": "",
 }
 
 DEFAULT_DIMENSION_VALUES = {
@@ -21,8 +34,13 @@ DEFAULT_VARIABLE_VALUES = {
     "min": "0",
     "max": "1",
     "datalist": [0, 1, 2, 3],
+    "mean": "0",
+    "std": "1",
 }
 
+# Monte Carlo points are drawn in batches of this size, the values only depend on the seed
+MONTE_CARLO_BATCH_SIZE = 4096
+
 
 def getValue(multirunName, valueName):
     multirun = crate.multiruns[multirunName]
@@ -44,6 +62,100 @@ def getVariableValue(multirunName, dimension, variableName, valueName):
     return variable[valueName]
 
 
+def getRunCount(multirunName):
+    mode = getValue(multirunName, "mode")
+    if mode == "monte carlo":
+        return int(getValue(multirunName, "samples"))
+    if mode == "differential evolution":
+        return int(getValue(multirunName, "populationSize")) * (int(getValue(multirunName, "generations")) + 1)
+    return len(getScanPlan(multirunName))
+
+
+def getScanValues(variableData, steps):
+    if variableData["mode"] == "linear":
+        return np.linspace(float(variableData["min"]), float(variableData["max"]), steps)
+    if variableData["mode"] == "log":
+        return np.geomspace(float(variableData["min"]), float(variableData["max"]), steps)
+    return variableData["datalist"]
+
+
+def getScanPlan(multirunName, seed=0):
+    dimensions = list(getValue(multirunName, "dimensions").values())
+    steps = [int(dimData["steps"]) for dimData in dimensions]
+    return scan_plan.ScanPlan(
+        [{variableName: getScanValues(variableData, steps_) for variableName, variableData in dimData["variables"].items()} for dimData, steps_ in zip(dimensions, steps)],
+        steps=steps,
+        ordering=getValue(multirunName, "ordering"),
+        repeats=int(getValue(multirunName, "repeats")),
+        repeatMode=getValue(multirunName, "repeatMode"),
+        seed=seed,
+    )
+
+
+def getScanPoints(multirunName, seed=None):
+    """Yields the variable values ({variableName: value text}) of every run of a scan in the order of the multirun."""
+    if seed is None and usesSeed(multirunName):
+        seed = getMonteCarloSeed(multirunName)
+    return iter(getScanPlan(multirunName, seed or 0))
+
+
+def usesSeed(multirunName):
+    return getValue(multirunName, "mode") != "scan" or getValue(multirunName, "ordering") == "random"
+
+
+def getResultDatasets(multirunName):
+    """The datasets collected from every run of the multirun, given as comma separated names."""
+    return [name.strip() for name in str(getValue(multirunName, "resultDatasets")).split(",") if name.strip() != ""]
+
+
+def getMonteCarloSeed(multirunName):
+    """The seed of the multirun, or a new random one if none is set."""
+    seed = str(getValue(multirunName, "seed")).strip()
+    if seed != "":
+        return int(seed)
+    return int(np.random.SeedSequence().generate_state(1, np.uint64)[0])
+
+
+def getMonteCarloPoints(multirunName, seed):
+    """Yields the variable values ({variableName: value text}) of every run of a Monte Carlo multirun.
+
+    "linear" and "uniform" variables are drawn uniformly from [min, max], "log" and "log uniform" ones
+    uniformly in log space, "normal" ones from a normal distribution with mean and std. "data list" variables
+    are resampled from their data list, all data lists of a dimension with the same index.
+    """
+    dimensions = list(getValue(multirunName, "dimensions").values())
+    generator = np.random.default_rng(seed)
+    remaining = getRunCount(multirunName)
+    while remaining > 0:
+        batchSize = min(remaining, MONTE_CARLO_BATCH_SIZE)
+        columns = {}
+        for dimData in dimensions:
+            indices = None
+            for variableName, variableData in dimData["variables"].items():
+                mode = variableData["mode"]
+                if mode in ("linear", "uniform"):
+                    values = generator.uniform(float(variableData["min"]), float(variableData["max"]), batchSize)
+                elif mode in ("log", "log uniform"):
+                    values = np.exp(generator.uniform(np.log(float(variableData["min"])), np.log(float(variableData["max"])), batchSize))
+                elif mode == "normal":
+                    values = generator.normal(float(variableData["mean"]), float(variableData["std"]), batchSize)
+                else:
+                    if indices is None:
+                        indices = generator.integers(len(variableData["datalist"]), size=batchSize)
+                    values = np.asarray(variableData["datalist"], dtype=object)[indices]
+                columns[variableName] = [str(value) for value in values.tolist()]
+        for i in range(batchSize):
+            yield {variableName: values[i] for variableName, values in columns.items()}
+        remaining -= batchSize
+
+
+def getPoints(multirunName, seed=None):
+    """Yields the variable values of every run of the multirun, seed is only used by random ones."""
+    if getValue(multirunName, "mode") == "monte carlo":
+        return getMonteCarloPoints(multirunName, getMonteCarloSeed(multirunName) if seed is None else seed)
+    return getScanPoints(multirunName, seed)
+
+
 class Add(Actions.Add):
     def __init__(self, multirunName, multirunData):
         super(Add, self).__init__(multirunName, multirunData)
@@ -1,3 +1,7 @@
+# functions called with every executed action, e.g. to invalidate compile caches.
+# defined before the imports, modules imported from here register themselves while this module is partially initialized
+actionCallbacks = []
+
 import gui.crate.Config as Config
 import gui.crate.LabSetup as LabSetup
 import gui.crate.MultiRun as MultiRun
@@ -77,6 +81,12 @@ ACTION_TYPES = {
 
 def executeAction(action):
     ACTION_TYPES[action["target"]][action["type"]].do(action)
+    notifyActionCallbacks(action)
+
+
+def notifyActionCallbacks(action):
+    for callback in actionCallbacks:
+        callback(action)
 
 
 def inverseAction(action):
@@ -0,0 +1,82 @@
+"""Asynchronous differential evolution (DE/rand/1/bin) for the "differential evolution" MultiRun mode.
+
+Every slot of the population has at most one candidate in flight: first its random initial
+vector, then trial vectors, which replace it if their cost is not higher. A new trial is
+proposed as soon as the result of its slot arrives, from the population at that time, instead of
+waiting for a whole generation. So a full population of runs stays queued at the scheduler while
+the results come in.
+"""
+
+import numpy as np
+
+MUTATION = 0.7
+CROSSOVER = 0.9
+MIN_POPULATION_SIZE = 4
+
+
+class DifferentialEvolution:
+    def __init__(self, lower, upper, populationSize, generations, seed, mutation=MUTATION, crossover=CROSSOVER):
+        if populationSize < MIN_POPULATION_SIZE:
+            raise ValueError(f"the population needs at least {MIN_POPULATION_SIZE} members")
+        self.lower = np.asarray(lower, dtype=float)
+        self.upper = np.asarray(upper, dtype=float)
+        self.mutation = mutation
+        self.crossover = crossover
+        self.generator = np.random.default_rng(seed)
+        self.population = self.lower + (self.upper - self.lower) * self.generator.random((populationSize, len(self.lower)))
+        self.costs = np.full(populationSize, np.inf)
+        # initial vectors of a slot are told without comparison
+        self.initialized = np.zeros(populationSize, dtype=bool)
+        self.pending = np.zeros(populationSize, dtype=bool)
+        self.nextSlot = 0
+        self.evaluationBudget = populationSize * (generations + 1)
+        self.proposed = 0
+        self.told = 0
+
+    def ask(self):
+        """Returns (slot, vector) of the next candidate to run, None if all slots are busy or the budget is used up."""
+        if self.proposed >= self.evaluationBudget:
+            return None
+        populationSize = len(self.population)
+        for offset in range(populationSize):
+            slot = (self.nextSlot + offset) % populationSize
+            if not self.pending[slot]:
+                break
+        else:
+            return None
+        self.nextSlot = (slot + 1) % populationSize
+        self.pending[slot] = True
+        self.proposed += 1
+        if not self.initialized[slot]:
+            return slot, self.population[slot].copy()
+        return slot, self.getTrial(slot)
+
+    def getTrial(self, slot):
+        others = self.generator.choice(np.delete(np.arange(len(self.population)), slot), 3, replace=False)
+        a, b, c = self.population[others]
+        mutant = np.clip(a + self.mutation * (b - c), self.lower, self.upper)
+        crossed = self.generator.random(len(mutant)) < self.crossover
+        # at least one component comes from the mutant
+        crossed[self.generator.integers(len(mutant))] = True
+        return np.where(crossed, mutant, self.population[slot])
+
+    def tell(self, slot, vector, cost):
+        """Reports the cost of a candidate from ask, None or NaN if its run failed."""
+        cost = np.inf if cost is None or np.isnan(cost) else float(cost)
+        self.pending[slot] = False
+        self.told += 1
+        if not self.initialized[slot] or cost <= self.costs[slot]:
+            self.population[slot] = vector
+            self.costs[slot] = cost
+        self.initialized[slot] = True
+
+    def cancel(self, slot):
+        """Frees the slot of a candidate which will not be told, e.g. because its run was deleted."""
+        self.tell(slot, self.population[slot], self.costs[slot] if self.initialized[slot] else None)
+
+    def isFinished(self):
+        return self.told >= self.evaluationBudget
+
+    def getBest(self):
+        best = int(np.argmin(self.costs))
+        return self.population[best].copy(), float(self.costs[best])
@@ -0,0 +1,158 @@
+import ast
+import bisect
+import builtins
+import functools
+import re
+
+CACHE_SIZE = 4096
+
+# namespace the expressions are evaluated in, gui.widgets.Input replaces it with its own module namespace
+GLOBALS = {"__builtins__": builtins}
+
+# expressions of these kinds stay a single operand when textually inserted into another expression
+ATOMIC_NODES = (ast.Constant, ast.Name, ast.Call, ast.Attribute, ast.Subscript)
+
+
+class Expression:
+    def __init__(self, text):
+        # eval() ignores leading and trailing spaces and tabs, so do the same
+        tree = ast.parse(text.strip(" \t"), mode="eval")
+        self.code = compile(tree, "<expression>", "eval")
+        self.atomic = isinstance(tree.body, ATOMIC_NODES)
+        self.names = {}
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name):
+                self.names[node.id] = self.names.get(node.id, 0) + 1
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def compileExpression(text):
+    return Expression(text)
+
+
+def evaluate(text, environment=None):
+    return eval(compileExpression(text).code, GLOBALS, {} if environment is None else environment)
+
+
+class VariableIndex:
+    """Index over the variables for alias substitution and evaluation.
+
+    All aliases are compiled into one alternation regex (longest alias first). References between
+    variables form a dependency graph, which is resolved once in topological order, so every text
+    is substituted in a single pass. Variables that are part of or depend on a cycle are kept in
+    cyclic and raise when used.
+
+    The index also maps aliases to their evaluated values, resolving them lazily on first use.
+    Expressions are only evaluated against it if that gives the same result as the textual
+    substitution, see canEvaluate. Otherwise the caller falls back to the substitution.
+    """
+
+    def __init__(self, variables):
+        self.texts = {}
+        for variableData in variables.values():
+            if not variableData["isDir"] and variableData["alias"] != "":
+                self.texts[variableData["alias"]] = variableData["value"]
+        aliases = sorted(self.texts, key=len, reverse=True)
+        self.matcher = re.compile("|".join(re.escape(alias) for alias in aliases)) if len(aliases) > 0 else None
+        self.joinedAliases = "\n".join(aliases)
+        self.aliasStarts = []
+        start = 0
+        for alias in aliases:
+            self.aliasStarts.append(start)
+            start += len(alias) + 1
+        self.aliases = aliases
+        self.dependencies = {alias: set(self.findAliases(text)) for alias, text in self.texts.items()}
+        self.order, self.cyclic = topologicalOrder(self.dependencies)
+        self.resolvedTexts = {}
+        for alias in self.order:
+            self.resolvedTexts[alias] = self.replace(self.texts[alias])
+        self.values = {}
+        self.evaluable = {}
+
+    def findAliases(self, text):
+        if self.matcher is None:
+            return []
+        return self.matcher.findall(text)
+
+    def resolvedText(self, match):
+        alias = match.group(0)
+        if alias in self.cyclic:
+            raise ValueError(f"Infinite loop in variable: {alias}")
+        return self.resolvedTexts[alias]
+
+    def replace(self, text):
+        if self.matcher is None:
+            return text
+        return self.matcher.sub(self.resolvedText, text)
+
+    def findOverlappingAlias(self, alias, ignoredAlias=None):
+        """Returns an alias which contains or is contained in the given alias."""
+        for otherAlias in self.findAliases(alias):
+            if otherAlias != ignoredAlias:
+                return otherAlias
+        position = self.joinedAliases.find(alias)
+        while position != -1:
+            otherAlias = self.aliases[bisect.bisect_right(self.aliasStarts, position) - 1]
+            if otherAlias != ignoredAlias:
+                return otherAlias
+            position = self.joinedAliases.find(alias, position + 1)
+        if ignoredAlias is not None and ignoredAlias in alias:
+            # the ignored alias may hide shorter aliases from the matcher
+            for otherAlias in self.aliases:
+                if otherAlias != ignoredAlias and otherAlias in alias:
+                    return otherAlias
+        return None
+
+    def __getitem__(self, alias):
+        if alias not in self.values:
+            if alias not in self.texts:
+                raise KeyError(alias)
+            if alias in self.cyclic:
+                raise ValueError(f"Infinite loop in variable: {alias}")
+            self.values[alias] = evaluate(self.texts[alias], self)
+        return self.values[alias]
+
+    def canEvaluate(self, text):
+        if text not in self.evaluable:
+            self.evaluable[text] = self.checkEvaluable(text)
+        return self.evaluable[text]
+
+    def checkEvaluable(self, text):
+        try:
+            expression = compileExpression(text)
+        except Exception:
+            return False
+        counts = {}
+        for alias in self.findAliases(text):
+            counts[alias] = counts.get(alias, 0) + 1
+        for alias, count in counts.items():
+            # aliases must only appear as whole names, not inside other names or strings
+            if not alias.isidentifier() or count != expression.names.get(alias, 0):
+                return False
+            if alias in self.cyclic:
+                return False
+            valueText = self.texts[alias]
+            if not self.canEvaluate(valueText):
+                return False
+            if not compileExpression(valueText).atomic:
+                return False
+        return True
+
+
+def topologicalOrder(dependencies):
+    """Returns the nodes ordered after their dependencies and the set of nodes that are
+    part of a cycle or depend on one."""
+    dependents = {node: [] for node in dependencies}
+    remaining = {}
+    for node, nodeDependencies in dependencies.items():
+        remaining[node] = len(nodeDependencies)
+        for dependency in nodeDependencies:
+            dependents[dependency].append(node)
+    order = [node for node, count in remaining.items() if count == 0]
+    for node in order:
+        for dependent in dependents[node]:
+            remaining[dependent] -= 1
+            if remaining[dependent] == 0:
+                order.append(dependent)
+    cyclic = set(dependencies) - set(order)
+    return order, cyclic
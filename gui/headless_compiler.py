@@ -0,0 +1,327 @@
+"""Compiles sequences of a crate into ARTIQ experiment files without starting the GUI.
+
+No QApplication, dialogs or artiq_master connection are created, PySide6 only has to be importable.
+
+Examples:
+    python -m gui.headless_compiler path/to/crate/ "my sequence"
+    python -m gui.headless_compiler path/to/crate/ "my sequence" --set "folder/variable=0.5"
+    python -m gui.headless_compiler path/to/crate/ "my sequence" --multirun "my scan" --processes 8
+    python -m gui.headless_compiler path/to/crate/ "my sequence" --multirun "my scan" --parametric
+    python -m gui.headless_compiler path/to/crate/ --all --output build/
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+
+import gui.compiler as compiler
+import gui.crate as crate
+import gui.settings as settings
+import gui.variable_index as variable_index
+import gui.widgets.Log as Log
+
+logger = logging.getLogger(__name__)
+
+
+class LogController:
+    """Takes the place of the log dock, the messages of the compiler go to logging."""
+
+    LEVELS = {
+        Log.Level.DEBUG: logging.DEBUG,
+        Log.Level.INFO: logging.INFO,
+        Log.Level.WARNING: logging.WARNING,
+        Log.Level.ERROR: logging.ERROR,
+    }
+
+    def addLog(self, message, level):
+        logger.log(self.LEVELS[level], message)
+
+
+def useLogging():
+    Log.Controller.controller = LogController()
+
+
+def loadSettings(settingsPath="settings.json"):
+    # code generation options are read from the GUI settings, but nothing is written back
+    try:
+        with open(settingsPath, "r") as file:
+            settings.data = json.load(file)
+    except Exception:
+        settings.data = {}
+    settings.loadMissingDefaults(save=False)
+
+
+def loadCrate(cratePath):
+    cratePath = cratePath.replace("\\", "/")
+    if not cratePath.endswith("/"):
+        cratePath += "/"
+    success, message, loadedData, deviceDb = crate.FileManager.readCrateFiles(cratePath)
+    if not success:
+        raise Exception(f"Could not load crate {cratePath}:\n{message}")
+    # set the crate path without settings.setCratePath, which would change the crate of the GUI
+    crate.FileManager.cratePath = cratePath
+    crate.FileManager.applyCrateData(loadedData, deviceDb)
+    return message
+
+
+def getSequenceNames():
+    return [seqName for seqName, seqData in crate.sequences.items() if not seqData["isDir"]]
+
+
+def setVariableOverrides(overrides=None):
+    """Compiles with the given variable values ({variableName: value text}) like a MultiRun point."""
+    variable_index.setPoint(overrides)
+
+
+def compileToFile(seqName, overrides=None, codeID=None, folder=None, parametric=False):
+    """Compiles a sequence into an experiment file and returns a result dict.
+
+    Files are named after the hash of their code and shared by all results with the same code,
+    results have to be submitted with their "arguments" (and the codeID).
+    """
+    startTime = time.perf_counter()
+    setVariableOverrides(overrides)
+    try:
+        codeID, path, artiqMasterPath, duration, arguments, slackWarnings = compiler.compileCodeToStore(seqName, codeID, folder, parametric)
+        if parametric:
+            arguments["scanVariables"] = overrides or {}
+    finally:
+        setVariableOverrides(None)
+    return {
+        "sequence": seqName,
+        "variables": overrides or {},
+        "codeID": codeID,
+        "path": path,
+        "artiqMasterPath": artiqMasterPath,
+        "arguments": arguments,
+        "duration": duration,
+        "slackWarnings": slackWarnings,
+        "compileTime": time.perf_counter() - startTime,
+    }
+
+
+def getCrateSnapshot():
+    """Everything a worker process needs to compile like this process."""
+    return {
+        "cratePath": crate.FileManager.cratePath,
+        "crate": {fileInfo["crate_attr"]: getattr(crate, fileInfo["crate_attr"]) for fileInfo in crate.FileManager.FILES.values()},
+        "device_db": crate.device_db,
+        "core_addr": crate.core_addr,
+        "settings": settings.data,
+    }
+
+
+def initWorker(snapshot):
+    # a worker forked from the GUI must not touch the log dock of its parent
+    useLogging()
+    settings.data = snapshot["settings"]
+    crate.FileManager.cratePath = snapshot["cratePath"]
+    for crateAttr, data in snapshot["crate"].items():
+        setattr(crate, crateAttr, data)
+    crate.device_db = snapshot["device_db"]
+    crate.core_addr = snapshot["core_addr"]
+
+
+def compileTask(task):
+    seqName, overrides, codeID, folder, parametric = task
+    try:
+        return compileToFile(seqName, overrides, codeID, folder, parametric)
+    except Exception as e:
+        return {
+            "sequence": seqName,
+            "variables": overrides or {},
+            "codeID": codeID,
+            "error": f"{type(e).__name__}: {e}",
+        }
+
+
+def prepareTasks(tasks, folder=None, parametric=False):
+    # lazy, so the points of large multiruns are only created while they are compiled.
+    # codeIDs are reserved one at a time, so runs started in between get their own
+    for seqName, overrides in tasks:
+        yield (seqName, overrides, compiler.reserveCodeIDs(), folder, parametric)
+
+
+def getTaskCount(tasks, taskCount):
+    if taskCount is None:
+        tasks = list(tasks)
+        taskCount = len(tasks)
+    return tasks, taskCount
+
+
+def getProcessCount(processes, taskCount):
+    if processes is None:
+        processes = os.cpu_count() or 1
+    return max(1, min(processes, taskCount))
+
+
+def createPool(processes):
+    # the crate snapshot is shipped once per worker, tasks only carry their variable overrides
+    return multiprocessing.Pool(processes, initializer=initWorker, initargs=(getCrateSnapshot(),))
+
+
+def compileBatch(tasks, processes=None, folder=None, parametric=False, taskCount=None):
+    """Compiles (sequence name, variable overrides) tasks and yields a result dict per task in task order.
+
+    The crate and settings of this process are used, so they have to be loaded already.
+    Tasks can be a generator if their taskCount is given.
+    """
+    tasks, taskCount = getTaskCount(tasks, taskCount)
+    processes = getProcessCount(processes, taskCount)
+    tasks = prepareTasks(tasks, folder, parametric)
+    if processes <= 1:
+        for task in tasks:
+            yield compileTask(task)
+        return
+    with createPool(processes) as pool:
+        for result in pool.imap(compileTask, tasks):
+            yield result
+
+
+class BatchCompilation:
+    """Compiles tasks like compileBatch in the background.
+
+    Results are collected by a thread and can be fetched in task order without blocking,
+    e.g. from a timer of the GUI. A None result marks the end of the batch.
+    If bufferSize is given, at most bufferSize results wait to be fetched (besides the tasks the
+    processes are working on), so the compilation does not run ahead of the consumer.
+    """
+
+    def __init__(self, tasks, processes=None, folder=None, parametric=False, taskCount=None, bufferSize=None):
+        tasks, taskCount = getTaskCount(tasks, taskCount)
+        tasks = prepareTasks(tasks, folder, parametric)
+        processes = getProcessCount(processes, taskCount)
+        self.results = queue.Queue()
+        self.cancelled = False
+        self.slots = None
+        if bufferSize is not None:
+            self.slots = threading.Semaphore(processes + bufferSize)
+            tasks = self.throttle(tasks)
+        self.pool = createPool(processes)
+        self.thread = threading.Thread(target=self.collect, args=(tasks,), daemon=True)
+        self.thread.start()
+
+    def throttle(self, tasks):
+        # the task handler thread of the pool reads the tasks, it waits here for fetched results.
+        # The slot is taken first, so the next task is only created (and its codeID reserved) once it can run
+        tasks = iter(tasks)
+        while True:
+            self.slots.acquire()
+            task = None if self.cancelled else next(tasks, None)
+            if task is None:
+                return
+            yield task
+
+    def collect(self, tasks):
+        try:
+            for result in self.pool.imap(compileTask, tasks):
+                if self.cancelled:
+                    break
+                self.results.put(result)
+            self.pool.close()
+        except Exception as e:
+            if not self.cancelled:
+                self.results.put({"sequence": None, "variables": {}, "codeID": None, "error": f"{type(e).__name__}: {e}"})
+        finally:
+            self.results.put(None)
+
+    def getResults(self, count=None):
+        """Returns the results compiled so far, at most count."""
+        results = []
+        while count is None or len(results) < count:
+            try:
+                result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if result is not None and self.slots is not None:
+                self.slots.release()
+            results.append(result)
+        return results
+
+    def cancel(self):
+        self.cancelled = True
+        # the task handler has to return from throttle, terminate waits for it
+        if self.slots is not None:
+            self.slots.release()
+        self.pool.terminate()
+
+
+def parseOverride(text):
+    if "=" not in text:
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got {text}")
+    name, value = text.split("=", 1)
+    return name, value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m gui.headless_compiler", description="Compile sequences of a crate into ARTIQ experiment files without the GUI.")
+    parser.add_argument("crate", help="path to the crate folder")
+    parser.add_argument("sequences", nargs="*", help="names of the sequences to compile")
+    parser.add_argument("--all", action="store_true", help="compile all sequences of the crate")
+    parser.add_argument("--multirun", help="compile every point of this MultiRun scan for each sequence")
+    parser.add_argument("--set", dest="overrides", action="append", type=parseOverride, default=[], metavar="NAME=VALUE", help="override a variable value")
+    parser.add_argument("--seed", type=int, default=None, help="seed of a monte carlo or random scan multirun, defaults to the seed of the multirun or a random one")
+    parser.add_argument("--processes", type=int, default=None, help="number of worker processes, defaults to the number of cores")
+    parser.add_argument("--output", default=None, help="folder for the experiment files, defaults to the generatedCode/store (or parametric) folder of the crate")
+    parser.add_argument("--parametric", action="store_true", help="write parametric experiment files, shared by all points with the same code")
+    parser.add_argument("--settings", default="settings.json", help="GUI settings file to read code generation options from")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    useLogging()
+
+    startTime = time.perf_counter()
+    loadSettings(args.settings)
+    message = loadCrate(args.crate)
+    if message != "":
+        logger.warning(message)
+    seqNames = getSequenceNames() if args.all else args.sequences
+    if len(seqNames) == 0:
+        parser.error("no sequences given")
+    for seqName in seqNames:
+        if seqName not in crate.sequences:
+            parser.error(f"unknown sequence {seqName}")
+    overrides = dict(args.overrides)
+    if args.multirun is not None:
+        if args.multirun not in crate.multiruns:
+            parser.error(f"unknown multirun {args.multirun}")
+        if crate.MultiRun.getValue(args.multirun, "mode") == "differential evolution":
+            parser.error("differential evolution multiruns depend on the results of their runs, they can only run in the GUI")
+        seed = None
+        if crate.MultiRun.usesSeed(args.multirun):
+            seed = crate.MultiRun.getMonteCarloSeed(args.multirun) if args.seed is None else args.seed
+            logger.info(f"seed {seed}")
+        points = [{**overrides, **point} for point in crate.MultiRun.getPoints(args.multirun, seed)]
+    else:
+        points = [overrides]
+    folder = args.output
+    if folder is not None:
+        folder = folder.replace("\\", "/")
+        if not folder.endswith("/"):
+            folder += "/"
+        os.makedirs(folder, exist_ok=True)
+    tasks = [(seqName, point) for seqName in seqNames for point in points]
+
+    failed = 0
+    paths = set()
+    for result in compileBatch(tasks, args.processes, folder, args.parametric):
+        if "error" in result:
+            failed += 1
+            logger.error(f"{result['sequence']} {result['variables']}: {result['error']}")
+        else:
+            paths.add(result["path"])
+            print(f"{result['path']}  duration {result['duration']:.6g} s  compiled in {result['compileTime'] * 1000:.1f} ms")
+            for warning in result["slackWarnings"]:
+                logger.warning(f"{result['sequence']} {result['variables']}: {warning}")
+    print(f"{len(paths)} distinct experiment files")
+    print(f"{len(tasks) - failed} of {len(tasks)} compiled in {time.perf_counter() - startTime:.2f} s")
+    return 1 if failed > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
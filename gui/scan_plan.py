@@ -0,0 +1,125 @@
+"""Lazy generation of the points of a scan multirun.
+
+A ScanPlan maps the position of a run in the scan to an index per dimension with NumPy index
+arithmetic, a batch of positions at a time. Neither the grid nor the order of the runs is ever
+stored, so the size of a scan only limits how long it runs.
+"""
+
+import numpy as np
+
+ORDERINGS = ["cartesian", "zipped", "snake", "random"]
+REPEAT_MODES = ["consecutive", "interleaved"]
+
+BATCH_SIZE = 4096
+
+FEISTEL_ROUNDS = 4
+
+
+class ScanPlan:
+    """The runs of a scan over dimensions, each a dict {variableName: values} with the same number of values.
+
+    steps gives the number of steps of every dimension, which is needed for dimensions without variables.
+
+    cartesian: every combination, the last dimension changing fastest
+    zipped: the dimensions change together, they need the same number of steps
+    snake: like cartesian, but every dimension reverses its direction instead of jumping back
+    random: every combination in a random order given by the seed
+
+    Every point runs repeats times, either consecutive or interleaved, i.e. the whole scan repeated.
+    Interleaved random scans use a new order for every repetition.
+    """
+
+    def __init__(self, dimensions, steps=None, ordering="cartesian", repeats=1, repeatMode="consecutive", seed=0):
+        if ordering not in ORDERINGS:
+            raise ValueError(f"unknown ordering {ordering}")
+        if repeatMode not in REPEAT_MODES:
+            raise ValueError(f"unknown repeat mode {repeatMode}")
+        self.dimensions = [{variableName: np.asarray(values, dtype=object) for variableName, values in dimension.items()} for dimension in dimensions]
+        if steps is None:
+            steps = [None] * len(self.dimensions)
+        self.shape = tuple(getStepCount(dimension, dimensionSteps) for dimension, dimensionSteps in zip(self.dimensions, steps))
+        self.ordering = ordering
+        self.repeats = max(1, int(repeats))
+        self.repeatMode = repeatMode
+        self.seed = seed
+        if ordering == "zipped":
+            if len(set(self.shape)) > 1:
+                raise ValueError(f"zipped dimensions need the same number of steps, got {list(self.shape)}")
+            self.pointCount = self.shape[0] if len(self.shape) > 0 else 1
+        else:
+            self.pointCount = int(np.prod(self.shape, dtype=np.int64))
+
+    def __len__(self):
+        return self.pointCount * self.repeats
+
+    def getIndices(self, positions):
+        """Returns the index into every dimension of the runs at the positions of the scan."""
+        positions = np.asarray(positions, dtype=np.int64)
+        if self.repeatMode == "interleaved":
+            repetitions, points = np.divmod(positions, self.pointCount)
+        else:
+            repetitions, points = np.zeros_like(positions), positions // self.repeats
+        if self.ordering == "zipped":
+            return [points for _ in self.shape]
+        if self.ordering == "random":
+            points = permute(points, self.pointCount, self.seed, repetitions)
+        indices = list(np.unravel_index(points, self.shape)) if len(self.shape) > 0 else []
+        if self.ordering == "snake":
+            blockSize = self.pointCount
+            for j in range(len(self.shape)):
+                # odd passes through a dimension run backwards
+                reverse = (points // blockSize) % 2 == 1
+                indices[j] = np.where(reverse, self.shape[j] - 1 - indices[j], indices[j])
+                blockSize //= self.shape[j]
+        return indices
+
+    def getPoints(self, start, stop):
+        """Returns the variable values ({variableName: value text}) of the runs from start to stop."""
+        indices = self.getIndices(np.arange(start, stop))
+        columns = {}
+        for dimension, dimensionIndices in zip(self.dimensions, indices):
+            for variableName, values in dimension.items():
+                columns[variableName] = [str(value) for value in values[dimensionIndices].tolist()]
+        return [{variableName: values[i] for variableName, values in columns.items()} for i in range(stop - start)]
+
+    def __iter__(self):
+        for start in range(0, len(self), BATCH_SIZE):
+            yield from self.getPoints(start, min(start + BATCH_SIZE, len(self)))
+
+
+def getStepCount(dimension, steps=None):
+    counts = {len(values) for values in dimension.values()}
+    if steps is not None:
+        counts.add(int(steps))
+    if len(counts) > 1:
+        raise ValueError(f"the variables of a dimension need the same number of values, got {sorted(counts)}")
+    return counts.pop() if len(counts) > 0 else 1
+
+
+def permute(points, count, seed, repetitions):
+    """A random permutation of range(count) evaluated at points, without storing it.
+
+    A Feistel network on enough bits is a permutation of a power of two range, values outside of
+    range(count) are encrypted again until they fall into it (cycle walking).
+    """
+    halfBits = max(1, (int(count - 1).bit_length() + 1) // 2)
+    mask = np.uint64((1 << halfBits) - 1)
+    keys = np.random.default_rng(seed).integers(0, 1 << 32, size=FEISTEL_ROUNDS, dtype=np.uint64)
+    repetitions = np.asarray(repetitions, dtype=np.uint64)
+    result = np.asarray(points, dtype=np.uint64).copy()
+    outside = np.ones(len(result), dtype=bool)
+    while outside.any():
+        result[outside] = feistel(result[outside], repetitions[outside], keys, halfBits, mask)
+        outside = result >= count
+    return result.astype(np.int64)
+
+
+def feistel(values, tweaks, keys, halfBits, mask):
+    left = values >> np.uint64(halfBits)
+    right = values & mask
+    with np.errstate(over="ignore"):
+        for key in keys:
+            mixed = (right + key + tweaks * np.uint64(0x9E3779B97F4A7C15)) * np.uint64(0xBF58476D1CE4E5B9)
+            mixed ^= mixed >> np.uint64(31)
+            left, right = right, left ^ (mixed & mask)
+    return (left << np.uint64(halfBits)) | right
@@ -0,0 +1,114 @@
+"""Results of the runs of a multirun, collected into one table per multirun while the runs finish.
+
+Every column is a memory-mapped .npy file with a row per run of the multirun, in the order the runs
+were queued: the codeID as text, the variable values of the run and the datasets it sent back after its
+analyze stage. Rows of runs without results yet are NaN. A column is created with the shape of the
+first value it gets, so a dataset can be a scalar or an array.
+
+Load a table for plotting or fitting with loadTable instead of opening the files of every run.
+"""
+
+import json
+import os
+
+import numpy as np
+
+TABLE_FILE = "table.json"
+CODE_ID_DTYPE = "<U32"
+
+
+class ScanResultTable:
+    def __init__(self, folder, rowCount, info=None):
+        self.folder = folder
+        self.rowCount = rowCount
+        self.info = info or {}
+        self.columns = {}  # column name -> memmap
+        self.columnKinds = {}  # column name -> "run", "variable" or "dataset"
+        self.rows = {}  # codeID -> row of the runs without results yet
+        self.nextRow = 0
+        self.queueing = True
+        os.makedirs(folder, exist_ok=True)
+        # codeIDs are timestamps with microseconds, they do not fit into 64 bit integers
+        self.addColumn("codeID", "run", (), dtype=CODE_ID_DTYPE, fill="")
+        self.addColumn("finished", "run", (), dtype=bool, fill=False)
+
+    def addRun(self, codeID, point):
+        """Adds a row for a queued run with its variable values ({variableName: value text})."""
+        if self.nextRow >= self.rowCount:
+            raise IndexError(f"the table only has {self.rowCount} rows")
+        row = self.nextRow
+        self.nextRow += 1
+        self.rows[str(codeID)] = row
+        self.columns["codeID"][row] = str(codeID)
+        for variableName, value in point.items():
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                value = np.nan
+            self.setValue(variableName, "variable", row, value)
+
+    def addResults(self, codeID, results):
+        """Writes the datasets ({datasetName: value}) of a run, returns False if the run is not in the table."""
+        row = self.rows.pop(str(codeID), None)
+        if row is None:
+            return False
+        for datasetName, value in results.items():
+            if value is not None:
+                self.setValue(datasetName, "dataset", row, value)
+        self.columns["finished"][row] = True
+        return True
+
+    def runFailed(self, codeID):
+        return self.rows.pop(str(codeID), None) is not None
+
+    def setValue(self, columnName, kind, row, value):
+        value = np.asarray(value, dtype=np.float64)
+        if columnName not in self.columns:
+            self.addColumn(columnName, kind, value.shape)
+        elif self.columnKinds[columnName] != kind:
+            raise ValueError(f"{columnName} is a {kind} and a {self.columnKinds[columnName]}")
+        column = self.columns[columnName]
+        if column.shape[1:] != value.shape:
+            raise ValueError(f"{columnName} has the shape {value.shape}, but the first value had {column.shape[1:]}")
+        column[row] = value
+
+    def addColumn(self, columnName, kind, shape, dtype=np.float64, fill=np.nan):
+        path = os.path.join(self.folder, getFileName(columnName, kind))
+        column = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(self.rowCount,) + shape)
+        column[:] = fill
+        self.columns[columnName] = column
+        self.columnKinds[columnName] = kind
+        self.writeInfo()
+
+    def writeInfo(self):
+        data = {
+            **self.info,
+            "rowCount": self.rowCount,
+            "columns": {columnName: {"kind": kind, "file": getFileName(columnName, kind)} for columnName, kind in self.columnKinds.items()},
+        }
+        with open(os.path.join(self.folder, TABLE_FILE), "w") as file:
+            json.dump(data, file, indent=4)
+
+    def stopQueueing(self):
+        """No more runs are added, e.g. because the multirun was cancelled."""
+        self.queueing = False
+
+    def isComplete(self):
+        """True if no more runs are added and all runs got their results or failed."""
+        return (not self.queueing or self.nextRow >= self.rowCount) and len(self.rows) == 0
+
+    def flush(self):
+        for column in self.columns.values():
+            column.flush()
+
+
+def getFileName(columnName, kind):
+    return kind + "_" + "".join(c if c.isalnum() or c in "-_." else "_" for c in columnName) + ".npy"
+
+
+def loadTable(folder):
+    """Returns the info of a table and its columns ({column name: read only memmap})."""
+    with open(os.path.join(folder, TABLE_FILE), "r") as file:
+        info = json.load(file)
+    columns = {columnName: np.load(os.path.join(folder, column["file"]), mmap_mode="r") for columnName, column in info["columns"].items()}
+    return info, columns
@@ -45,7 +45,7 @@ def updateTheme():
     Log.updateColors()
 
 
-def loadMissingDefaults():  # default settings
+def loadMissingDefaults(save=True):  # default settings
     if "artiqMasterInWsl" not in data:
         data["artiqMasterInWsl"] = False
     if "darkmode" not in data:
@@ -54,6 +54,8 @@ def loadMissingDefaults():  # default settings
         data["changeCrate"] = False
     if "FastinoAfePwrOff" not in data:
         data["FastinoAfePwrOff"] = False
+    if "FastinoGroupedUpdates" not in data:
+        data["FastinoGroupedUpdates"] = False
     if "FastinoMaxSamplingRate" not in data:
         data["FastinoMaxSamplingRate"] = {
             "text": "2",
@@ -77,6 +79,22 @@ def loadMissingDefaults():  # default settings
         data["FastinoAmountOfStepsValue"] = 65
     if "relativeTimestamps" not in data:
         data["relativeTimestamps"] = False
+    if "parametricScans" not in data:
+        data["parametricScans"] = False
+    if "subsequenceMethods" not in data:
+        data["subsequenceMethods"] = False
+    if "sidecarFiles" not in data:
+        data["sidecarFiles"] = False
+    if "dmaSubsequences" not in data:
+        data["dmaSubsequences"] = False
+    if "samplerStreaming" not in data:
+        data["samplerStreaming"] = False
+    if "slackPrediction" not in data:
+        data["slackPrediction"] = False
+    if "knownDeviceState" not in data:
+        data["knownDeviceState"] = False
+    if "scanQueueDepth" not in data:
+        data["scanQueueDepth"] = 3
     if "errorSoundOn" not in data:
         data["errorSoundOn"] = True
     if "defaultCratesDir" not in data:
@@ -105,7 +123,8 @@ def loadMissingDefaults():  # default settings
                 }
             }
         }
-    saveSettings()
+    if save:
+        saveSettings()
 
 
 def saveSettings():
@@ -166,6 +185,10 @@ def getFastinoAfePwrOff():
     return data["FastinoAfePwrOff"]
 
 
+def getFastinoGroupedUpdates():
+    return data["FastinoGroupedUpdates"]
+
+
 def getFastinoMinTimeStep():
     return data["FastinoMinTimeStepValue"]
 
@@ -182,6 +205,38 @@ def getRelativeTimestampsEnabled():
     return data["relativeTimestamps"]
 
 
+def getParametricScansEnabled():
+    return data["parametricScans"]
+
+
+def getSubsequenceMethodsEnabled():
+    return data["subsequenceMethods"]
+
+
+def getSidecarFilesEnabled():
+    return data["sidecarFiles"]
+
+
+def getDmaSubsequencesEnabled():
+    return data["dmaSubsequences"]
+
+
+def getSamplerStreamingEnabled():
+    return data["samplerStreaming"]
+
+
+def getSlackPredictionEnabled():
+    return data["slackPrediction"]
+
+
+def getKnownDeviceStateEnabled():
+    return data["knownDeviceState"]
+
+
+def getScanQueueDepth():
+    return data["scanQueueDepth"]
+
+
 def getErrorSoundOn():
     return data["errorSoundOn"]
 
@@ -281,6 +336,10 @@ class Dialog(Design.DialogDesign):
         self.FastinoAfePwrOffCheckbox.setChecked(data["FastinoAfePwrOff"])
         self.FastinoAfePwrOffCheckbox.stateChanged.connect(self.FastinoAfePwrOffCheckboxChanged)
 
+        self.FastinoGroupedUpdatesCheckbox = QtW.QCheckBox("Fastino grouped updates (set_hold/update)")
+        self.FastinoGroupedUpdatesCheckbox.setChecked(data["FastinoGroupedUpdates"])
+        self.FastinoGroupedUpdatesCheckbox.stateChanged.connect(self.FastinoGroupedUpdatesCheckboxChanged)
+
         self.FastinoMaxSamplingRate = Input.UnitValueField(
             default=data["FastinoMaxSamplingRate"],
             allowedUnits=[
@@ -324,6 +383,7 @@ class Dialog(Design.DialogDesign):
 
         self.CardsTab = Design.VBox(
             Design.HBox(self.FastinoAfePwrOffCheckbox, Design.Spacer()),
+            Design.HBox(self.FastinoGroupedUpdatesCheckbox, Design.Spacer()),
             Design.HBox(
                 QtW.QLabel("Sampling rate/s"),
                 Design.Spacer(),
@@ -348,8 +408,45 @@ class Dialog(Design.DialogDesign):
         self.relativeTimestampsCheckbox.setChecked(data["relativeTimestamps"])
         self.relativeTimestampsCheckbox.stateChanged.connect(self.relativeTimestampsCheckboxChanged)
 
+        self.parametricScansCheckbox = QtW.QCheckBox("Parametric MultiRun Scans (one experiment file per scan)")
+        self.parametricScansCheckbox.setChecked(data["parametricScans"])
+        self.parametricScansCheckbox.stateChanged.connect(self.parametricScansCheckboxChanged)
+
+        self.subsequenceMethodsCheckbox = QtW.QCheckBox("Generate Reused Subsequences as Kernel Methods")
+        self.subsequenceMethodsCheckbox.setChecked(data["subsequenceMethods"])
+        self.subsequenceMethodsCheckbox.stateChanged.connect(self.subsequenceMethodsCheckboxChanged)
+
+        self.sidecarFilesCheckbox = QtW.QCheckBox("Write Bulk Data and Sequence JSON as Sidecar Files")
+        self.sidecarFilesCheckbox.setChecked(data["sidecarFiles"])
+        self.sidecarFilesCheckbox.stateChanged.connect(self.sidecarFilesCheckboxChanged)
+
+        self.dmaSubsequencesCheckbox = QtW.QCheckBox("Play Back Repeated Subsequences with Core DMA")
+        self.dmaSubsequencesCheckbox.setChecked(data["dmaSubsequences"])
+        self.dmaSubsequencesCheckbox.stateChanged.connect(self.dmaSubsequencesCheckboxChanged)
+
+        self.samplerStreamingCheckbox = QtW.QCheckBox("Stream Raw Sampler Data into .npy Files")
+        self.samplerStreamingCheckbox.setChecked(data["samplerStreaming"])
+        self.samplerStreamingCheckbox.stateChanged.connect(self.samplerStreamingCheckboxChanged)
+
+        self.slackPredictionCheckbox = QtW.QCheckBox("Warn about Predicted RTIO Underflows before Submitting")
+        self.slackPredictionCheckbox.setChecked(data["slackPrediction"])
+        self.slackPredictionCheckbox.stateChanged.connect(self.slackPredictionCheckboxChanged)
+
+        self.knownDeviceStateCheckbox = QtW.QCheckBox("Skip Init of Devices the Previous Run Initialized")
+        self.knownDeviceStateCheckbox.setChecked(data["knownDeviceState"])
+        self.knownDeviceStateCheckbox.stateChanged.connect(self.knownDeviceStateCheckboxChanged)
+        self.forceDeviceInitButton = Design.Button("Force Init")
+        self.forceDeviceInitButton.clicked.connect(self.forceDeviceInitButtonClicked)
+
         self.codeGenTab = Design.VBox(
             Design.HBox(self.relativeTimestampsCheckbox, Design.Spacer()),
+            Design.HBox(self.parametricScansCheckbox, Design.Spacer()),
+            Design.HBox(self.subsequenceMethodsCheckbox, Design.Spacer()),
+            Design.HBox(self.sidecarFilesCheckbox, Design.Spacer()),
+            Design.HBox(self.dmaSubsequencesCheckbox, Design.Spacer()),
+            Design.HBox(self.samplerStreamingCheckbox, Design.Spacer()),
+            Design.HBox(self.slackPredictionCheckbox, Design.Spacer()),
+            Design.HBox(self.knownDeviceStateCheckbox, Design.Spacer(), self.forceDeviceInitButton),
             Design.Spacer(),
             spacing=20,
             margins=(10, 10, 10, 10),
@@ -365,7 +462,7 @@ class Dialog(Design.DialogDesign):
 
         self.layout().addWidget(Design.VBox(1, self.tabWidget, self.okButton))
 
-        self.setFixedSize(500, 300)
+        self.setFixedSize(500, 460)
 
     def darkmodeChanged(self):
         self.gui.updateAppearance(self.darkmode.isChecked())
@@ -374,10 +471,48 @@ class Dialog(Design.DialogDesign):
         data["relativeTimestamps"] = self.relativeTimestampsCheckbox.isChecked()
         saveSettings()
 
+    def parametricScansCheckboxChanged(self):
+        data["parametricScans"] = self.parametricScansCheckbox.isChecked()
+        saveSettings()
+
+    def subsequenceMethodsCheckboxChanged(self):
+        data["subsequenceMethods"] = self.subsequenceMethodsCheckbox.isChecked()
+        saveSettings()
+
+    def sidecarFilesCheckboxChanged(self):
+        data["sidecarFiles"] = self.sidecarFilesCheckbox.isChecked()
+        saveSettings()
+
+    def dmaSubsequencesCheckboxChanged(self):
+        data["dmaSubsequences"] = self.dmaSubsequencesCheckbox.isChecked()
+        saveSettings()
+
+    def samplerStreamingCheckboxChanged(self):
+        data["samplerStreaming"] = self.samplerStreamingCheckbox.isChecked()
+        saveSettings()
+
+    def slackPredictionCheckboxChanged(self):
+        data["slackPrediction"] = self.slackPredictionCheckbox.isChecked()
+        saveSettings()
+
+    def knownDeviceStateCheckboxChanged(self):
+        data["knownDeviceState"] = self.knownDeviceStateCheckbox.isChecked()
+        saveSettings()
+
+    def forceDeviceInitButtonClicked(self):
+        # gui.compiler imports the settings
+        import gui.compiler
+
+        gui.compiler.forgetKnownDeviceState()
+
     def FastinoAfePwrOffCheckboxChanged(self):
         data["FastinoAfePwrOff"] = self.FastinoAfePwrOffCheckbox.isChecked()
         saveSettings()
 
+    def FastinoGroupedUpdatesCheckboxChanged(self):
+        data["FastinoGroupedUpdates"] = self.FastinoGroupedUpdatesCheckbox.isChecked()
+        saveSettings()
+
     def FastinoMaxSamplingRateChanged(self, getData):
         data["FastinoMaxSamplingRate"] = getData
         data["FastinoMinTimeStepValue"] = 1 / self.FastinoMaxSamplingRate.getValue()
@@ -0,0 +1,201 @@
+from collections.abc import Mapping
+
+import numpy as np
+
+import gui.crate as crate
+
+PORTSTATE = 0
+SUBSEQUENCE = 1
+TRIGGERWAIT = 2
+
+
+class Timeline:
+    """Compiled sequence, the result of compiler.compileSequence.
+
+    Start, duration, repeats and kind of the segments are stored in NumPy arrays. The port states
+    of all segments are stored in one flat table, ports and their modules are interned, so
+    segments only keep index ranges into it. Repeated subsequences keep a reference to the
+    timeline of the subsequence, which is shared by all places using the same subsequence.
+
+    Iterating (or indexing) a timeline gives read only segment views that look like the segment
+    dicts of the sequence json ("time", "duration", "ports", ...), so it can be passed to the
+    event_builder and serialized with toJson.
+    """
+
+    def __init__(self):
+        self.kinds = []
+        self.times = []
+        self.durations = []
+        self.singleDurations = []
+        self.repeats = []
+        self.names = []
+        self.children = []
+        self.inputTtls = []
+        self.rpcs = []
+        self.portStarts = [0]
+        self.portIds = []
+        self.portStates = []
+        self.portNames = []
+        self.portIndex = {}
+        self.modules = []
+        self.moduleIndex = {}
+        self.portModules = []
+        self.finished = False
+
+    def addPortState(self, time, duration, ports, rpcs):
+        self.addSegment(PORTSTATE, time, duration, duration, 1)
+        self.rpcs.append(rpcs)
+        for portName, portState in ports.items():
+            self.portIds.append(self.internPort(portName))
+            self.portStates.append(portState)
+        self.portStarts.append(len(self.portIds))
+
+    def addSubsequence(self, name, time, singleDuration, repeats, timeline):
+        self.addSegment(SUBSEQUENCE, time, singleDuration * repeats, singleDuration, repeats)
+        self.names[-1] = name
+        self.children[-1] = timeline
+
+    def addTriggerWait(self, time, duration, inputTtl):
+        self.addSegment(TRIGGERWAIT, time, duration, duration, 1)
+        self.inputTtls[-1] = inputTtl
+
+    def addSegment(self, kind, time, duration, singleDuration, repeats):
+        assert not self.finished, "timeline is already finished"
+        self.kinds.append(kind)
+        self.times.append(time)
+        self.durations.append(duration)
+        self.singleDurations.append(singleDuration)
+        self.repeats.append(repeats)
+        self.names.append(None)
+        self.children.append(None)
+        self.inputTtls.append(None)
+        if kind != PORTSTATE:
+            self.rpcs.append(None)
+            self.portStarts.append(len(self.portIds))
+
+    def internPort(self, portName):
+        if portName not in self.portIndex:
+            module = crate.labsetup[portName]["module"]
+            if module not in self.moduleIndex:
+                self.moduleIndex[module] = len(self.modules)
+                self.modules.append(module)
+            self.portIndex[portName] = len(self.portNames)
+            self.portNames.append(portName)
+            self.portModules.append(self.moduleIndex[module])
+        return self.portIndex[portName]
+
+    def finish(self):
+        """Converts the collected segments into arrays, nothing can be added afterwards."""
+        self.kinds = np.array(self.kinds, dtype=np.int8)
+        self.times = np.array(self.times, dtype=np.float64)
+        self.durations = np.array(self.durations, dtype=np.float64)
+        self.singleDurations = np.array(self.singleDurations, dtype=np.float64)
+        self.repeats = np.array(self.repeats, dtype=np.int64)
+        self.portStarts = np.array(self.portStarts, dtype=np.int64)
+        self.portIds = np.array(self.portIds, dtype=np.int32)
+        self.portModules = np.array(self.portModules, dtype=np.int16)
+        self.finished = True
+        return self
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return SegmentView(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield SegmentView(self, index)
+
+    def getDuration(self):
+        if len(self) == 0:
+            return 0.0
+        return float(self.times[-1] + self.durations[-1])
+
+    def getPorts(self, index):
+        start, end = self.portStarts[index], self.portStarts[index + 1]
+        return {self.portNames[portId]: self.portStates[i] for i, portId in zip(range(start, end), self.portIds[start:end])}
+
+    def getModuleSegments(self, module):
+        """Returns the indices of the segments with a port of the given module."""
+        if module not in self.moduleIndex:
+            return np.zeros(0, dtype=np.int64)
+        entries = np.flatnonzero(self.portModules[self.portIds] == self.moduleIndex[module])
+        return np.unique(np.searchsorted(self.portStarts, entries, side="right") - 1)
+
+    def usesModule(self, module):
+        """Whether this timeline or one of its subsequences has a port of the given module."""
+        if len(self.getModuleSegments(module)) > 0:
+            return True
+        return any(self.children[index].usesModule(module) for index in np.flatnonzero(self.kinds == SUBSEQUENCE))
+
+    def hasTriggerWait(self):
+        if np.any(self.kinds == TRIGGERWAIT):
+            return True
+        return any(self.children[index].hasTriggerWait() for index in np.flatnonzero(self.kinds == SUBSEQUENCE))
+
+    def hasRpcs(self):
+        if any(len(rpcs) > 0 for rpcs in self.rpcs if rpcs is not None):
+            return True
+        return any(self.children[index].hasRpcs() for index in np.flatnonzero(self.kinds == SUBSEQUENCE))
+
+    def toJson(self):
+        """Returns the timeline as nested list of segment dicts, like the sequence json was before."""
+        return [segment.toJson() for segment in self]
+
+
+class SegmentView(Mapping):
+    """One segment of a timeline, with the keys of the segment dicts of the sequence json."""
+
+    KEYS = {
+        PORTSTATE: ("time", "duration", "single_duration", "ports", "rpcs"),
+        SUBSEQUENCE: ("name", "time", "single_duration", "duration", "repeats", "subsequence"),
+        TRIGGERWAIT: ("time", "duration", "single_duration", "input_ttl"),
+    }
+
+    def __init__(self, timeline, index):
+        self.timeline = timeline
+        self.index = index
+        self.kind = int(timeline.kinds[index])
+
+    def __getitem__(self, key):
+        if key not in SegmentView.KEYS[self.kind]:
+            raise KeyError(key)
+        timeline = self.timeline
+        index = self.index
+        if key == "time":
+            return float(timeline.times[index])
+        if key == "duration":
+            return float(timeline.durations[index])
+        if key == "single_duration":
+            return float(timeline.singleDurations[index])
+        if key == "repeats":
+            return int(timeline.repeats[index])
+        if key == "name":
+            return timeline.names[index]
+        if key == "subsequence":
+            return timeline.children[index]
+        if key == "input_ttl":
+            return timeline.inputTtls[index]
+        if key == "rpcs":
+            return timeline.rpcs[index]
+        return timeline.getPorts(index)
+
+    def __iter__(self):
+        return iter(SegmentView.KEYS[self.kind])
+
+    def __len__(self):
+        return len(SegmentView.KEYS[self.kind])
+
+    def __contains__(self, key):
+        return key in SegmentView.KEYS[self.kind]
+
+    def toJson(self):
+        data = dict(self)
+        if self.kind == SUBSEQUENCE:
+            data["subsequence"] = data["subsequence"].toJson()
+        return data
@@ -0,0 +1,61 @@
+"""The variables sequences are compiled with, and the alias index of them.
+
+These are the variables of the crate, or while a MultiRun point is compiled, a copy of them with
+the values of the point. Nothing here needs Qt, so the headless compiler uses it directly.
+"""
+
+import copy
+
+import gui.crate as crate
+import gui.expressions as expressions
+
+# the variables of the MultiRun point being compiled, None while compiling with the crate variables
+currentlyRunningVariables = None
+
+indices = {}  # id of variables dict -> (variables dict, index)
+
+
+def getVariables():
+    return crate.variables if currentlyRunningVariables is None else currentlyRunningVariables
+
+
+def setPoint(point=None):
+    """Compiles with the values of a MultiRun point ({variableName: value text}), None for the crate variables."""
+    global currentlyRunningVariables
+    if point is None or len(point) == 0:
+        currentlyRunningVariables = None
+    else:
+        variables = copy.deepcopy(crate.variables)
+        for variableName, value in point.items():
+            if variableName not in variables or variables[variableName]["isDir"]:
+                raise Exception(f"Unknown variable {variableName}")
+            variables[variableName]["value"] = str(value)
+        currentlyRunningVariables = variables
+    variablesChanged()
+
+
+def getIndex(variables=None):
+    if variables is None:
+        variables = getVariables()
+    if id(variables) not in indices or indices[id(variables)][0] is not variables:
+        indices[id(variables)] = (variables, expressions.VariableIndex(variables))
+    return indices[id(variables)][1]
+
+
+def replacer(text):
+    return getIndex().replace(text)
+
+
+def variablesChanged():
+    indices.clear()
+
+
+def evaluate(text):
+    index = getIndex()
+    if index.canEvaluate(text):
+        try:
+            return expressions.evaluate(text, index)
+        except Exception:
+            pass
+    # fall back to textual substitution, also to report errors the same way
+    return expressions.evaluate(index.replace(text))
@@ -2,6 +2,7 @@ import PySide6.QtCore as QtC
 import PySide6.QtGui as QtG
 import PySide6.QtWidgets as QtW
 
+import gui.expressions as expressions
 import gui.widgets.Datalist as Datalist
 import gui.widgets.Dataset as Dataset
 import gui.widgets.Design as Design
@@ -313,7 +314,21 @@ class UnitValueField(RedOutlineWidget, Design.Frame):
         return self.lineEdit.text() + " " + self.cycler.text()
 
 
-def getValueFromState(state, reader=eval, replacer=None):
+# field expressions see the names of this module, like the eval() called from here before expressions were compiled
+expressions.GLOBALS = globals()
+
+expressionEvaluators = {}  # replacer -> function evaluating an expression against the replacers variables
+
+
+def evaluateExpression(text, replacer=None):
+    if replacer is None:
+        return expressions.evaluate(text)
+    if replacer in expressionEvaluators:
+        return expressionEvaluators[replacer](text)
+    return expressions.evaluate(replacer(text))
+
+
+def getValueFromState(state, reader=eval, replacer=None, converter=None):
     if state is None:
         return None
     try:
@@ -321,9 +336,14 @@ def getValueFromState(state, reader=eval, replacer=None):
             text = state["text"]
         else:
             text = state
-        if replacer is not None:
-            text = replacer(text)
-        value = reader(text)
+        if reader is eval:
+            value = evaluateExpression(text, replacer)
+        else:
+            if replacer is not None:
+                text = replacer(text)
+            value = reader(text)
+        if converter is not None:
+            value = converter(value)
         if type(state) is dict and "unit" in state and state["unit"] is not None:
             value *= state["unit"]["factor"]
         return value
@@ -1,8 +1,11 @@
+import asyncio
+import collections
 import copy
-import time
 import os
+import queue
+import time
+from datetime import datetime
 
-import numpy as np
 import PySide6.QtCore as QtC
 import PySide6.QtWidgets as QtW
 import PySide6.QtGui as QtG
@@ -12,14 +15,26 @@ import threading
 import gui.artiq_master_manager as artiq_master_manager
 import gui.compiler
 import gui.crate as crate
+import gui.differential_evolution as differential_evolution
+import gui.headless_compiler as headless_compiler
+import gui.scan_plan as scan_plan
+import gui.scan_results as scan_results
+import gui.settings as settings
+import gui.variable_index as variable_index
 import gui.widgets.Design as Design
 import gui.widgets.Dock as Dock
 import gui.widgets.Input as Input
+import gui.widgets.Playlist as Playlist
 import gui.widgets.RPC as RPC
 import gui.widgets.SequenceEditor as SequenceEditor
 import gui.widgets.Viewer as Viewer
+from gui.widgets.Log import log
 
-currentlyRunningVariables = None
+runningOptimization = None
+# the tasks of the event loop are only weakly referenced
+runningFeeders = set()
+# tables of multiruns which still wait for results
+resultTables = []
 
 dock = None
 title = "🔁 Multi Run"
@@ -71,8 +86,116 @@ class Widget(Design.VBox):
             default=crate.MultiRun.getValue(self.name, "mode"),
             changedCallback=lambda mode: crate.MultiRun.ValueChange(self.name, "mode", mode),
         )
-        
-        
+        self.samplesField = Input.TextField(
+            default=crate.MultiRun.getValue(self.name, "samples"),
+            reader=int,
+            changedCallback=lambda value: crate.MultiRun.ValueChange(self.name, "samples", value),
+            dontUpdateMetrics=True,
+        )
+        self.samplesField.setFixedWidth(60)
+        self.seedField = Input.TextField(
+            default=crate.MultiRun.getValue(self.name, "seed"),
+            changedCallback=lambda value: crate.MultiRun.ValueChange(self.name, "seed", value),
+            dontUpdateMetrics=True,
+        )
+        self.seedLabel = QtW.QLabel("seed")
+        self.seedField.setToolTip("Seed of the random values, a new one is used for every run if empty")
+        self.seedField.setFixedWidth(120)
+        self.populationSizeField = Input.TextField(
+            default=crate.MultiRun.getValue(self.name, "populationSize"),
+            reader=int,
+            changedCallback=lambda value: crate.MultiRun.ValueChange(self.name, "populationSize", value),
+            dontUpdateMetrics=True,
+        )
+        self.populationSizeField.setFixedWidth(40)
+        self.generationsField = Input.TextField(
+            default=crate.MultiRun.getValue(self.name, "generations"),
+            reader=int,
+            changedCallback=lambda value: crate.MultiRun.ValueChange(self.name, "generations", value),
+            dontUpdateMetrics=True,
+        )
+        self.generationsField.setFixedWidth(40)
+        self.goalComboBox = Input.ComboBox(
+            itemsGenerateFunction=lambda: ["minimize", "maximize"],
+            default=crate.MultiRun.getValue(self.name, "goal"),
+            changedCallback=lambda goal: crate.MultiRun.ValueChange(self.name, "goal", goal),
+        )
+        self.costDatasetField = Input.TextField(
+            default=crate.MultiRun.getValue(self.name, "costDataset"),
+            changedCallback=lambda value: crate.MultiRun.ValueChange(self.name, "costDataset", value),
+            dontUpdateMetrics=True,
+            alignment=QtC.Qt.AlignmentFlag.AlignLeft,
+        )
+        self.costDatasetField.setToolTip("Dataset with the scalar result of a run, read after its analyze stage")
+        self.orderingComboBox = Input.ComboBox(
+            itemsGenerateFunction=lambda: scan_plan.ORDERINGS,
+            default=crate.MultiRun.getValue(self.name, "ordering"),
+            changedCallback=lambda ordering: crate.MultiRun.ValueChange(self.name, "ordering", ordering),
+        )
+        self.repeatsField = Input.TextField(
+            default=crate.MultiRun.getValue(self.name, "repeats"),
+            reader=int,
+            changedCallback=lambda value: crate.MultiRun.ValueChange(self.name, "repeats", value),
+            dontUpdateMetrics=True,
+        )
+        self.repeatsField.setFixedWidth(40)
+        self.repeatModeComboBox = Input.ComboBox(
+            itemsGenerateFunction=lambda: scan_plan.REPEAT_MODES,
+            default=crate.MultiRun.getValue(self.name, "repeatMode"),
+            changedCallback=lambda repeatMode: crate.MultiRun.ValueChange(self.name, "repeatMode", repeatMode),
+        )
+        self.resultDatasetsField = Input.TextField(
+            default=crate.MultiRun.getValue(self.name, "resultDatasets"),
+            changedCallback=lambda value: crate.MultiRun.ValueChange(self.name, "resultDatasets", value),
+            dontUpdateMetrics=True,
+            alignment=QtC.Qt.AlignmentFlag.AlignLeft,
+        )
+        self.resultDatasetsField.setToolTip("Comma separated datasets collected from every run into a table of the multirun, read after its analyze stage")
+        self.comboBoxes = {
+            "goal": self.goalComboBox,
+            "ordering": self.orderingComboBox,
+            "repeatMode": self.repeatModeComboBox,
+        }
+        self.valueFields = {
+            "repeats": self.repeatsField,
+            "samples": self.samplesField,
+            "seed": self.seedField,
+            "populationSize": self.populationSizeField,
+            "generations": self.generationsField,
+            "costDataset": self.costDatasetField,
+            "resultDatasets": self.resultDatasetsField,
+        }
+        self.samplesSettings = Design.HBox(
+            QtW.QLabel("samples"),
+            self.samplesField,
+        )
+        self.optimizationSettings = Design.HBox(
+            QtW.QLabel("population"),
+            self.populationSizeField,
+            QtW.QLabel("generations"),
+            self.generationsField,
+        )
+        self.scanSettings = Design.HBox(
+            QtW.QLabel("order"),
+            self.orderingComboBox,
+            QtW.QLabel("repeats"),
+            self.repeatsField,
+            self.repeatModeComboBox,
+        )
+        self.randomSettings = Design.HBox(
+            self.scanSettings,
+            self.samplesSettings,
+            self.optimizationSettings,
+            self.seedLabel,
+            self.seedField,
+            Design.Spacer(),
+        )
+        self.costSettings = Design.HBox(
+            self.goalComboBox,
+            self.costDatasetField,
+        )
+        self.updateModeSettings(crate.MultiRun.getValue(self.name, "mode"))
+
         self.addDimensionButton = Design.AlignedButton("Add Dimension")
         self.addDimensionButton.setFlat(True)
         self.addDimensionButton.clicked.connect(lambda: crate.MultiRun.DimensionAdd(self.name))
@@ -83,6 +206,12 @@ class Widget(Design.VBox):
                 Design.Spacer(),
                 Viewer.InfoButton(crate.multiruns[self.name]),
             ),
+            self.randomSettings,
+            self.costSettings,
+            Design.HBox(
+                QtW.QLabel("results"),
+                self.resultDatasetsField,
+            ),
             self.dimensionWidgetsLayout,
             self.addDimensionButton,
             Design.Spacer(),
@@ -95,7 +224,22 @@ class Widget(Design.VBox):
             for dimensionWidget in self.dimensionWidgets.values():
                 dimensionWidget.stepsField.setVisible(stepsEnabled)
                 dimensionWidget.stepsLabel.setVisible(stepsEnabled)
+            self.updateModeSettings(value)
+        elif valueName in self.comboBoxes:
+            self.comboBoxes[valueName].setCurrentText(value)
+            if valueName == "ordering":
+                self.updateModeSettings(crate.MultiRun.getValue(self.name, "mode"))
+        elif valueName in self.valueFields:
+            self.valueFields[valueName].set(value)
 
+    def updateModeSettings(self, mode):
+        seedVisible = crate.MultiRun.usesSeed(self.name)
+        self.seedLabel.setVisible(seedVisible)
+        self.seedField.setVisible(seedVisible)
+        self.scanSettings.setVisible(mode == "scan")
+        self.samplesSettings.setVisible(mode == "monte carlo")
+        self.optimizationSettings.setVisible(mode == "differential evolution")
+        self.costSettings.setVisible(mode == "differential evolution")
 
     def addDimensionWidget(self, dimension):
         self.dimensionWidgets[dimension] = Dimension(dimension, self.name)
@@ -111,14 +255,17 @@ class Widget(Design.VBox):
         if artiq_master_manager.test_mode:
             Design.errorDialog("Error", "Test device_db is active. Cannot run on Hardware.")
             return
-        if crate.MultiRun.getValue(self.name, "mode") == "scan":
+        mode = crate.MultiRun.getValue(self.name, "mode")
+        if mode == "scan":
             self.scanRun()
+        elif mode == "monte carlo":
+            self.monteCarloRun()
+        elif mode == "differential evolution":
+            self.optimizationRun()
         else:
             Design.errorDialog("Error", "Not implemented.")
 
-    
-    
-    def scanRun(self):
+    def selectSequence(self):
         sequence = Design.comboBoxDialog(
             "Sequence",
             "Select a sequence to multirun",
@@ -126,6 +273,12 @@ class Widget(Design.VBox):
             defaultOption=SequenceEditor.dock.list.currentSelection,
         )
         if sequence is None or sequence == "":
+            return None
+        return sequence
+
+    def scanRun(self):
+        sequence = self.selectSequence()
+        if sequence is None:
             return
         if not self.checkScanValidity():
             return
@@ -134,6 +287,52 @@ class Widget(Design.VBox):
             f'MultiRun sequence "{sequence}"? This will include {self.getRunCount()} runs.',
         ):
             return
+        seed = None
+        if crate.MultiRun.usesSeed(self.name):
+            seed = crate.MultiRun.getMonteCarloSeed(self.name)
+            log(f"Random scan multirun {self.name} of sequence {sequence} with seed {seed}")
+            crate.FileManager.saveMultiRunRecord(self.name, sequence, seed)
+        self.runPoints(sequence, crate.MultiRun.getScanPoints(self.name, seed))
+
+    def monteCarloRun(self):
+        sequence = self.selectSequence()
+        if sequence is None:
+            return
+        if not self.checkMonteCarloValidity():
+            return
+        seed = crate.MultiRun.getMonteCarloSeed(self.name)
+        if not Design.confirmationDialog(
+            "Monte Carlo",
+            f'MultiRun sequence "{sequence}"? This will include {self.getRunCount()} runs with seed {seed}.',
+        ):
+            return
+        log(f"Monte Carlo multirun {self.name} of sequence {sequence} with seed {seed}")
+        crate.FileManager.saveMultiRunRecord(self.name, sequence, seed)
+        # the points are drawn in batches while they are queued
+        self.runPoints(sequence, crate.MultiRun.getMonteCarloPoints(self.name, seed))
+
+    def optimizationRun(self):
+        global runningOptimization
+        if runningOptimization is not None:
+            Design.errorDialog("Error", f'Multirun "{runningOptimization.multirunName}" is still optimizing.')
+            return
+        sequence = self.selectSequence()
+        if sequence is None:
+            return
+        if not self.checkOptimizationValidity():
+            return
+        seed = crate.MultiRun.getMonteCarloSeed(self.name)
+        if not Design.confirmationDialog(
+            "Differential Evolution",
+            f'Optimize sequence "{sequence}"? This will include {self.getRunCount()} runs with seed {seed}.',
+        ):
+            return
+        log(f"Differential evolution multirun {self.name} of sequence {sequence} with seed {seed}")
+        crate.FileManager.saveMultiRunRecord(self.name, sequence, seed)
+        runningOptimization = Optimization(self.name, sequence, seed)
+        runningOptimization.start()
+
+    def runPoints(self, sequence, points):
         pre_compile_rpc = crate.Sequences.getSequenceValue(sequence, "pre_compile_rpc")
         wait_for_pre_compile_rpc_finish = False
         if pre_compile_rpc is not None:
@@ -142,64 +341,20 @@ class Widget(Design.VBox):
                     "Pre-Compile RPC",
                     f'Pre-Compile RPC "{pre_compile_rpc}" is not in normal mode, means they will all run in parallel. Wait for each RPC completion before compiling next?',
                 )
-        linespaces = []
-        steps = []
-        for dimData in crate.MultiRun.getValue(self.name, "dimensions").values():
-            steps_ = int(dimData["steps"])
-            linespaces.append(
-                {
-                    variableName: (
-                        np.linspace(
-                            float(variableData["min"]),
-                            float(variableData["max"]),
-                            steps_,
-                        )
-                        if variableData["mode"] == "linear"
-                        else variableData["datalist"]
-                    )
-                    for variableName, variableData in dimData["variables"].items()
-                }
-            )
-            steps.append(steps_)
-        global currentlyRunningVariables
-        currentlyRunningVariables = copy.deepcopy(crate.variables)
-        progressDialog = Design.ProgressDialog("Scan", "Queueing runs...")
-        cancelQueueing = False
-
-        def setCancelQueueing():
-            nonlocal cancelQueueing
-            cancelQueueing = True
-
-        progressDialog.onClose = setCancelQueueing
-        progressDialog.show()
-        runCount = self.getRunCount()
-        i = 0
-        while i < runCount:
-            if cancelQueueing:
-                Design.infoDialog(
-                    "Linear Scan",
-                    f"Queueing cancelled. {i} out of {runCount} runs queued.",
-                )
-                break
-            for j, dimData in enumerate(list(crate.MultiRun.getValue(self.name, "dimensions").values())):
-                divisor = 1
-                for k in range(
-                    j + 1,
-                    len(list(crate.MultiRun.getValue(self.name, "dimensions").values())),
-                ):
-                    divisor *= steps[k]
-                for variableName in dimData["variables"].keys():
-                    value = linespaces[j][variableName][(i // divisor) % steps[j]]
-                    currentlyRunningVariables[variableName]["value"] = str(value)
-            if wait_for_pre_compile_rpc_finish and RPC.isRPCActive(pre_compile_rpc):
-                time.sleep(0.1)
-            else:
-                gui.compiler.compileAndRun(sequence)
-                progressDialog.setProgress((i + 1) / runCount)
-                i += 1
-            QtC.QCoreApplication.processEvents()
-        progressDialog.close()
-        currentlyRunningVariables = None
+        resultDatasets = crate.MultiRun.getResultDatasets(self.name)
+        resultTable = None
+        if len(resultDatasets) > 0:
+            resultTable = createResultTable(self.name, sequence, self.getRunCount(), resultDatasets)
+        feeder = ScanFeeder(
+            sequence,
+            points,
+            self.getRunCount(),
+            pre_compile_rpc,
+            wait_for_pre_compile_rpc_finish,
+            resultTable=resultTable,
+            resultDatasets=resultDatasets if len(resultDatasets) > 0 else None,
+        )
+        feeder.start()
 
     def checkScanValidity(self):
         for dimName, dimData in crate.MultiRun.getValue(self.name, "dimensions").items():
@@ -211,13 +366,538 @@ class Widget(Design.VBox):
                             f"Dimension \"{dimName}\" has {dimData['steps']} steps, but data list for variable \"{variableName}\" has {len(variableData['datalist'])} values.",
                         )
                         return False
+            for variableName, variableData in dimData["variables"].items():
+                if variableData["mode"] not in ("linear", "log", "data list"):
+                    Design.errorDialog(
+                        "Error",
+                        f"Variable \"{variableName}\" is drawn from a {variableData['mode']} distribution, which is only possible in monte carlo mode.",
+                    )
+                    return False
+                if variableData["mode"] == "log" and (float(variableData["min"]) <= 0 or float(variableData["max"]) <= 0):
+                    Design.errorDialog("Error", f"Variable \"{variableName}\" is log spaced, but its range is not positive.")
+                    return False
+        try:
+            crate.MultiRun.getScanPlan(self.name)
+            if crate.MultiRun.usesSeed(self.name) and crate.MultiRun.getMonteCarloSeed(self.name) < 0:
+                raise ValueError("seed has to be non-negative")
+        except ValueError as e:
+            Design.errorDialog("Error", f"Invalid scan: {e}")
+            return False
         return True
 
-    def getRunCount(self):
-        runCount = 1
+    def checkMonteCarloValidity(self):
+        try:
+            if self.getRunCount() < 1:
+                raise ValueError("samples has to be positive")
+            if crate.MultiRun.getMonteCarloSeed(self.name) < 0:
+                raise ValueError("seed has to be non-negative")
+        except ValueError as e:
+            Design.errorDialog("Error", f"Invalid samples or seed: {e}")
+            return False
+        for dimName, dimData in crate.MultiRun.getValue(self.name, "dimensions").items():
+            datalistLengths = set()
+            for variableName, variableData in dimData["variables"].items():
+                if variableData["mode"] == "data list":
+                    datalistLengths.add(len(variableData["datalist"]))
+                elif variableData["mode"] in ("log", "log uniform") and (float(variableData["min"]) <= 0 or float(variableData["max"]) <= 0):
+                    Design.errorDialog("Error", f"Variable \"{variableName}\" is log uniform, but its range is not positive.")
+                    return False
+            # data lists of a dimension are resampled together
+            if len(datalistLengths) > 1 or 0 in datalistLengths:
+                Design.errorDialog(
+                    "Error",
+                    f"The data lists of dimension \"{dimName}\" have to be of the same, non-zero length to be resampled together.",
+                )
+                return False
+        return True
+
+    def checkOptimizationValidity(self):
+        try:
+            if int(crate.MultiRun.getValue(self.name, "populationSize")) < differential_evolution.MIN_POPULATION_SIZE:
+                raise ValueError(f"the population needs at least {differential_evolution.MIN_POPULATION_SIZE} members")
+            if int(crate.MultiRun.getValue(self.name, "generations")) < 0:
+                raise ValueError("generations can not be negative")
+            if crate.MultiRun.getMonteCarloSeed(self.name) < 0:
+                raise ValueError("seed has to be non-negative")
+        except ValueError as e:
+            Design.errorDialog("Error", f"Invalid population, generations or seed: {e}")
+            return False
+        if crate.MultiRun.getValue(self.name, "costDataset").strip() == "":
+            Design.errorDialog("Error", "No dataset to read the cost of a run from.")
+            return False
+        variableCount = 0
         for dimData in crate.MultiRun.getValue(self.name, "dimensions").values():
-            runCount *= int(dimData["steps"])
-        return runCount
+            for variableName, variableData in dimData["variables"].items():
+                if variableData["mode"] != "linear":
+                    Design.errorDialog("Error", f"Variable \"{variableName}\" has to be linear, its min and max are the bounds of the optimization.")
+                    return False
+                variableCount += 1
+        if variableCount == 0:
+            Design.errorDialog("Error", "No variables to optimize.")
+            return False
+        return True
+
+    def getRunCount(self):
+        return crate.MultiRun.getRunCount(self.name)
+
+
+class ScanFeeder:
+    """Queues the runs of a multirun while keeping only a few of them queued ahead at the scheduler.
+
+    Runs are topped up on the event loop whenever the schedule of the master shows that queued ones
+    started, so pausing, reprioritizing or cancelling the scan takes effect after these few runs.
+    Points are compiled in worker processes if possible, otherwise one after another before they are queued.
+    """
+
+    # runs which do not show up in the schedule within this time are not waited for
+    SUBMISSION_TIMEOUT = 10
+    # seconds between checks of the schedule if it does not change
+    POLL_INTERVAL = 1
+
+    def __init__(self, sequence, points, runCount, preCompileRpc=None, waitForPreCompileRpc=False, resultTable=None, resultDatasets=None):
+        self.sequence = sequence
+        self.points = points
+        self.runCount = runCount
+        self.preCompileRpc = preCompileRpc
+        self.waitForPreCompileRpc = waitForPreCompileRpc
+        self.resultTable = resultTable
+        self.resultDatasets = resultDatasets
+        self.depth = settings.getScanQueueDepth()
+        self.priority = 0
+        self.paused = False
+        self.finished = False
+        self.submitted = 0
+        self.queued = {}  # codeID -> [submission time, seen in the schedule] of runs which did not start yet
+        # duration and predicted underflows are confirmed for the first run of the scan only
+        self.confirmation = gui.compiler.RunConfirmation()
+        self.batch = None
+        self.scheduleChanged = asyncio.Event()
+        self.dialog = ScanFeederDialog(self)
+        self.task = None
+
+    def start(self):
+        self.dialog.show()
+        artiq_master_manager.scheduleCallbacks.append(self.scheduleChanged.set)
+        self.task = asyncio.ensure_future(self.run())
+        runningFeeders.add(self)
+
+    async def run(self):
+        try:
+            if self.preCompileRpc is None and self.runCount > 1 and gui.compiler.canCompileInProcessPool():
+                await self.feedCompiledResults()
+            else:
+                await self.feedPoints()
+        except Exception as e:
+            log(e)
+        finally:
+            if self.batch is not None:
+                self.batch.cancel()
+            artiq_master_manager.scheduleCallbacks.remove(self.scheduleChanged.set)
+            runningFeeders.discard(self)
+            if self.resultTable is not None:
+                self.resultTable.stopQueueing()
+                checkResultTable(self.resultTable)
+            if not self.finished:
+                self.finished = True
+                self.dialog.close()
+
+    async def feedPoints(self):
+        for point in self.points:
+            if not await self.waitForQueueSpace():
+                return
+            while self.waitForPreCompileRpc and not self.finished and RPC.isRPCActive(self.preCompileRpc):
+                await asyncio.sleep(0.1)
+            if self.finished:
+                return
+            # only set while compiling, runs started in between use the variables of the crate
+            variable_index.setPoint(point)
+            try:
+                codeID = gui.compiler.compileAndRun(
+                    self.sequence, scanVariables=point, resultDatasets=self.resultDatasets, priority=self.priority, confirmation=self.confirmation
+                )
+            finally:
+                variable_index.setPoint(None)
+            if self.confirmation.isDeclined():
+                return
+            self.runSubmitted(codeID, point)
+
+    async def feedCompiledResults(self):
+        self.batch = headless_compiler.BatchCompilation(
+            ((self.sequence, point) for point in self.points),
+            parametric=settings.getParametricScansEnabled(),
+            taskCount=self.runCount,
+            # compiled runs only wait until there is space in the queue
+            bufferSize=self.depth,
+        )
+        while True:
+            if not await self.waitForQueueSpace():
+                return
+            results = []
+            while len(results) == 0:
+                results = self.batch.getResults(1)
+                if len(results) == 0:
+                    await asyncio.sleep(0.05)
+                if self.finished:
+                    return
+            result = results[0]
+            if result is None:
+                return
+            if "error" in result:
+                log(f"Error when compiling sequence {self.sequence} with {result['variables']}: {result['error']}")
+                self.runSubmitted(None, result["variables"])
+                continue
+            if not self.confirmation.confirmDuration(result["duration"]) or not self.confirmation.confirmSlack(self.sequence, result["slackWarnings"]):
+                return
+            submitCompiledResult(self.sequence, result, self.resultDatasets, self.priority)
+            self.runSubmitted(result["codeID"], result["variables"])
+
+    def runSubmitted(self, codeID, point):
+        if codeID is not None:
+            self.queued[str(codeID)] = [time.monotonic(), False]
+            if self.resultTable is not None:
+                self.resultTable.addRun(codeID, point)
+        self.submitted += 1
+        self.dialog.setProgress(self.submitted / self.runCount)
+
+    async def waitForQueueSpace(self):
+        """Waits until less than depth runs of this scan are queued, returns False if the scan was cancelled."""
+        while not self.finished and (self.paused or self.getQueuedCount() >= self.depth):
+            self.scheduleChanged.clear()
+            try:
+                await asyncio.wait_for(self.scheduleChanged.wait(), self.POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+        return not self.finished
+
+    def getQueuedCount(self):
+        statuses = {}
+        for run in artiq_master_manager.schedule.values():
+            codeID = str(run.get("expid", {}).get("arguments", {}).get("codeID"))
+            if codeID in self.queued:
+                statuses[codeID] = run.get("status")
+        now = time.monotonic()
+        for codeID, submission in list(self.queued.items()):
+            status = statuses.get(codeID)
+            if status is not None:
+                submission[1] = True
+            if status in artiq_master_manager.QUEUED_STATUSES:
+                continue
+            # started, finished or lost
+            if status is not None or submission[1] or now - submission[0] > self.SUBMISSION_TIMEOUT:
+                del self.queued[codeID]
+        return len(self.queued)
+
+    def setPaused(self, paused):
+        self.paused = paused
+        self.scheduleChanged.set()
+
+    def setPriority(self, priority):
+        self.priority = priority
+
+    def setDepth(self, depth):
+        self.depth = max(1, depth)
+        self.scheduleChanged.set()
+
+    def cancel(self):
+        if not self.finished:
+            self.finished = True
+            self.scheduleChanged.set()
+            Design.infoDialog(
+                "Scan",
+                f"Queueing cancelled. {self.submitted} out of {self.runCount} runs queued.",
+            )
+
+
+def submitCompiledResult(sequence, result, resultDatasets=None, priority=0):
+    """Submits a run compiled by headless_compiler.BatchCompilation."""
+    variables = copy.deepcopy(crate.variables)
+    for variableName, value in result["variables"].items():
+        variables[variableName]["value"] = value
+    Playlist.sequenceCompiled(result["codeID"], sequence, variables)
+    if resultDatasets is not None:
+        result["arguments"]["resultDatasets"] = resultDatasets
+    gui.compiler.submitCompiledFile(sequence, result["codeID"], result["artiqMasterPath"], result["duration"], result["arguments"], priority=priority)
+
+
+class ScanFeederDialog(Design.ProgressDialog):
+    def __init__(self, feeder):
+        super(ScanFeederDialog, self).__init__("Scan", "Queueing runs...")
+        self.feeder = feeder
+        self.onClose = feeder.cancel
+        self.pauseButton = Design.Button("Pause")
+        self.pauseButton.clicked.connect(self.pauseButtonClicked)
+        self.priorityField = Input.TextField(
+            default=str(feeder.priority),
+            reader=int,
+            changedCallback=lambda value: feeder.setPriority(int(value)),
+            dontUpdateMetrics=True,
+        )
+        self.priorityField.setFixedWidth(40)
+        self.priorityField.setToolTip("Priority of the runs queued from now on")
+        self.depthField = Input.TextField(
+            default=str(feeder.depth),
+            reader=int,
+            changedCallback=self.depthChanged,
+            dontUpdateMetrics=True,
+        )
+        self.depthField.setFixedWidth(40)
+        self.depthField.setToolTip("Number of runs queued ahead at the scheduler")
+        self.frameLayout.addWidget(
+            Design.HBox(
+                self.pauseButton,
+                Design.Spacer(),
+                QtW.QLabel("priority"),
+                self.priorityField,
+                QtW.QLabel("queued"),
+                self.depthField,
+            )
+        )
+        self.setFixedHeight(140)
+
+    def pauseButtonClicked(self):
+        self.feeder.setPaused(not self.feeder.paused)
+        self.pauseButton.setText("Resume" if self.feeder.paused else "Pause")
+
+    def depthChanged(self, value):
+        self.feeder.setDepth(int(value))
+        settings.data["scanQueueDepth"] = self.feeder.depth
+        settings.saveSettings()
+
+
+def createResultTable(multirunName, sequence, rowCount, datasets):
+    """Creates the table the results of the runs of a multirun are collected in, None if that failed."""
+    folder = (
+        crate.FileManager.cratePath
+        + "generatedCode/"
+        + datetime.now().strftime("%Y-%m-%d")
+        + "/MultiRuns/"
+        + datetime.now().strftime("%Y%m%d_%H%M%S")
+        + "_"
+        + multirunName.replace("/", "_")
+    )
+    try:
+        table = scan_results.ScanResultTable(folder, rowCount, {"multirun": multirunName, "sequence": sequence, "datasets": datasets})
+    except OSError as e:
+        log(e)
+        log(f"Error: creating the result table of multirun {multirunName} failed")
+        return None
+    log(f"Results of multirun {multirunName} are collected in {folder}")
+    resultTables.append(table)
+    return table
+
+
+def checkResultTable(table):
+    if table.isComplete() and table in resultTables:
+        table.flush()
+        resultTables.remove(table)
+        log(f"Result table {table.folder} is complete")
+
+
+def runResults(codeID, results):
+    for table in list(resultTables):
+        try:
+            if table.addResults(codeID, results):
+                checkResultTable(table)
+        except (ValueError, OSError) as e:
+            log(f"Error when adding the results of run {codeID} to {table.folder}: {e}")
+    if runningOptimization is not None:
+        runningOptimization.runResults(str(codeID), results)
+
+
+def runFailed(codeID):
+    for table in list(resultTables):
+        if table.runFailed(codeID):
+            checkResultTable(table)
+    if runningOptimization is not None:
+        runningOptimization.runFailed(str(codeID))
+
+
+class Optimization:
+    """Optimizes the linear variables of a multirun between their min and max with gui.differential_evolution.
+
+    A run is submitted for every candidate, the cost is the value of the cost dataset the generated
+    experiment sends back after its analyze stage. The next candidate is compiled and submitted as soon
+    as a result arrives, while the scheduler works on the other queued candidates.
+    Candidates are compiled in worker processes if possible, like the points of a ScanFeeder, and
+    submitted from a task of the event loop.
+    """
+
+    def __init__(self, multirunName, sequence, seed):
+        self.multirunName = multirunName
+        self.sequence = sequence
+        self.costDataset = crate.MultiRun.getValue(multirunName, "costDataset").strip()
+        self.sign = -1 if crate.MultiRun.getValue(multirunName, "goal") == "maximize" else 1
+        self.variableNames = []
+        lower = []
+        upper = []
+        for dimData in crate.MultiRun.getValue(multirunName, "dimensions").values():
+            for variableName, variableData in dimData["variables"].items():
+                self.variableNames.append(variableName)
+                lower.append(float(variableData["min"]))
+                upper.append(float(variableData["max"]))
+        self.evolution = differential_evolution.DifferentialEvolution(
+            lower,
+            upper,
+            int(crate.MultiRun.getValue(multirunName, "populationSize")),
+            int(crate.MultiRun.getValue(multirunName, "generations")),
+            seed,
+        )
+        self.resultDatasets = [self.costDataset] + [name for name in crate.MultiRun.getResultDatasets(multirunName) if name != self.costDataset]
+        # like scans, the results are only collected into a table if the multirun lists result datasets
+        self.resultTable = None
+        if len(crate.MultiRun.getResultDatasets(multirunName)) > 0:
+            self.resultTable = createResultTable(multirunName, sequence, self.evolution.evaluationBudget, self.resultDatasets)
+        self.pending = {}  # codeID -> (slot, vector)
+        self.confirmation = gui.compiler.RunConfirmation()
+        self.bestCost = None
+        self.finished = False
+        self.batch = None
+        self.candidates = None  # tasks of the batch compilation, None ends it
+        self.compiling = collections.deque()  # (slot, vector) of the candidates in the batch compilation, in task order
+        self.task = None
+        self.progressDialog = Design.ProgressDialog("Differential Evolution", "Optimizing...")
+        self.progressDialog.onClose = self.cancel
+        self.progressDialog.show()
+
+    def start(self):
+        if crate.Sequences.getSequenceValue(self.sequence, "pre_compile_rpc") is None and gui.compiler.canCompileInProcessPool():
+            self.task = asyncio.ensure_future(self.feedCompiledCandidates())
+        else:
+            self.submitCandidates()
+
+    def getPoint(self, vector):
+        return {variableName: str(value) for variableName, value in zip(self.variableNames, vector.tolist())}
+
+    def submitCandidates(self):
+        if self.candidates is not None:
+            self.queueCandidates()
+            return
+        while not self.finished:
+            candidate = self.evolution.ask()
+            if candidate is None:
+                break
+            slot, vector = candidate
+            point = self.getPoint(vector)
+            variable_index.setPoint(point)
+            try:
+                codeID = gui.compiler.compileAndRun(self.sequence, scanVariables=point, resultDatasets=self.resultDatasets, confirmation=self.confirmation)
+            finally:
+                variable_index.setPoint(None)
+            if codeID is None:
+                self.stop("Optimization stopped, a candidate was not submitted.")
+                return
+            self.candidateSubmitted(codeID, slot, vector)
+
+    def queueCandidates(self):
+        while not self.finished:
+            candidate = self.evolution.ask()
+            if candidate is None:
+                break
+            self.compiling.append(candidate)
+            self.candidates.put((self.sequence, self.getPoint(candidate[1])))
+
+    async def feedCompiledCandidates(self):
+        self.candidates = queue.Queue()
+        # the worker processes wait for the candidates, which are asked for whenever a result arrives
+        self.batch = headless_compiler.BatchCompilation(
+            iter(self.candidates.get, None),
+            parametric=settings.getParametricScansEnabled(),
+            taskCount=len(self.evolution.population),
+        )
+        try:
+            self.queueCandidates()
+            while not self.finished:
+                results = self.batch.getResults()
+                if len(results) == 0:
+                    await asyncio.sleep(0.05)
+                for result in results:
+                    if result is None or self.finished:
+                        return
+                    slot, vector = self.compiling.popleft()
+                    if "error" in result:
+                        log(f"Error when compiling sequence {self.sequence} with {result['variables']}: {result['error']}")
+                        self.stop("Optimization stopped, a candidate was not submitted.")
+                        return
+                    if not self.confirmation.confirmDuration(result["duration"]) or not self.confirmation.confirmSlack(self.sequence, result["slackWarnings"]):
+                        self.stop("Optimization stopped, a candidate was not submitted.")
+                        return
+                    submitCompiledResult(self.sequence, result, self.resultDatasets)
+                    self.candidateSubmitted(result["codeID"], slot, vector)
+        except Exception as e:
+            log(e)
+            self.stop("Optimization stopped, compiling the candidates failed.")
+
+    def candidateSubmitted(self, codeID, slot, vector):
+        self.pending[str(codeID)] = (slot, vector)
+        if self.resultTable is not None:
+            self.resultTable.addRun(codeID, self.getPoint(vector))
+
+    def runResults(self, codeID, results):
+        if self.finished or codeID not in self.pending:
+            return
+        slot, vector = self.pending.pop(codeID)
+        try:
+            cost = self.sign * float(results.get(self.costDataset))
+        except (TypeError, ValueError):
+            log(f"Run {codeID} has no scalar result in dataset {self.costDataset}, it is ranked last")
+            cost = None
+        self.evolution.tell(slot, vector, cost)
+        if cost is not None and (self.bestCost is None or cost < self.bestCost):
+            self.bestCost = cost
+            log(f"Differential evolution {self.multirunName}: new best {self.sign * cost:.6g} at {self.formatVector(vector)}")
+        self.candidateFinished()
+
+    def runFailed(self, codeID):
+        if self.finished or codeID not in self.pending:
+            return
+        slot, vector = self.pending.pop(codeID)
+        # the slot keeps its current member instead of ranking the candidate last
+        log(f"Run {codeID} failed, its candidate {self.formatVector(vector)} is dropped")
+        self.evolution.cancel(slot)
+        self.candidateFinished()
+
+    def candidateFinished(self):
+        self.progressDialog.setProgress(self.evolution.told / self.evolution.evaluationBudget)
+        if self.evolution.isFinished():
+            self.finish()
+        else:
+            self.submitCandidates()
+
+    def formatVector(self, vector):
+        return ", ".join(f"{variableName}={value:.6g}" for variableName, value in zip(self.variableNames, vector.tolist()))
+
+    def finish(self):
+        self.stop(None)
+        vector, cost = self.evolution.getBest()
+        log(f"Differential evolution {self.multirunName} finished: best {self.sign * cost:.6g} at {self.formatVector(vector)}")
+        if Design.confirmationDialog(
+            "Differential Evolution",
+            f"Best result {self.sign * cost:.6g} at {self.formatVector(vector)}. Set the variables to these values?",
+        ):
+            for variableName, value in zip(self.variableNames, vector.tolist()):
+                crate.Variables.ValueChange(variableName, "value", str(value))
+
+    def cancel(self):
+        if not self.finished:
+            self.stop(f"Optimization cancelled, {len(self.pending)} queued runs are not deleted.")
+
+    def stop(self, message):
+        global runningOptimization
+        if self.finished:
+            return
+        self.finished = True
+        runningOptimization = None
+        if self.batch is not None:
+            # ends the tasks, so the pool does not wait for more candidates
+            self.candidates.put(None)
+            self.batch.cancel()
+        self.progressDialog.close()
+        if self.resultTable is not None:
+            self.resultTable.stopQueueing()
+            checkResultTable(self.resultTable)
+        if message is not None:
+            log(message)
+            Design.infoDialog("Differential Evolution", message)
 
 
 class Dimension(Design.Frame):
@@ -307,7 +987,7 @@ class Variable(Design.HBox):
         self.dimension = dimension
         self.multirun = multirun
         self.modeField = Input.ComboBox(
-            itemsGenerateFunction=lambda: ["linear", "data list"],
+            itemsGenerateFunction=lambda: ["linear", "log", "data list", "uniform", "normal", "log uniform"],
             default=crate.MultiRun.getVariableValue(self.multirun, self.dimension, self.name, "mode"),
             changedCallback=lambda mode: crate.MultiRun.VariableValueChange(self.multirun, self.dimension, self.name, "mode", mode),
         )
@@ -323,6 +1003,18 @@ class Variable(Design.HBox):
             changedCallback=lambda value: crate.MultiRun.VariableValueChange(self.multirun, self.dimension, self.name, "max", value),
             dontUpdateMetrics=True,
         )
+        self.meanField = Input.TextField(
+            default=crate.MultiRun.getVariableValue(self.multirun, self.dimension, self.name, "mean"),
+            reader=eval,
+            changedCallback=lambda value: crate.MultiRun.VariableValueChange(self.multirun, self.dimension, self.name, "mean", value),
+            dontUpdateMetrics=True,
+        )
+        self.stdField = Input.TextField(
+            default=crate.MultiRun.getVariableValue(self.multirun, self.dimension, self.name, "std"),
+            reader=eval,
+            changedCallback=lambda value: crate.MultiRun.VariableValueChange(self.multirun, self.dimension, self.name, "std", value),
+            dontUpdateMetrics=True,
+        )
         datalist = crate.MultiRun.getVariableValue(self.multirun, self.dimension, self.name, "datalist")
         self.datalistField = Input.DatalistEditor(
             textGenerator=lambda d: (f"{d[0]} ... {d[-1]} ({len(d)} Points)" if len(d) != 0 else "empty"),
@@ -334,9 +1026,13 @@ class Variable(Design.HBox):
             "mode": self.modeField,
             "min": self.minField,
             "max": self.maxField,
+            "mean": self.meanField,
+            "std": self.stdField,
         }
         self.minField.setFixedWidth(60)
         self.maxField.setFixedWidth(60)
+        self.meanField.setFixedWidth(60)
+        self.stdField.setFixedWidth(60)
         self.removeButton = Design.DeleteButton()
         self.removeButton.clicked.connect(lambda: crate.MultiRun.VariableDelete(self.multirun, self.dimension, self.name))
         self.linearSettings = Design.HBox(
@@ -345,6 +1041,12 @@ class Variable(Design.HBox):
             QtW.QLabel("to"),
             self.maxField,
         )
+        self.normalSettings = Design.HBox(
+            "mean",
+            self.meanField,
+            QtW.QLabel("std"),
+            self.stdField,
+        )
         self.datasetSettings = Design.HBox(
             self.datalistField,
         )
@@ -353,6 +1055,7 @@ class Variable(Design.HBox):
             self.name,
             self.modeField,
             self.linearSettings,
+            self.normalSettings,
             self.datasetSettings,
             self.removeButton,
         )
@@ -360,7 +1063,8 @@ class Variable(Design.HBox):
 
     def updateVisibility(self):
         mode = crate.MultiRun.getVariableValue(self.multirun, self.dimension, self.name, "mode")
-        self.linearSettings.setVisible(mode == "linear")
+        self.linearSettings.setVisible(mode in ("linear", "log", "uniform", "log uniform"))
+        self.normalSettings.setVisible(mode == "normal")
         self.datasetSettings.setVisible(mode == "data list")
 
     def valueChange(self, valueName, value):
@@ -244,6 +244,7 @@ class DataReader:
                         if value == "deleting":
                             value = "error"
                             SequenceEditor.sequenceFinished(self.treeItems[rid].seqName)
+                            MultiRun.runFailed(self.treeItems[rid].codeID)
                         self.treeItems[rid].updateStatus(value)
 
     def newItem(self, rid, seqName, status, codeID, duration, launched_by_sequencegui: bool = True):
@@ -15,6 +15,7 @@ import gui.crate as crate
 import gui.widgets.Design as Design
 import gui.widgets.Dock as Dock
 import gui.widgets.Input as Input
+import gui.widgets.MultiRun as MultiRun
 import gui.widgets.Playlist as Playlist
 import gui.widgets.SequenceEditor as SequenceEditor
 import gui.widgets.Variables as Variables
@@ -157,6 +158,12 @@ class Server:
         SequenceEditor.sequenceFinished(seqName)
         Playlist.sequenceFinished(codeID)
 
+    def runResults(self, codeID, results):
+        try:
+            MultiRun.runResults(codeID, results)
+        except Exception as e:
+            log(e)
+
 
 class WatchdogEventHandler(watchdog.events.FileSystemEventHandler):
     def __init__(self, eventQueue):
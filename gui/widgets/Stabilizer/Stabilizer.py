@@ -1,5 +1,4 @@
 import asyncio
-from datetime import datetime
 import time
 import gui.crate as crate
 from gui import compiler
@@ -246,7 +245,7 @@ class StabilizerDock(QDockWidget):
 
             updates = self._update_widget.visible_updates()
 
-            codeID = int(datetime.now().strftime("%Y%m%d%H%M%S%f"))
+            codeID = compiler.reserveCodeIDs()
             code = set_stabilizer.build_script(stabilizer_device_name, updates, codeID)
             compiler.submit_generated_code(
                 code=code,
@@ -6,23 +6,17 @@ import gui.widgets.Dock as Dock
 import gui.widgets.Input as Input
 import gui.widgets.MultiRun as MultiRun
 import gui.widgets.Viewer as Viewer
+# the variable index lives outside of the widgets, so the headless compiler can use it
+from gui.variable_index import evaluate, getIndex, replacer, variablesChanged
 
 
-def replacer(text):
-    variableDataIterator = crate.variables.values() if MultiRun.currentlyRunningVariables is None else MultiRun.currentlyRunningVariables.values()
-    changed = True
-    counter = 0
-    while changed:
-        changed = False
-        for variableData in variableDataIterator:
-            if not variableData["isDir"]:
-                if variableData["alias"] in text:
-                    text = text.replace(variableData["alias"], variableData["value"])
-                    changed = True
-        counter += 1
-        if counter > 100:
-            raise ValueError(f"Infinite loop in variable: {text}")
-    return text
+def onCrateAction(action):
+    if action["target"] == "variables":
+        variablesChanged()
+
+
+Input.expressionEvaluators[replacer] = evaluate
+crate.actionCallbacks.append(onCrateAction)
 
 
 dock = None
@@ -80,14 +74,11 @@ class Widget(Design.VBox):
             return None
         except ValueError:
             pass
-        for variableName, variableData in crate.variables.items():
-            if self.name == variableName:
-                continue
-            if variableData["isDir"]:
-                continue
-            alias2 = crate.Variables.getValue(variableName, "alias")
-            if alias in alias2 or alias2 in alias:
-                return None
+        if alias == "":
+            return None
+        ownAlias = crate.variables[self.name]["alias"]
+        if getIndex(crate.variables).findOverlappingAlias(alias, ignoredAlias=ownAlias) is not None:
+            return None
         return alias
 
     def valueChange(self, valueName, value):
@@ -0,0 +1,121 @@
+import json
+
+import pytest
+
+pytest.importorskip("sipyco")
+
+import gui.code_generation.artiq_code_generator as artiq_code_generator
+import gui.compiler as compiler
+import gui.settings as settings
+from gui.code_generation.code_writer import CodeWriter
+from conftest import makeSequence, portStateSegment, subsequenceSegment
+
+
+def generateMain():
+    compiledSeq = compiler.compileSequence("main", compiler.TimeRunner())
+    code = artiq_code_generator.generateCode("main", compiledSeq)
+    compile(code, "main.py", "exec")
+    return code
+
+
+def test_subsequences_are_inlined_by_default(testCrate):
+    code = generateMain()
+    assert "def subsequence_" not in code
+
+
+def test_reused_subsequences_are_kernel_methods(testCrate):
+    settings.data["subsequenceMethods"] = True
+    code = generateMain()
+    assert code.count("def subsequence_pulse(self, start_mu):") == 1
+    assert code.count("self.subsequence_pulse(") == 2
+
+
+def test_sidecar_files_hold_the_sequence_json(testCrate):
+    compiledSeq = compiler.compileSequence("main", compiler.TimeRunner())
+    sequenceJson = json.loads(json.dumps(compiledSeq.toJson()))
+    sidecarFiles = {}
+    code = artiq_code_generator.generateCode("main", compiledSeq, sidecarFiles=sidecarFiles)
+    compile(code, "main.py", "exec")
+    (name,) = [name for name in sidecarFiles if name.endswith(".json.gz")]
+    assert f'loadSidecar("{name}")' in code
+    assert json.loads(sidecarFiles[name]) == sequenceJson
+
+
+@pytest.mark.parametrize("subsequenceMethods", [False, True])
+def test_repeated_subsequences_are_recorded_once(testCrate, subsequenceMethods):
+    testCrate.device_db["core_dma"] = {"type": "local", "module": "artiq.coredevice.dma", "class": "CoreDMA"}
+    testCrate.sequences["blink"] = makeSequence([portStateSegment({"TTL/ttl1": {"state": True}}), portStateSegment({"TTL/ttl1": {"state": False}})])
+    testCrate.sequences["main"]["segments"]["segment5"] = subsequenceSegment("blink", repeats="4")
+    settings.data["dmaSubsequences"] = True
+    settings.data["subsequenceMethods"] = subsequenceMethods
+    lines = generateMain().split("\n")
+
+    records = [i for i, line in enumerate(lines) if "self.core_dma.record(" in line]
+    handles = [i for i, line in enumerate(lines) if "self.core_dma.get_handle(" in line]
+    playbacks = [line.strip() for line in lines if "self.core_dma.playback_handle(" in line]
+    recorded = sorted(lines[i].split('"')[1].rsplit("_", 1)[0] for i in records)
+    assert recorded == ["blink", "pulse"]
+    assert len(handles) == 2 and min(handles) > max(records)
+    # both loops of pulse play back the same recording
+    assert len(playbacks) == 3
+    assert len(set(playbacks)) == 2
+
+
+def test_known_devices_skip_their_init(testCrate):
+    settings.data["knownDeviceState"] = True
+    code = generateMain()
+    init = code[code.index("def init(self):") : code.index("def run(self):")]
+    assert "known_device_state = self.get_known_device_state()" in init
+    # only the init of the urukul channel and its cpld can be skipped
+    assert "if known_device_state[0] == 0:\n            self.urukul0_cpld.init()" in init
+    assert "if known_device_state[2] == 0:\n            self.urukul0_ch0.init()" in init
+    assert init.count("if known_device_state[") == 2
+    assert "\n        self.zotino0.init()" in init
+    assert "self.set_known_device_state([" in code[code.index("def run(self):") : code.index("def analyze(self):")]
+
+
+class FakeDatasets:
+    def __init__(self):
+        self.datasets = {}
+
+    def get_dataset(self, name, default, archive):
+        return self.datasets.get(name, default)
+
+    def set_dataset(self, name, value, broadcast, archive):
+        self.datasets[name] = value
+
+
+def createKnownDeviceState(devices):
+    knownState = artiq_code_generator.KnownDeviceState(devices)
+    initWriter = CodeWriter()
+    for device in devices:
+        knownState.writeInitCode(initWriter, device)
+    writer = CodeWriter()
+    knownState.writeFunctionCode(writer)
+    namespace = {"TList": lambda type_: list, "TInt32": int, "TNone": None}
+    exec("class Experiment(FakeDatasets):" + writer.getvalue(), {**namespace, "FakeDatasets": FakeDatasets}, namespace)
+    return knownState, initWriter.getvalue(), namespace["Experiment"]
+
+
+def test_devices_are_known_after_a_finished_run(testCrate):
+    from gui.code_generation.device.Urukul import Urukul, UrukulCPLD
+
+    cpld = UrukulCPLD("urukul0_cpld")
+    cpld.needGetAtt()
+    channel = Urukul("urukul0_ch0", cpld)
+    channel.needInit()
+    knownState, init, Experiment = createKnownDeviceState([cpld, channel])
+    # set_att writes the attenuators of all channels, so the cpld restores them if it skips its init
+    assert "        else:\n            self.urukul0_cpld.att_reg = known_device_state[1]" in init
+    experiment = Experiment()
+    experiment.forceDeviceInit = False
+    assert experiment.get_known_device_state() == [0, 0, 0, 0]
+    experiment.set_known_device_state([7, 0])
+    assert experiment.datasets[knownState.DATASET] == {"urukul0_cpld": 7, "urukul0_ch0": 0}
+
+    # a run clears the state until it finishes
+    assert experiment.get_known_device_state() == [1, 7, 1, 0]
+    assert experiment.datasets[knownState.DATASET] == {}
+    experiment.set_known_device_state([9, 0])
+    experiment.forceDeviceInit = True
+    assert experiment.get_known_device_state() == [0, 0, 0, 0]
@@ -0,0 +1,46 @@
+import io
+
+import pytest
+
+from gui.code_generation.code_writer import CodeWriter
+
+
+def test_indent_applies_to_every_written_line():
+    writer = CodeWriter()
+    writer.write("""
+        for i in range(2):""")
+    with writer.indent():
+        writer.write("""
+        a = i
+        b = i""")
+        with writer.indent(2):
+            writer.write("""
+        c = i""")
+        writer.write("""
+        d = i""")
+    writer.write("""
+        e = 0""")
+    assert writer.getvalue() == "\n        for i in range(2):\n            a = i\n            b = i\n                    c = i\n            d = i\n        e = 0"
+
+
+def test_indent_is_restored_after_errors():
+    writer = CodeWriter()
+    with pytest.raises(ValueError):
+        with writer.indent():
+            raise ValueError()
+    writer.write("\na")
+    assert writer.getvalue() == "\na"
+
+
+def test_code_is_streamed_into_the_file():
+    file = io.StringIO()
+    writer = CodeWriter(file, bufferSize=4)
+    assert writer.isEmpty()
+    writer.write("ab")
+    writer.write(None)
+    assert file.getvalue() == ""
+    writer.write("cd")
+    assert file.getvalue() == "abcd"
+    writer.write("e")
+    assert writer.position() == 5
+    assert writer.getvalue() == "abcde"
@@ -0,0 +1,174 @@
+import os
+
+import pytest
+
+pytest.importorskip("sipyco")
+
+import gui.compiler as compiler
+import gui.crate as crate
+import gui.settings as settings
+import gui.widgets.Variables as Variables
+
+
+def setVariable(alias, value):
+    for variableData in crate.variables.values():
+        if variableData.get("alias") == alias:
+            variableData["value"] = value
+    Variables.variablesChanged()
+
+
+def compileMain():
+    return compiler.compileSequence("main", compiler.TimeRunner())
+
+
+def test_durations_of_nested_subsequences(testCrate):
+    compiler.compileCache.beginCompile()
+    assert compiler.getDurationValue("pulse") == pytest.approx(1.5e-3)
+    # 2 ms + 3 pulses + 5 ms + 2 pulses + 1 ms
+    assert compiler.getDurationValue("main") == pytest.approx(15.5e-3)
+    assert compiler.getDurationValue("unknown") is None
+
+
+def test_durations_are_keyed_by_the_variable_values(testCrate):
+    compiler.compileCache.beginCompile()
+    assert compiler.getDurationValue("main") == pytest.approx(15.5e-3)
+    key = ("pulse", compiler.compileCache.variablesKey)
+    assert compiler.compileCache.durations[key] == pytest.approx(1.5e-3)
+    # a cached duration is returned without evaluating the segments again
+    compiler.compileCache.durations[key] = 1.0
+    assert compiler.getDurationValue("pulse") == 1.0
+
+    setVariable("pulse_time", "1.5")
+    compiler.compileCache.beginCompile()
+    assert compiler.getDurationValue("pulse") == pytest.approx(2.5e-3)
+    assert compiler.getDurationValue("main") == pytest.approx(20.5e-3)
+
+
+def test_sequence_actions_drop_durations(testCrate):
+    compiler.compileCache.beginCompile()
+    compiler.getDurationValue("main")
+    assert len(compiler.compileCache.durations) > 0
+    crate.sequences["pulse"]["segments"]["segment1"]["duration"]["text"] = "2"
+    compiler.onCrateAction({"target": "sequences", "type": "segmentvaluechange", "seqname": "pulse", "segname": "segment1"})
+    assert len(compiler.compileCache.durations) == 0
+    assert compiler.getDurationValue("pulse") == pytest.approx(2.5e-3)
+
+
+def test_recursive_subsequences_have_no_duration(testCrate):
+    crate.sequences["pulse"]["segments"]["segment2"] = {"type": "subsequence", "enabled": True, "subsequence": "main", "repeats": "1"}
+    compiler.compileCache.beginCompile()
+    assert compiler.getDurationValue("main") == float("inf")
+
+
+def test_subsequences_are_compiled_once_per_compile(testCrate, monkeypatch):
+    compiled = []
+    compileSequence = compiler.compileSequence
+
+    def countingCompileSequence(seqName, timeRunner, seqStack=None):
+        compiled.append(seqName)
+        return compileSequence(seqName, timeRunner, seqStack)
+
+    monkeypatch.setattr(compiler, "compileSequence", countingCompileSequence)
+    compiledSeq = compileMain()
+    assert compiled == ["main", "pulse"]
+    assert compiledSeq.getDuration() == pytest.approx(15.5e-3)
+    compiled.clear()
+    compileMain()
+    # bodies only live for one compile
+    assert compiled == ["main", "pulse"]
+
+
+def changePortState(seqName, segName, portName, valueName, value):
+    crate.sequences[seqName]["segments"][segName]["ports"][portName][valueName] = value
+    compiler.onCrateAction({"target": "sequences", "type": "portstatevaluechange", "seqname": seqName, "segname": segName, "portname": portName, "valuename": valueName})
+
+
+def test_segments_are_compiled_again_only_after_changes(testCrate, monkeypatch):
+    compiled = []
+    compilePortStateDict = compiler.compilePortStateDict
+
+    def countingCompilePortStateDict(seqName, segName, portStateDict):
+        compiled.append((seqName, segName))
+        return compilePortStateDict(seqName, segName, portStateDict)
+
+    monkeypatch.setattr(compiler, "compilePortStateDict", countingCompilePortStateDict)
+    compileMain()
+    assert len(compiled) == 5
+    compiled.clear()
+    compileMain()
+    assert compiled == []
+
+    changePortState("main", "segment0", "TTL/ttl1", "state", False)
+    compiledSeq = compileMain()
+    assert compiled == [("main", "segment0")]
+    assert compiledSeq.toJson()[0]["ports"]["TTL/ttl1"]["state"] is False
+
+    # only the segments referencing the variable are compiled again
+    compiled.clear()
+    setVariable("carrier", "90")
+    compiledSeq = compileMain()
+    assert compiled == [("main", "segment0")]
+    assert compiledSeq.toJson()[0]["ports"]["RF/urukul0_ch0"]["freq"] == pytest.approx(90e6)
+
+
+def test_cached_segments_are_not_changed_by_their_users(testCrate):
+    crate.sequences["main"]["segments"]["segment2"]["ports"]["DAC/fastino0_ch00"]["loadData_enable"] = True
+    compiler.compileCache.beginCompile()
+    segData = crate.sequences["main"]["segments"]["segment2"]
+    ports, _rpcs = compiler.compileCache.getSegment("main", "segment2", segData)
+    ports["DAC/fastino0_ch00"]["loaded_dataset"]["y"].append(7)
+    ports["DAC/fastino0_ch00"]["voltage"] = 5.0
+    cachedPorts, _rpcs = compiler.compileCache.getSegment("main", "segment2", segData)
+    assert cachedPorts["DAC/fastino0_ch00"]["loaded_dataset"]["y"] == [2, 3, 5]
+    assert cachedPorts["DAC/fastino0_ch00"]["voltage"] == pytest.approx(0.1)
+
+
+def countGeneratedCode(monkeypatch):
+    import gui.code_generation.artiq_code_generator as artiq_code_generator
+
+    generated = []
+    generateCode = artiq_code_generator.generateCode
+
+    def countingGenerateCode(seqName, *args, **kwargs):
+        generated.append(seqName)
+        return generateCode(seqName, *args, **kwargs)
+
+    monkeypatch.setattr(artiq_code_generator, "generateCode", countingGenerateCode)
+    return generated
+
+
+def test_stored_code_is_generated_once(testCrate, monkeypatch):
+    generated = countGeneratedCode(monkeypatch)
+    codeID, path, _artiqMasterPath, duration, arguments, _slackWarnings = compiler.compileCodeToStore("main")
+    assert generated == ["main"]
+    assert duration == pytest.approx(15.5e-3)
+    arguments["changed"] = True
+    otherCodeID, otherPath, _artiqMasterPath, _duration, otherArguments, _slackWarnings = compiler.compileCodeToStore("main")
+    assert generated == ["main"]
+    assert otherPath == path
+    assert otherCodeID != codeID
+    assert "changed" not in otherArguments
+
+
+def test_stored_code_depends_on_the_settings_and_the_sequence(testCrate, monkeypatch):
+    generated = countGeneratedCode(monkeypatch)
+    path = compiler.compileCodeToStore("main")[1]
+    setVariable("carrier", "90")
+    carrierPath = compiler.compileCodeToStore("main")[1]
+    assert carrierPath != path
+    setVariable("carrier", "80")
+    assert compiler.compileCodeToStore("main")[1] == path
+    assert len(generated) == 2
+
+    settings.data["relativeTimestamps"] = not settings.data["relativeTimestamps"]
+    compiler.compileCodeToStore("main")
+    assert len(generated) == 3
+
+
+def test_deleted_code_is_generated_again(testCrate, monkeypatch):
+    generated = countGeneratedCode(monkeypatch)
+    path = compiler.compileCodeToStore("main")[1]
+    os.remove(path)
+    assert compiler.compileCodeToStore("main")[1] == path
+    assert os.path.exists(path)
+    assert len(generated) == 2
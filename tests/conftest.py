@@ -0,0 +1,120 @@
+import copy
+import os
+
+import pytest
+
+DEVICE_DB_PATH = os.path.join(os.path.dirname(__file__), "..", "resources", "test_device_db.py")
+
+
+def unitValue(text, unit, factor):
+    return {"text": text, "unit": {"text": unit, "factor": factor}}
+
+
+def portStateSegment(ports, duration="1", rpcs=None):
+    return {
+        "type": "portstate",
+        "description": "",
+        "enabled": True,
+        "duration": unitValue(duration, "ms", 1e-3),
+        "ports": ports,
+        "rpcs": rpcs or {},
+    }
+
+
+def subsequenceSegment(subsequence, repeats="1"):
+    return {
+        "type": "subsequence",
+        "description": "",
+        "enabled": True,
+        "subsequence": subsequence,
+        "repeats": repeats,
+    }
+
+
+def makeSequence(segments):
+    return {"isDir": False, "appearances": {}, "pre_compile_rpc": None, "pre_compile_args": "", "segments": {f"segment{i}": segment for i, segment in enumerate(segments)}}
+
+
+def makeLabsetup(deviceDb):
+    labsetup = {"TTL": {"isDir": True}, "RF": {"isDir": True}, "DAC": {"isDir": True}}
+    for name in ("ttl0", "ttl1"):
+        labsetup[f"TTL/{name}"] = {"device": name, "module": "artiq.coredevice.ttl", "inverted": False, "isDir": False}
+    labsetup["RF/urukul0_ch0"] = {"device": "urukul0_ch0", "module": deviceDb["urukul0_ch0"]["module"], "isDir": False}
+    for device in ("fastino0", "zotino0"):
+        for channel in range(2):
+            labsetup[f"DAC/{device}_ch{channel:02d}"] = {
+                "device": device,
+                "module": deviceDb[device]["module"],
+                "isDir": False,
+                "channel": f"{channel}",
+                "calibration_enabled": False,
+                "calibration_unit_text": "nT",
+                "calibration_to_unit": {"text": "V", "factor": 1.0},
+                "calibration_mode": "Formula",
+                "calibration_formula": "x",
+                "calibration_dataset": None,
+            }
+    return labsetup
+
+
+def makeSequences():
+    import gui.crate.Sequences as Sequences
+
+    urukul = copy.deepcopy(Sequences.DEFAULT_PORTSTATE_VALUES["artiq.coredevice.ad9910"])
+    urukul["freq"] = unitValue("carrier", "MHz", 1e6)
+    fastino = copy.deepcopy(Sequences.DEFAULT_PORTSTATE_VALUES["artiq.coredevice.fastino"])
+    fastino["sweep_enable"] = True
+    zotino = copy.deepcopy(Sequences.DEFAULT_PORTSTATE_VALUES["artiq.coredevice.zotino"])
+    return {
+        "pulse": makeSequence(
+            [
+                portStateSegment({"TTL/ttl0": {"state": True}}, duration="pulse_time"),
+                portStateSegment({"TTL/ttl0": {"state": False}}),
+            ]
+        ),
+        "main": makeSequence(
+            [
+                portStateSegment({"TTL/ttl1": {"state": True}, "RF/urukul0_ch0": urukul, "DAC/zotino0_ch00": zotino}, duration="2"),
+                subsequenceSegment("pulse", repeats="pulse_count"),
+                portStateSegment({"DAC/fastino0_ch00": fastino}, duration="5"),
+                subsequenceSegment("pulse", repeats="2"),
+                portStateSegment({"TTL/ttl1": {"state": False}}),
+            ]
+        ),
+    }
+
+
+VARIABLES = {
+    "pulse_time": "0.5",
+    "pulse_count": "3",
+    "carrier": "80",
+}
+
+
+@pytest.fixture
+def testCrate(monkeypatch, tmp_path):
+    """A crate with a main sequence using TTLs, an Urukul and DACs, and the subsequence "pulse"."""
+    pytest.importorskip("sipyco")
+    import gui.compiler as compiler
+    import gui.crate as crate
+    import gui.settings as settings
+    import gui.variable_index as variable_index
+
+    namespace = {}
+    with open(DEVICE_DB_PATH) as file:
+        exec(file.read(), namespace)
+    monkeypatch.setattr(crate, "device_db", namespace["device_db"])
+    monkeypatch.setattr(crate, "labsetup", makeLabsetup(namespace["device_db"]))
+    monkeypatch.setattr(crate, "sequences", makeSequences())
+    monkeypatch.setattr(crate, "variables", {f"var_{alias}": {"isDir": False, "alias": alias, "value": value} for alias, value in VARIABLES.items()})
+    monkeypatch.setattr(crate, "config", {"artiqVersion": "8"})
+    monkeypatch.setattr(crate, "rpcs", {})
+    monkeypatch.setattr(crate.FileManager, "cratePath", str(tmp_path) + "/", raising=False)
+    monkeypatch.setattr(settings, "data", {})
+    settings.loadMissingDefaults(save=False)
+    monkeypatch.setattr(variable_index, "currentlyRunningVariables", None)
+    monkeypatch.setattr(compiler, "compileCache", compiler.CompileCache())
+    monkeypatch.setattr(compiler, "codeStore", compiler.CodeStore())
+    variable_index.variablesChanged()
+    yield crate
+    variable_index.variablesChanged()
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+import gui.differential_evolution as differential_evolution
+
+
+def sphere(vector):
+    return float(np.sum((vector - 0.25) ** 2))
+
+
+def optimize(evolution, cost):
+    """Runs the evolution like the Optimization of the MultiRun widget, with one candidate per slot in flight."""
+    inFlight = []
+    while not evolution.isFinished():
+        candidate = evolution.ask()
+        while candidate is not None:
+            inFlight.append(candidate)
+            candidate = evolution.ask()
+        slot, vector = inFlight.pop(0)
+        evolution.tell(slot, vector, cost(vector))
+    return evolution.getBest()
+
+
+def test_population_needs_enough_members():
+    with pytest.raises(ValueError):
+        differential_evolution.DifferentialEvolution([0], [1], differential_evolution.MIN_POPULATION_SIZE - 1, 10, 0)
+
+
+def test_candidates_stay_in_bounds():
+    evolution = differential_evolution.DifferentialEvolution([-1, 0], [1, 5], 6, 20, 1)
+    for _ in range(evolution.evaluationBudget):
+        slot, vector = evolution.ask()
+        assert np.all(vector >= evolution.lower) and np.all(vector <= evolution.upper)
+        evolution.tell(slot, vector, float(vector[0]))
+    assert evolution.ask() is None
+    assert evolution.isFinished()
+
+
+def test_every_slot_has_one_candidate_in_flight():
+    evolution = differential_evolution.DifferentialEvolution([0], [1], 4, 10, 2)
+    slots = [evolution.ask()[0] for _ in range(4)]
+    assert sorted(slots) == [0, 1, 2, 3]
+    assert evolution.ask() is None
+    evolution.tell(2, np.array([0.5]), 1.0)
+    assert evolution.ask()[0] == 2
+
+
+def test_trials_only_replace_worse_members():
+    evolution = differential_evolution.DifferentialEvolution([0], [1], 4, 10, 3)
+    for _ in range(4):
+        slot, vector = evolution.ask()
+        evolution.tell(slot, vector, 1.0)
+    slot, vector = evolution.ask()
+    member = evolution.population[slot].copy()
+    evolution.tell(slot, vector, 2.0)
+    assert evolution.population[slot] == pytest.approx(member)
+    assert evolution.costs[slot] == 1.0
+    slot, vector = evolution.ask()
+    evolution.tell(slot, vector, 0.5)
+    assert evolution.population[slot] == pytest.approx(vector)
+    assert evolution.costs[slot] == 0.5
+
+
+def test_failed_runs_are_ranked_last():
+    evolution = differential_evolution.DifferentialEvolution([0], [1], 4, 10, 4)
+    slot, vector = evolution.ask()
+    evolution.tell(slot, vector, float("nan"))
+    assert evolution.costs[slot] == np.inf
+    assert evolution.initialized[slot]
+
+
+def test_cancel_frees_the_slot_and_keeps_the_member():
+    evolution = differential_evolution.DifferentialEvolution([0], [1], 4, 10, 5)
+    for _ in range(4):
+        slot, vector = evolution.ask()
+        evolution.tell(slot, vector, 1.0)
+    slot, _ = evolution.ask()
+    member = evolution.population[slot].copy()
+    evolution.cancel(slot)
+    assert not evolution.pending[slot]
+    assert evolution.population[slot] == pytest.approx(member)
+    assert evolution.costs[slot] == 1.0
+    assert evolution.told == 5
+
+
+def test_seed_makes_the_optimization_reproducible():
+    results = [optimize(differential_evolution.DifferentialEvolution([-1, -1], [1, 1], 8, 15, 6), sphere) for _ in range(2)]
+    assert results[0][0] == pytest.approx(results[1][0])
+    assert results[0][1] == results[1][1]
+
+
+def test_finds_the_minimum():
+    vector, cost = optimize(differential_evolution.DifferentialEvolution([-1, -1], [1, 1], 10, 60, 7), sphere)
+    assert vector == pytest.approx([0.25, 0.25], abs=1e-2)
+    assert cost < 1e-4
@@ -0,0 +1,70 @@
+import pytest
+
+pytest.importorskip("sipyco")
+
+import gui.code_generation.event_builder as event_builder
+import gui.compiler as compiler
+from gui.code_generation.device.Fastino import Fastino
+from gui.code_generation.device.TTL import TTL
+from gui.code_generation.device.Urukul import Urukul, UrukulCPLD
+from gui.code_generation.device.Zotino import Zotino
+from gui.code_generation.event.Fastino import FastinoEvent
+from gui.code_generation.event.TTL import TTLEvent
+from gui.code_generation.event.Urukul import UrukulEvent
+from gui.code_generation.event.Zotino import ZotinoEvent
+
+
+def buildMain():
+    compiledSeq = compiler.compileSequence("main", compiler.TimeRunner())
+    event_builder.preProccess(compiledSeq)
+    return event_builder.generateDevicesAndEvents(compiledSeq)
+
+
+def getEventTypes(currentEvents):
+    return sorted(type(event).__name__ for event in currentEvents["events"])
+
+
+def test_devices_and_events_are_created_by_module(testCrate):
+    devices, events = buildMain()
+    devicesByName = {device.name: device for device in devices}
+    assert type(devicesByName["ttl0"]) is TTL and type(devicesByName["ttl1"]) is TTL
+    assert type(devicesByName["urukul0_ch0"]) is Urukul
+    assert type(devicesByName["urukul0_cpld"]) is UrukulCPLD
+    assert devicesByName["urukul0_ch0"].cpld is devicesByName["urukul0_cpld"]
+    assert type(devicesByName["zotino0"]) is Zotino
+    assert type(devicesByName["fastino0"]) is Fastino
+
+    assert getEventTypes(events[0]) == sorted([TTLEvent.__name__, UrukulEvent.__name__, ZotinoEvent.__name__])
+    assert events[1]["name"] == "pulse" and events[1]["repeats"] == 3
+    assert getEventTypes(events[1]["events"][0]) == [TTLEvent.__name__]
+    assert getEventTypes(events[2]) == [FastinoEvent.__name__]
+
+
+def test_ports_of_one_device_share_it(testCrate):
+    testCrate.sequences["main"]["segments"]["segment2"]["ports"]["DAC/fastino0_ch01"] = dict(testCrate.sequences["main"]["segments"]["segment2"]["ports"]["DAC/fastino0_ch00"])
+    devices, events = buildMain()
+    assert len([device for device in devices if isinstance(device, Fastino)]) == 1
+    # the channels of a segment are summarized into one event
+    assert getEventTypes(events[2]) == [FastinoEvent.__name__]
+
+
+def test_unknown_modules_are_not_implemented(testCrate, monkeypatch):
+    monkeypatch.delitem(event_builder.EVENT_FACTORIES, "artiq.coredevice.zotino")
+    with pytest.raises(NotImplementedError, match="artiq.coredevice.zotino not implemented"):
+        buildMain()
+    monkeypatch.delitem(event_builder.DEVICE_FACTORIES, "artiq.coredevice.zotino")
+    with pytest.raises(NotImplementedError, match="artiq.coredevice.zotino device not implemented"):
+        buildMain()
+
+
+def test_factories_can_be_replaced(testCrate, monkeypatch):
+    created = []
+
+    def createTTLEvent(index, segment, portState, device):
+        created.append((device.name, portState["state"]))
+        return None
+
+    monkeypatch.setitem(event_builder.EVENT_FACTORIES, "artiq.coredevice.ttl", createTTLEvent)
+    _devices, events = buildMain()
+    assert ("ttl1", True) in created and ("ttl0", False) in created
+    assert getEventTypes(events[0]) == sorted([UrukulEvent.__name__, ZotinoEvent.__name__])
@@ -0,0 +1,104 @@
+import pytest
+
+import gui.expressions as expressions
+
+
+def makeVariables(aliases):
+    variables = {"dir": {"isDir": True}}
+    for i, (alias, value) in enumerate(aliases.items()):
+        variables[f"var{i}"] = {"isDir": False, "alias": alias, "value": value}
+    return variables
+
+
+def evaluate(index, text):
+    """Like gui.widgets.Variables.evaluate, without the fallback hiding evaluation errors."""
+    if index.canEvaluate(text):
+        return expressions.evaluate(text, index)
+    return expressions.evaluate(index.replace(text))
+
+
+VARIABLES = {
+    "a": "2",
+    "b": "a + 1",
+    "freq": "1e6",
+    "freq_offset": "freq * 0.5",
+    "name": "'freq'",
+    "values": "[a, b, 3]",
+}
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "a",
+        "b * 2",
+        "len(name) * a",
+        "freq_offset",
+        "freq + freq_offset",
+        "name",
+        "values[1]",
+        "len('a b')",
+        "round(freq / 3) ** 2",
+        " a + b\t",
+    ],
+)
+def test_evaluation_matches_substitution(text):
+    index = expressions.VariableIndex(makeVariables(VARIABLES))
+    assert evaluate(index, text) == eval(index.replace(text))
+
+
+def test_substitution_is_textual():
+    index = expressions.VariableIndex(makeVariables(VARIABLES))
+    # "b" is not atomic, so b * 2 means a + 1 * 2
+    assert index.replace("b * 2") == "2 + 1 * 2"
+    assert not index.canEvaluate("b * 2")
+    assert evaluate(index, "b * 2") == 4
+    assert index.canEvaluate("a * 2")
+
+
+def test_aliases_inside_names_and_strings_are_substituted():
+    index = expressions.VariableIndex(makeVariables(VARIABLES))
+    assert not index.canEvaluate("'a'")
+    assert evaluate(index, "'a'") == "2"
+    assert index.replace("freq_offset") == "1e6 * 0.5"
+
+
+def test_cycles_raise():
+    index = expressions.VariableIndex(makeVariables({"x": "y + 1", "y": "x", "z": "1"}))
+    assert index.cyclic == {"x", "y"}
+    assert evaluate(index, "z") == 1
+    with pytest.raises(ValueError):
+        index.replace("x")
+    with pytest.raises(ValueError):
+        index["y"]
+
+
+def test_topological_order():
+    order, cyclic = expressions.topologicalOrder({"a": set(), "b": {"a"}, "c": {"b", "a"}, "d": {"d"}})
+    assert order == ["a", "b", "c"]
+    assert cyclic == {"d"}
+
+
+def test_compiled_expressions_are_cached():
+    assert expressions.compileExpression("1 + 2") is expressions.compileExpression("1 + 2")
+    assert expressions.compileExpression("x + x * y").names == {"x": 2, "y": 1}
+
+
+def test_chained_aliases_are_resolved_in_one_pass():
+    index = expressions.VariableIndex(makeVariables({"d": "c * 2", "c": "b + 1", "b": "a", "a": "3"}))
+    assert index.replace("d") == "3 + 1 * 2"
+    assert index.order.index("a") < index.order.index("b") < index.order.index("c") < index.order.index("d")
+
+
+def test_longest_alias_is_substituted_first():
+    index = expressions.VariableIndex(makeVariables({"freq": "1", "freq_offset": "2"}))
+    assert index.replace("freq_offset + freq") == "2 + 1"
+
+
+def test_overlapping_aliases():
+    index = expressions.VariableIndex(makeVariables({"freq": "1", "freq_offset": "2", "amp": "3"}))
+    assert index.findOverlappingAlias("fre") in ("freq", "freq_offset")
+    assert index.findOverlappingAlias("freq_offset_2") in ("freq", "freq_offset")
+    assert index.findOverlappingAlias("freq_offset", ignoredAlias="freq_offset") == "freq"
+    assert index.findOverlappingAlias("phase") is None
+    assert index.findOverlappingAlias("amp", ignoredAlias="amp") is None
@@ -0,0 +1,210 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("sipyco")
+
+# the crate first, the widgets import each other in the order it imports them
+import gui.crate  # noqa: F401
+import gui.code_generation.hardware_util as hardware_util
+
+
+def fastinoVoltageToMu(voltage):
+    # voltage_to_mu of artiq.coredevice.fastino
+    data = int(round((0x8000 / 10.0) * voltage)) + 0x8000
+    if data < 0 or data > 0xFFFF:
+        raise ValueError("DAC voltage out of bounds")
+    return data
+
+
+def fastinoVoltagesToMu(voltages):
+    return hardware_util.voltagesToMu(voltages, lambda voltage: np.rint((0x8000 / 10.0) * voltage) + 0x8000)
+
+
+def test_voltages_to_mu_matches_artiq():
+    voltages = np.linspace(-10.0, 9.9996, 1001)
+    mu = fastinoVoltagesToMu(voltages)
+    assert mu.dtype == np.int32
+    assert mu.tolist() == [fastinoVoltageToMu(voltage) for voltage in voltages.tolist()]
+    # round() and np.rint both round half to even
+    assert fastinoVoltagesToMu([10.0 / 0x8000 * 0.5]).tolist() == [fastinoVoltageToMu(10.0 / 0x8000 * 0.5)]
+
+
+def test_voltages_to_mu_checks_bounds():
+    # the range is inclusive, +10 V gives the largest code like before the conversion moved to the host
+    assert fastinoVoltagesToMu([-10.0, 10.0]).tolist() == [0, 0xFFFF]
+    with pytest.raises(ValueError):
+        fastinoVoltagesToMu([0.0, 10.001])
+    with pytest.raises(ValueError):
+        fastinoVoltagesToMu([-10.001])
+    assert fastinoVoltagesToMu(np.zeros((0, 2))).shape == (0, 2)
+
+
+def test_devices_accept_their_full_range(testCrate):
+    from gui.code_generation.device.CurrentDriver import CurrentDriver
+    from gui.code_generation.device.Fastino import Fastino
+    from gui.code_generation.device.Zotino import Zotino
+
+    assert Fastino("fastino0").voltagesToMu([-10.0, 0.0, 10.0]).tolist() == [0, 0x8000, 0xFFFF]
+    assert Zotino("zotino0").voltagesToMu([-10.0, 0.0, 10.0]).tolist() == [0, 0x8000, 0xFFFF]
+    assert CurrentDriver("current_driver").voltagesToMu([-10.0, 10.0]).tolist() == [1 << 24, (1 << 24) | (((1 << 20) - 1) << 4)]
+    for device in (Fastino("fastino0"), Zotino("zotino0"), CurrentDriver("current_driver")):
+        with pytest.raises(ValueError):
+            device.voltagesToMu([10.01])
+
+
+def test_sweep_voltages_are_scaled_to_the_range():
+    voltages = hardware_util.getSweepVoltages("x**2", 11, 1.0, -3.0)
+    assert voltages[0] == pytest.approx(1.0)
+    assert voltages[-1] == pytest.approx(-3.0)
+    assert voltages == pytest.approx(1.0 - 4.0 * (np.arange(11) / 10) ** 2)
+    assert not voltages.flags.writeable
+    assert hardware_util.getSweepVoltages("x**2", 11, 1.0, -3.0) is voltages
+    with pytest.raises(Exception):
+        hardware_util.getSweepVoltages("1", 11, 1.0, -3.0)
+
+
+def test_group_data_matches_artiq():
+    from gui.code_generation.device.Fastino import packGroupData
+
+    voltages = [-10.0, -0.5, 0.0, 9.9]
+    # set_group of artiq.coredevice.fastino
+    words = [0] * (len(voltages) // 2)
+    for i in range(len(voltages)):
+        v = fastinoVoltageToMu(voltages[i])
+        if i & 1:
+            v = words[i // 2] | (v << 16)
+        words[i // 2] = v - (1 << 32) if v >= 1 << 31 else v
+    data = packGroupData(fastinoVoltagesToMu([voltages, voltages]))
+    assert data.dtype == np.int32
+    assert data.tolist() == [words, words]
+
+
+def test_group_data_of_odd_channel_counts():
+    from gui.code_generation.device.Fastino import packGroupData
+
+    data = packGroupData([[0x1234, 0xFFFF, 0x8000]])
+    assert data.shape == (1, 2)
+    assert data.tolist() == [[0xFFFF1234 - (1 << 32), 0x8000]]
+    assert packGroupData(np.zeros((4, 1), dtype=np.int32) + 7).tolist() == [[7]] * 4
+
+
+# amplitude_to_asf, turns_to_pow and the *_to_ram methods of artiq.coredevice.ad9910
+def amplitudeToAsf(amplitude):
+    code = int(round(amplitude * 0x3FFF))
+    if code < 0 or code > 0x3FFF:
+        raise ValueError("Invalid AD9910 fractional amplitude!")
+    return code
+
+
+def turnsToPow(turns):
+    return int(round(turns * 0x10000)) & 0xFFFF
+
+
+def toInt32(value):
+    return (value + 0x80000000) % 0x100000000 - 0x80000000
+
+
+def amplitudeToRam(amplitudes):
+    return [toInt32(amplitudeToAsf(amplitude) << 18) for amplitude in amplitudes]
+
+
+def turnsToRam(turns):
+    return [toInt32(turnsToPow(turn) << 16) for turn in turns]
+
+
+def turnsAmplitudeToRam(turns, amplitudes):
+    return [toInt32(turnsToPow(turn) << 16 | amplitudeToAsf(amplitude) << 2) for turn, amplitude in zip(turns, amplitudes)]
+
+
+def getReferenceData(formula, stepCount):
+    # the prepare() loop generated before, including its clipping of amplitudes, played back reversed
+    values = [eval(formula, {"x": i / stepCount, "np": np}) for i in range(stepCount)]
+    return values[::-1]
+
+
+@pytest.mark.parametrize("stepCount", [1, 7, 1024])
+def test_ram_data_matches_artiq(stepCount):
+    amplitudeFormula = "1.2 * x - 0.1"
+    phaseFormula = "3 * x - 1"
+    amplitudes = [min(1.0, max(0.0, amplitude)) for amplitude in getReferenceData(amplitudeFormula, stepCount)]
+    turns = getReferenceData(phaseFormula, stepCount)
+    asf = hardware_util.getRamData("RAM_DEST_ASF", amplitudeFormula, phaseFormula, "0", stepCount)
+    assert asf.dtype == np.int32
+    assert asf.tolist() == amplitudeToRam(amplitudes)
+    pow_ = hardware_util.getRamData("RAM_DEST_POW", amplitudeFormula, phaseFormula, "0", stepCount)
+    assert pow_.tolist() == turnsToRam(turns)
+    powAsf = hardware_util.getRamData("RAM_DEST_POWASF", amplitudeFormula, phaseFormula, "0", stepCount)
+    assert powAsf.tolist() == turnsAmplitudeToRam(turns, amplitudes)
+
+
+def frequencyToRam(frequencies, ftwPerHz):
+    return [toInt32(int(round(ftwPerHz * frequency)) & 0xFFFFFFFF) for frequency in frequencies]
+
+
+def test_ram_frequencies_use_the_clock_of_the_device():
+    ftwPerHz = (1 << 32) / 1e9
+    frequencies = hardware_util.getRamData("RAM_DEST_FTW", "0", "0", "1e6 * (1 + x) + 4e8 * x", 4, ftwPerHz)
+    assert frequencies.dtype == np.int32
+    assert frequencies.tolist() == frequencyToRam(getReferenceData("1e6 * (1 + x) + 4e8 * x", 4), ftwPerHz)
+    assert not frequencies.flags.writeable
+
+
+def test_ram_data_is_cached_by_the_formulas_it_reads():
+    asf = hardware_util.getRamData("RAM_DEST_ASF", "x", "0", "1e6", 8, 4.0)
+    assert hardware_util.getRamData("RAM_DEST_ASF", "x", "0.5", "2e6", 8, 5.0) is asf
+    assert hardware_util.getRamData("RAM_DEST_POWASF", "x", "0", "1e6", 8, 4.0) is not asf
+    ftw = hardware_util.getRamData("RAM_DEST_FTW", "1", "0.5", "1e6", 8, 4.0)
+    assert hardware_util.getRamData("RAM_DEST_FTW", "x", "0", "1e6", 8, 4.0) is ftw
+    assert hardware_util.getRamData("RAM_DEST_FTW", "x", "0", "1e6", 8, 5.0) is not ftw
+
+
+def createRamEvent(destination, amplitudeFormula="1.0", phaseFormula="0.0", frequencyFormula="1e6"):
+    from gui.code_generation.device.Urukul import Urukul, UrukulCPLD
+    from gui.code_generation.event.Urukul import UrukulRamEvent
+
+    device = Urukul("urukul0_ch0", UrukulCPLD("urukul0_cpld"))
+    return UrukulRamEvent(
+        time=0,
+        duration=1e-3,
+        device=device,
+        switch=None,
+        amp=None,
+        freq=None,
+        phase=None,
+        attenuation=None,
+        only_execute=False,
+        ram_amplitude_formula=amplitudeFormula,
+        ram_phase_formula=phaseFormula,
+        ram_frequency_formula=frequencyFormula,
+        ram_profile="1",
+        ram_start="0",
+        ram_end="3",
+        ram_step_size="16",
+        ram_destination=destination,
+        ram_mode="RAM_MODE_RAMPUP",
+    )
+
+
+def test_ram_frequencies_are_computed_on_the_host(testCrate):
+    testCrate.device_db["urukul0_cpld"]["arguments"] = {"refclk": 100e6, "clk_div": 1}
+    testCrate.device_db["urukul0_ch0"]["arguments"]["pll_n"] = 10
+    event = createRamEvent("RAM_DEST_FTW", frequencyFormula="1e6 * (1 + x)")
+    assert event.device.ftwPerHz == (1 << 32) / 1e9
+    code = event.generatePrepareCode()
+    assert "frequency_to_ram" not in code
+    assert str(frequencyToRam(getReferenceData("1e6 * (1 + x)", 4), (1 << 32) / 1e9)) in code
+
+
+def test_formulas_with_experiment_names_are_computed_in_the_experiment(testCrate, monkeypatch):
+    import gui.code_generation.event.Urukul as Urukul
+
+    messages = []
+    monkeypatch.setattr(Urukul, "log", messages.append)
+    code = createRamEvent("RAM_DEST_ASF", amplitudeFormula="self.scale * x").generatePrepareCode()
+    assert messages == ["RAM profile 1 of urukul0_ch0 is computed in the experiment, name 'self' is not defined"]
+    assert "for i in range(4):" in code
+    assert "ram_amp_data[3-i] = min(1.0, max(0.0, self.scale * x))" in code
+    assert "amplitude_to_ram(ram_amp_data" in code
+    # other errors are errors of the formula
+    with pytest.raises(ValueError):
+        createRamEvent("RAM_DEST_ASF", amplitudeFormula="float('a') * x").generatePrepareCode()
@@ -0,0 +1,122 @@
+import json
+import logging
+import multiprocessing.pool
+import shutil
+import time
+
+import pytest
+
+pytest.importorskip("sipyco")
+
+import gui.headless_compiler as headless_compiler
+import gui.variable_index as variable_index
+import gui.widgets.Log as Log
+from conftest import DEVICE_DB_PATH
+
+
+def test_log_messages_go_to_logging(caplog, monkeypatch):
+    monkeypatch.setattr(Log.Controller, "controller", None, raising=False)
+    headless_compiler.useLogging()
+    with caplog.at_level(logging.DEBUG, logger=headless_compiler.logger.name):
+        Log.log("compiled", Log.Level.INFO)
+        Log.log("slack", Log.Level.WARNING)
+    assert [(record.levelno, record.getMessage()) for record in caplog.records] == [(logging.INFO, "compiled"), (logging.WARNING, "slack")]
+
+
+def test_overrides_only_change_the_compiled_variables(testCrate):
+    headless_compiler.setVariableOverrides({"var_pulse_time": "2"})
+    assert variable_index.evaluate("pulse_time") == 2
+    assert testCrate.variables["var_pulse_time"]["value"] == "0.5"
+    headless_compiler.setVariableOverrides(None)
+    assert variable_index.evaluate("pulse_time") == 0.5
+    with pytest.raises(Exception, match="Unknown variable"):
+        headless_compiler.setVariableOverrides({"var_unknown": "1"})
+
+
+def test_compile_batch_shares_files_of_equal_code(testCrate):
+    tasks = [("main", {}), ("main", {"var_pulse_count": "4"}), ("main", {}), ("pulse", {"var_unknown": "1"})]
+    results = list(headless_compiler.compileBatch(tasks, processes=1))
+    assert [result["variables"] for result in results] == [task[1] for task in tasks]
+    assert [result["duration"] for result in results[:3]] == pytest.approx([15.5e-3, 17e-3, 15.5e-3])
+    assert results[0]["path"] == results[2]["path"]
+    assert results[0]["path"] != results[1]["path"]
+    assert len({result["codeID"] for result in results}) == 4
+    with open(results[0]["path"]) as file:
+        compile(file.read(), results[0]["path"], "exec")
+    assert results[3]["error"] == "Exception: Unknown variable var_unknown"
+
+
+def writeCrate(crate, path):
+    for fileName, fileInfo in crate.FileManager.FILES.items():
+        with open(path / fileName, "w") as file:
+            json.dump(getattr(crate, fileInfo["crate_attr"]), file)
+    shutil.copy(DEVICE_DB_PATH, path / "device_db.py")
+
+
+def test_cli_compiles_all_sequences(testCrate, tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(Log.Controller, "controller", None, raising=False)
+    cratePath = tmp_path / "crate"
+    cratePath.mkdir()
+    writeCrate(testCrate, cratePath)
+    output = tmp_path / "build"
+    argv = [str(cratePath), "--all", "--set", "var_pulse_count=1", "--processes", "1", "--output", str(output), "--settings", str(tmp_path / "settings.json")]
+    assert headless_compiler.main(argv) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[-2:] == ["2 distinct experiment files", lines[-1]]
+    assert lines[-1].startswith("2 of 2 compiled")
+    assert "pulse_" in lines[0] and "duration 0.0015 s" in lines[0]
+    assert "main_" in lines[1] and "duration 0.0125 s" in lines[1]
+    assert len(list(output.glob("*.py"))) == 2
+
+    assert headless_compiler.main([str(cratePath), "main", "--set", "var_unknown=1", "--processes", "1", "--output", str(output), "--settings", str(tmp_path / "settings.json")]) == 1
+    with pytest.raises(SystemExit):
+        headless_compiler.main([str(cratePath), "unknown", "--settings", str(tmp_path / "settings.json")])
+
+
+def waitFor(condition):
+    for _ in range(500):
+        if condition():
+            return
+        time.sleep(0.01)
+    raise TimeoutError()
+
+
+@pytest.fixture
+def threadPool(testCrate, monkeypatch):
+    monkeypatch.setattr(headless_compiler, "createPool", lambda processes: multiprocessing.pool.ThreadPool(processes))
+    monkeypatch.setattr(headless_compiler, "compileTask", lambda task: {"sequence": task[0], "variables": task[1], "codeID": task[2]})
+
+
+def test_batches_only_compile_ahead_of_the_buffer(threadPool):
+    taken = []
+
+    def tasks():
+        for i in range(100):
+            taken.append(i)
+            yield ("main", {"i": i})
+
+    batch = headless_compiler.BatchCompilation(tasks(), processes=2, taskCount=100, bufferSize=3)
+    try:
+        # the processes and the buffer are filled, then the task handler waits
+        waitFor(lambda: batch.results.qsize() == 5)
+        time.sleep(0.1)
+        assert taken == list(range(5))
+        assert [result["variables"]["i"] for result in batch.getResults(2)] == [0, 1]
+        waitFor(lambda: len(taken) == 7)
+        time.sleep(0.1)
+        assert len(taken) == 7
+        assert batch.results.qsize() == 5
+    finally:
+        batch.cancel()
+    batch.thread.join(5)
+    assert not batch.thread.is_alive()
+    assert batch.getResults()[-1] is None
+
+
+def test_batches_without_buffer_compile_everything(threadPool):
+    batch = headless_compiler.BatchCompilation((("main", {"i": i}) for i in range(20)), processes=2, taskCount=20)
+    waitFor(lambda: batch.results.qsize() == 21)
+    results = batch.getResults()
+    assert results[-1] is None
+    assert [result["variables"]["i"] for result in results[:-1]] == list(range(20))
+    assert len({result["codeID"] for result in results[:-1]}) == 20
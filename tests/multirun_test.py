@@ -0,0 +1,68 @@
+import itertools
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sipyco")
+
+import gui.crate as crate
+import gui.crate.MultiRun as MultiRun
+
+
+def monteCarlo(samples, dimensions, seed=""):
+    return {"isDir": False, "mode": "monte carlo", "samples": str(samples), "seed": seed, "dimensions": {f"dim{i}": {"variables": variables} for i, variables in enumerate(dimensions)}}
+
+
+@pytest.fixture
+def multiruns(testCrate, monkeypatch):
+    monkeypatch.setattr(crate, "multiruns", {})
+    return crate.multiruns
+
+
+def test_monte_carlo_points_follow_their_distributions(multiruns):
+    multiruns["mc"] = monteCarlo(
+        5000,
+        [
+            {
+                "var_uniform": {"mode": "uniform", "min": "-1", "max": "3"},
+                "var_log": {"mode": "log uniform", "min": "1e-3", "max": "1e3"},
+                "var_normal": {"mode": "normal", "mean": "5", "std": "0.5"},
+            }
+        ],
+    )
+    points = list(MultiRun.getPoints("mc", 1))
+    assert len(points) == MultiRun.getRunCount("mc") == 5000
+    uniform = np.array([float(point["var_uniform"]) for point in points])
+    log = np.log10([float(point["var_log"]) for point in points])
+    normal = np.array([float(point["var_normal"]) for point in points])
+    assert uniform.min() >= -1 and uniform.max() <= 3 and uniform.mean() == pytest.approx(1, abs=0.1)
+    assert log.min() >= -3 and log.max() <= 3 and log.mean() == pytest.approx(0, abs=0.1)
+    assert normal.mean() == pytest.approx(5, abs=0.05) and normal.std() == pytest.approx(0.5, abs=0.05)
+
+
+def test_data_lists_of_a_dimension_share_the_index(multiruns):
+    multiruns["mc"] = monteCarlo(
+        200,
+        [
+            {"var_a": {"mode": "data list", "datalist": [0, 1, 2, 3]}, "var_b": {"mode": "data list", "datalist": [0, 10, 20, 30]}},
+            {"var_c": {"mode": "data list", "datalist": [0, 1, 2, 3]}},
+        ],
+    )
+    points = list(MultiRun.getPoints("mc", 2))
+    assert all(int(point["var_b"]) == 10 * int(point["var_a"]) for point in points)
+    assert any(point["var_c"] != point["var_a"] for point in points)
+    assert {point["var_a"] for point in points} == {"0", "1", "2", "3"}
+
+
+def test_monte_carlo_points_depend_on_the_seed(multiruns, monkeypatch):
+    monkeypatch.setattr(MultiRun, "MONTE_CARLO_BATCH_SIZE", 16)
+    multiruns["mc"] = monteCarlo(50, [{"var_a": {"mode": "uniform", "min": "0", "max": "1"}}], seed="7")
+    points = list(MultiRun.getPoints("mc"))
+    assert len(points) == 50
+    assert points == list(MultiRun.getPoints("mc", 7))
+    assert points != list(MultiRun.getPoints("mc", 8))
+    # the points are drawn lazily, in batches
+    assert list(itertools.islice(MultiRun.getPoints("mc"), 20)) == points[:20]
+    assert MultiRun.usesSeed("mc")
+    multiruns["mc"]["seed"] = ""
+    assert MultiRun.getMonteCarloSeed("mc") != MultiRun.getMonteCarloSeed("mc")
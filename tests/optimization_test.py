@@ -0,0 +1,103 @@
+import asyncio
+import multiprocessing.pool
+import threading
+
+import pytest
+
+pytest.importorskip("sipyco")
+
+import gui.compiler as compiler
+import gui.crate as crate
+import gui.headless_compiler as headless_compiler
+import gui.widgets.Design as Design
+import gui.widgets.MultiRun as MultiRun
+import gui.widgets.Playlist as Playlist
+
+
+class FakeProgressDialog:
+    def __init__(self, *args):
+        self.progress = 0
+        self.onClose = None
+
+    def show(self):
+        pass
+
+    def close(self):
+        pass
+
+    def setProgress(self, progress):
+        self.progress = progress
+
+
+@pytest.fixture
+def optimization(testCrate, monkeypatch):
+    monkeypatch.setattr(crate, "multiruns", {
+        "de": {
+            "isDir": False,
+            "mode": "differential evolution",
+            "populationSize": "4",
+            "generations": "3",
+            "costDataset": "cost",
+            "goal": "minimize",
+            "dimensions": {"dim0": {"variables": {"var_pulse_time": {"mode": "linear", "min": "0", "max": "2"}}}},
+        }
+    })
+    monkeypatch.setattr(Design, "ProgressDialog", FakeProgressDialog)
+    monkeypatch.setattr(Design, "confirmationDialog", lambda *args: False)
+    monkeypatch.setattr(Design, "infoDialog", lambda *args: None)
+    monkeypatch.setattr(Playlist, "sequenceCompiled", lambda *args: None)
+    # one worker thread instead of processes, the workers share the crate of the test
+    monkeypatch.setattr(headless_compiler, "createPool", lambda processes: multiprocessing.pool.ThreadPool(1))
+    monkeypatch.setattr(MultiRun, "runningOptimization", None)
+    submitted = []
+
+    def submitCompiledFile(seqName, codeID, path, duration, arguments=None, priority=0):
+        submitted.append((codeID, duration, threading.current_thread()))
+
+    monkeypatch.setattr(compiler, "submitCompiledFile", submitCompiledFile)
+    return submitted
+
+
+async def optimize():
+    """Sends a cost for every submitted candidate until the optimization finished."""
+    optimization = MultiRun.Optimization("de", "main", 5)
+    MultiRun.runningOptimization = optimization
+    optimization.start()
+    for _ in range(1000):
+        await asyncio.sleep(0.01)
+        for codeID, (_slot, vector) in list(optimization.pending.items()):
+            MultiRun.runResults(codeID, {"cost": (vector[0] - 0.5) ** 2})
+        if optimization.finished:
+            return optimization
+    raise TimeoutError()
+
+
+def test_candidates_are_compiled_in_the_background(optimization, monkeypatch):
+    compileThreads = []
+    compileToFile = headless_compiler.compileToFile
+
+    def recordingCompileToFile(*args):
+        compileThreads.append(threading.current_thread())
+        return compileToFile(*args)
+
+    monkeypatch.setattr(headless_compiler, "compileToFile", recordingCompileToFile)
+    result = asyncio.run(optimize())
+    assert result.evolution.told == result.evolution.evaluationBudget == 16
+    assert result.batch is not None
+    assert len(optimization) == 16
+    assert len({codeID for codeID, _duration, _thread in optimization}) == 16
+    # compiled by the worker, submitted from the event loop
+    assert len(compileThreads) == 16 and threading.main_thread() not in compileThreads
+    assert all(thread is threading.main_thread() for _codeID, _duration, thread in optimization)
+    assert MultiRun.runningOptimization is None
+    # pulse_time is a variable of the candidates, so durations differ
+    assert len({duration for _codeID, duration, _thread in optimization}) > 1
+
+
+def test_candidates_are_compiled_in_process_with_plugins(optimization, monkeypatch):
+    compiled = []
+    monkeypatch.setattr(compiler, "canCompileInProcessPool", lambda: False)
+    monkeypatch.setattr(compiler, "compileAndRun", lambda *args, **kwargs: compiled.append(kwargs["scanVariables"]) or len(compiled))
+    result = asyncio.run(optimize())
+    assert result.batch is None
+    assert len(compiled) == 16
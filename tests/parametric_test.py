@@ -0,0 +1,30 @@
+import gui.code_generation.parametric as parametric
+
+
+def run(code, values):
+    namespace = {"values": values}
+    exec("def body():\n        " + code + "\n        return result", namespace)
+    return namespace["body"]()
+
+
+def test_numbers_are_replaced_by_list_items():
+    code = "result = 1.5e-3 * 2 + 0x10\n        result += 7"
+    parametrized, values = parametric.parametrizeNumbers(code, "values")
+    assert values == [1.5e-3, 2, 16, 7]
+    assert parametrized == "result = values[0] * values[1] + values[2]\n        result += values[3]"
+    assert run(parametrized, values) == run(code, values)
+
+
+def test_names_and_strings_keep_their_digits():
+    code = 'ttl2 = "ch 3"\n        result = [ttl2, 4]'
+    parametrized, values = parametric.parametrizeNumbers(code, "values")
+    assert values == [4]
+    assert run(parametrized, values) == ["ch 3", 4]
+
+
+def test_equal_structure_gives_equal_code():
+    first, firstValues = parametric.parametrizeNumbers("result = 1.0 + 2", "values")
+    second, secondValues = parametric.parametrizeNumbers("result = 3.5 + 4", "values")
+    assert first == second
+    assert parametric.getCodeHash(first) == parametric.getCodeHash(second)
+    assert run(second, secondValues) == 7.5
@@ -0,0 +1,75 @@
+import contextlib
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sipyco")
+
+# the crate first, the widgets import each other in the order it imports them
+import gui.crate  # noqa: F401
+import gui.code_generation.event.Sampling as Sampling
+import gui.settings as settings
+from gui.code_generation.device.Sampler import Sampler
+
+
+class FakeSampler:
+    def __init__(self):
+        self.count = 0
+
+    def sample_mu(self, data):
+        data[:] = [self.count * 8 + channel for channel in range(8)]
+        self.count += 1
+
+
+def createExperiment(event):
+    """An object with the prepare, run and analyze code of the event as methods, run on the host."""
+    device = event.device
+    code = "".join(device.functions)
+    for name, body in (("prepare", event.generatePrepareCode()), ("run", event.generateRunCode()), ("analyze", event.generateAnalyzeCode())):
+        code += f"""
+    def {name}(self):{body}"""
+    namespace = {"rpc": lambda flags: lambda function: function, "TNone": None, "np": np}
+    exec(event.generateImportCode() + "\nclass Experiment:" + code, namespace)
+    experiment = namespace["Experiment"]()
+    experiment.codeIDString = "123"
+    experiment.datasets = {}
+    experiment.set_dataset = experiment.datasets.__setitem__
+    setattr(experiment, device.name, FakeSampler())
+    namespace["parallel"] = contextlib.nullcontext()
+    namespace["delay"] = lambda duration: None
+    return experiment
+
+
+@pytest.mark.parametrize("numberOfSamples", [2500, 2048, 10])
+def test_streamed_samples_are_stored_in_the_results_folder(testCrate, tmp_path, monkeypatch, numberOfSamples):
+    settings.data["samplerStreaming"] = True
+    resultsFolder = tmp_path / "results" / "2026-01-01" / "12"
+    resultsFolder.mkdir(parents=True)
+    monkeypatch.chdir(resultsFolder)
+    event = Sampling.SampleEvent(0.0, Sampler("sampler0"), 1e3, numberOfSamples / 1e3)
+    event.timeIndex = 0
+    experiment = createExperiment(event)
+    experiment.prepare()
+    # the working directory of the experiment may change after prepare()
+    monkeypatch.chdir(tmp_path)
+    experiment.run()
+    experiment.analyze()
+
+    assert experiment.datasets["dsampler0_0_samplerate"] == 1e3
+    for channel in range(8):
+        path = experiment.datasets[f"dsampler0_0_data_ch_{channel}_file"]
+        assert os.path.isabs(path)
+        assert os.path.dirname(path) == str(resultsFolder)
+        assert np.load(path).tolist() == list(range(channel, numberOfSamples * 8, 8))
+
+
+def test_result_paths_outside_of_the_results_folder(testCrate, tmp_path, monkeypatch):
+    settings.data["samplerStreaming"] = True
+    monkeypatch.chdir(tmp_path)
+    event = Sampling.SampleEvent(0.0, Sampler("sampler0"), 1e3, 1e-2)
+    event.timeIndex = 0
+    path = createExperiment(event).get_result_path("samples.npy")
+    assert os.path.isabs(path)
+    assert os.path.relpath(path, tmp_path).split(os.sep)[0] == "results"
+    assert os.path.isdir(os.path.dirname(path))
@@ -0,0 +1,110 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import gui.scan_plan as scan_plan
+
+DIMENSIONS = [{"a": [0, 1, 2]}, {"b": [10, 20], "c": ["x", "y"]}, {"d": [0.5, 1.5, 2.5, 3.5]}]
+
+
+def getCartesianPoints(dimensions):
+    rows = [[{name: str(values[i]) for name, values in dimension.items()} for i in range(len(next(iter(dimension.values()))))] for dimension in dimensions]
+    return [{name: value for row in combination for name, value in row.items()} for combination in itertools.product(*rows)]
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 7, 16, 17, 1000, 4099])
+@pytest.mark.parametrize("seed", [0, 5])
+def test_permute_is_a_bijection(count, seed):
+    points = np.arange(count)
+    for repetition in range(2):
+        permuted = scan_plan.permute(points, count, seed, np.full(count, repetition))
+        assert sorted(permuted.tolist()) == list(range(count))
+
+
+def test_permute_depends_on_seed_and_repetition():
+    points = np.arange(1000)
+    permuted = scan_plan.permute(points, 1000, 0, np.zeros(1000))
+    assert not np.array_equal(permuted, points)
+    assert not np.array_equal(permuted, scan_plan.permute(points, 1000, 1, np.zeros(1000)))
+    assert not np.array_equal(permuted, scan_plan.permute(points, 1000, 0, np.ones(1000)))
+    assert np.array_equal(permuted, scan_plan.permute(points, 1000, 0, np.zeros(1000)))
+
+
+def test_cartesian_matches_product():
+    plan = scan_plan.ScanPlan(DIMENSIONS)
+    assert len(plan) == 24
+    assert list(plan) == getCartesianPoints(DIMENSIONS)
+
+
+def test_points_are_taken_in_batches(monkeypatch):
+    monkeypatch.setattr(scan_plan, "BATCH_SIZE", 5)
+    plan = scan_plan.ScanPlan(DIMENSIONS)
+    assert list(plan) == getCartesianPoints(DIMENSIONS)
+    assert plan.getPoints(7, 9) == getCartesianPoints(DIMENSIONS)[7:9]
+
+
+def test_zipped():
+    plan = scan_plan.ScanPlan([{"a": [1, 2, 3]}, {"b": [4, 5, 6]}], ordering="zipped")
+    assert len(plan) == 3
+    assert list(plan) == [{"a": "1", "b": "4"}, {"a": "2", "b": "5"}, {"a": "3", "b": "6"}]
+    with pytest.raises(ValueError):
+        scan_plan.ScanPlan([{"a": [1, 2, 3]}, {"b": [4, 5]}], ordering="zipped")
+
+
+def test_snake_reverses_the_inner_dimensions():
+    plan = scan_plan.ScanPlan([{"a": [0, 1, 2]}, {"b": [0, 1]}], ordering="snake")
+    assert [(point["a"], point["b"]) for point in plan] == [("0", "0"), ("0", "1"), ("1", "1"), ("1", "0"), ("2", "0"), ("2", "1")]
+
+
+def test_snake_only_changes_one_dimension_per_step():
+    plan = scan_plan.ScanPlan(DIMENSIONS, ordering="snake")
+    points = list(plan)
+    assert sorted(points, key=str) == sorted(getCartesianPoints(DIMENSIONS), key=str)
+    indices = np.array(plan.getIndices(np.arange(len(plan)))).T
+    assert np.all(np.abs(np.diff(indices, axis=0)).sum(axis=1) == 1)
+
+
+def test_random_visits_every_point_once():
+    plan = scan_plan.ScanPlan(DIMENSIONS, ordering="random", seed=3)
+    points = list(plan)
+    assert points != getCartesianPoints(DIMENSIONS)
+    assert sorted(points, key=str) == sorted(getCartesianPoints(DIMENSIONS), key=str)
+    assert points == list(scan_plan.ScanPlan(DIMENSIONS, ordering="random", seed=3))
+
+
+def test_consecutive_repeats():
+    plan = scan_plan.ScanPlan([{"a": [1, 2]}], repeats=3)
+    assert len(plan) == 6
+    assert [point["a"] for point in plan] == ["1", "1", "1", "2", "2", "2"]
+
+
+def test_interleaved_repeats():
+    plan = scan_plan.ScanPlan([{"a": [1, 2]}, {"b": [3, 4]}], repeats=2, repeatMode="interleaved")
+    points = list(plan)
+    assert len(plan) == 8
+    assert points[:4] == points[4:] == getCartesianPoints([{"a": [1, 2]}, {"b": [3, 4]}])
+
+
+def test_interleaved_random_repeats_use_new_orders():
+    plan = scan_plan.ScanPlan([{"a": list(range(50))}], ordering="random", repeats=2, repeatMode="interleaved", seed=1)
+    points = [point["a"] for point in plan]
+    assert sorted(points[:50], key=int) == sorted(points[50:], key=int) == [str(i) for i in range(50)]
+    assert points[:50] != points[50:]
+
+
+def test_dimensions_without_variables_use_their_steps():
+    plan = scan_plan.ScanPlan([{}, {"a": [1, 2]}], steps=[3, None])
+    assert len(plan) == 6
+    assert [point["a"] for point in plan] == ["1", "2"] * 3
+    with pytest.raises(ValueError):
+        scan_plan.ScanPlan([{"a": [1, 2]}], steps=[3])
+
+
+def test_invalid_options():
+    with pytest.raises(ValueError):
+        scan_plan.ScanPlan(DIMENSIONS, ordering="spiral")
+    with pytest.raises(ValueError):
+        scan_plan.ScanPlan(DIMENSIONS, repeatMode="shuffled")
+    with pytest.raises(ValueError):
+        scan_plan.ScanPlan([{"a": [1, 2], "b": [1]}])
@@ -0,0 +1,73 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import gui.scan_results as scan_results
+
+
+def getCodeID(offset=0):
+    # like gui.compiler.reserveCodeIDs, above the range of 64 bit integers
+    return int(datetime.now().strftime("%Y%m%d%H%M%S%f")) + offset
+
+
+def test_runs_and_results_are_stored(tmp_path):
+    table = scan_results.ScanResultTable(str(tmp_path), 3, {"multirun": "scan"})
+    codeIDs = [getCodeID(i) for i in range(3)]
+    table.addRun(codeIDs[0], {"x": "0.5", "y": "a"})
+    table.addRun(codeIDs[1], {"x": "1.5", "y": "2"})
+    assert table.addResults(codeIDs[1], {"signal": 2.0, "trace": [1.0, 2.0, 3.0], "missing": None})
+    assert not table.addResults(codeIDs[1], {"signal": 3.0})
+    assert table.runFailed(codeIDs[0])
+    assert not table.runFailed(codeIDs[2])
+    table.flush()
+
+    info, columns = scan_results.loadTable(str(tmp_path))
+    assert info["multirun"] == "scan"
+    assert info["rowCount"] == 3
+    assert [int(codeID) for codeID in columns["codeID"][:2]] == codeIDs[:2]
+    assert columns["codeID"][2] == ""
+    assert columns["finished"].tolist() == [False, True, False]
+    assert columns["x"][:2].tolist() == [0.5, 1.5]
+    assert np.isnan(columns["y"][0]) and columns["y"][1] == 2.0
+    assert np.isnan(columns["signal"][0]) and columns["signal"][1] == 2.0
+    assert columns["trace"].shape == (3, 3)
+    assert columns["trace"][1].tolist() == [1.0, 2.0, 3.0]
+    assert "missing" not in columns
+    assert info["columns"]["x"]["kind"] == "variable"
+    assert info["columns"]["signal"]["kind"] == "dataset"
+
+
+def test_completion(tmp_path):
+    table = scan_results.ScanResultTable(str(tmp_path), 2)
+    codeID = getCodeID()
+    table.addRun(codeID, {})
+    assert not table.isComplete()
+    table.runFailed(table.columns["codeID"][0])
+    assert not table.isComplete()
+    table.stopQueueing()
+    assert table.isComplete()
+    table.addRun(codeID + 1, {})
+    with pytest.raises(IndexError):
+        table.addRun(codeID + 2, {})
+
+
+def test_a_full_table_is_complete(tmp_path):
+    table = scan_results.ScanResultTable(str(tmp_path), 1)
+    codeID = getCodeID()
+    table.addRun(codeID, {})
+    assert not table.isComplete()
+    table.addResults(str(codeID), {"signal": 1})
+    assert table.isComplete()
+
+
+def test_dataset_shapes_have_to_match(tmp_path):
+    table = scan_results.ScanResultTable(str(tmp_path), 2)
+    codeID = getCodeID()
+    table.addRun(codeID, {"x": "1"})
+    table.addRun(codeID + 1, {})
+    table.addResults(codeID, {"trace": [1.0, 2.0]})
+    with pytest.raises(ValueError):
+        table.addResults(codeID + 1, {"trace": [1.0, 2.0, 3.0]})
+    with pytest.raises(ValueError):
+        table.setValue("x", "dataset", 1, 1.0)
@@ -0,0 +1,43 @@
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+import gui.code_generation.sidecars as sidecars
+
+
+def loadSidecar(folder, code):
+    namespace = {"np": np, "__file__": str(folder / "experiment.py")}
+    exec(sidecars.IMPORT_CODE + sidecars.LOADER_CODE, namespace)
+    return eval(code, namespace)
+
+
+def test_small_arrays_stay_inline():
+    files = {}
+    assert sidecars.getArrayCode(files, [1, 2, 3]) == "[1, 2, 3]"
+    assert sidecars.getArrayCode(None, np.arange(1000)) == str(list(range(1000)))
+    assert files == {}
+
+
+def test_large_arrays_are_written_once(tmp_path):
+    files = {}
+    data = np.linspace(-1, 1, sidecars.MIN_ARRAY_SIZE)
+    code = sidecars.getArrayCode(files, data)
+    assert sidecars.getArrayCode(files, data.copy()) == code
+    assert sidecars.getArrayCode(files, data[::-1]) != code
+    assert len(files) == 2
+    sidecars.writeSidecars(files, str(tmp_path))
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(files)
+    assert loadSidecar(tmp_path, code) == pytest.approx(data.tolist())
+
+
+def test_text_is_compressed(tmp_path):
+    files = {}
+    text = json.dumps({"segment": [0.5] * 100})
+    code = sidecars.getTextCode(files, text)
+    sidecars.writeSidecars(files, str(tmp_path))
+    (name,) = files
+    with gzip.open(tmp_path / name, "rt", encoding="utf-8") as file:
+        assert file.read() == text
+    assert loadSidecar(tmp_path, code) == text
@@ -0,0 +1,37 @@
+import pytest
+
+pytest.importorskip("sipyco")
+
+import gui.compiler as compiler
+import gui.settings as settings
+import gui.widgets.Variables as Variables
+
+
+def setPulses(testCrate, count, duration):
+    testCrate.variables["var_pulse_count"]["value"] = count
+    testCrate.variables["var_pulse_time"]["value"] = duration
+    testCrate.sequences["pulse"]["segments"]["segment1"]["duration"]["text"] = "pulse_time"
+    Variables.variablesChanged()
+
+
+def getSlackWarnings():
+    return compiler.compileCodeToStore("main")[5]
+
+
+def test_slack_is_only_predicted_when_enabled(testCrate):
+    setPulses(testCrate, "10000", "1e-4")
+    assert getSlackWarnings() == []
+
+
+def test_sequences_with_enough_slack_have_no_warnings(testCrate):
+    settings.data["slackPrediction"] = True
+    assert getSlackWarnings() == []
+
+
+def test_fast_repetitions_are_predicted_to_underflow(testCrate):
+    settings.data["slackPrediction"] = True
+    setPulses(testCrate, "10000", "1e-4")
+    warnings = getSlackWarnings()
+    # 5 ms initial slack, 2 TTL events of 1 us CPU time per 0.2 us repetition
+    assert warnings[0] == "pulse: slack shrinks by 1.8 us per repetition, predicted RTIO underflow in repetition 2778 of 10000"
+    assert warnings[-1].startswith("limiting segment: pulse")
@@ -0,0 +1,78 @@
+import pytest
+
+pytest.importorskip("sipyco")
+
+import gui.crate as crate
+import gui.timeline as timeline
+
+
+@pytest.fixture(autouse=True)
+def labsetup(monkeypatch):
+    monkeypatch.setattr(
+        crate,
+        "labsetup",
+        {
+            "ttlA": {"module": "artiq.coredevice.ttl"},
+            "ttlB": {"module": "artiq.coredevice.ttl"},
+            "dds": {"module": "artiq.coredevice.ad9910"},
+        },
+        raising=False,
+    )
+
+
+def buildTimeline():
+    sub = timeline.Timeline()
+    sub.addPortState(0.0, 1e-3, {"dds": {"freq": 1e8}}, {})
+    sub.addTriggerWait(1e-3, 0.0, "ttlB")
+    sub.finish()
+    t = timeline.Timeline()
+    t.addPortState(0.0, 1e-3, {"ttlA": {"state": True}, "ttlB": {"state": False}}, {"rpc": {"args": []}})
+    t.addSubsequence("sub", 1e-3, 1e-3, 3, sub)
+    t.addPortState(4e-3, 2e-3, {}, {})
+    return t.finish(), sub
+
+
+def test_segments_look_like_sequence_json():
+    t, sub = buildTimeline()
+    assert len(t) == 3
+    assert t.getDuration() == pytest.approx(6e-3)
+    assert dict(t[0]) == {
+        "time": 0.0,
+        "duration": 1e-3,
+        "single_duration": 1e-3,
+        "ports": {"ttlA": {"state": True}, "ttlB": {"state": False}},
+        "rpcs": {"rpc": {"args": []}},
+    }
+    assert t[1]["repeats"] == 3
+    assert t[1]["duration"] == pytest.approx(3e-3)
+    assert t[1]["subsequence"] is sub
+    assert t[-1]["ports"] == {}
+    assert "ports" not in t[1]
+    with pytest.raises(KeyError):
+        t[1]["ports"]
+    with pytest.raises(IndexError):
+        t[3]
+
+
+def test_to_json_nests_subsequences():
+    t, sub = buildTimeline()
+    data = t.toJson()
+    assert data[1]["subsequence"] == sub.toJson()
+    assert data[1]["subsequence"][1] == {"time": 1e-3, "duration": 0.0, "single_duration": 0.0, "input_ttl": "ttlB"}
+
+
+def test_module_queries_include_subsequences():
+    t, sub = buildTimeline()
+    assert t.getModuleSegments("artiq.coredevice.ttl").tolist() == [0]
+    assert t.getModuleSegments("artiq.coredevice.ad9910").tolist() == []
+    assert t.usesModule("artiq.coredevice.ad9910")
+    assert not t.usesModule("artiq.coredevice.zotino")
+    assert t.hasTriggerWait()
+    assert t.hasRpcs()
+    assert not sub.hasRpcs()
+
+
+def test_finished_timelines_are_read_only():
+    t, sub = buildTimeline()
+    with pytest.raises(AssertionError):
+        t.addPortState(6e-3, 1e-3, {}, {})